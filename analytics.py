@@ -0,0 +1,122 @@
+from datetime import date
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from models import ANNULEE, Order, OrderItem, Variant, VariantDailySales
+
+# --- Agrégats de ventes (table "variantdailysales") ---
+# Une ligne par (jour, variante) : unités vendues et chiffre d'affaires,
+# au prix payé (OrderItem.unit_price). Mise à jour dans la transaction de
+# la commande, par un upsert additif (INSERT ... ON CONFLICT DO UPDATE
+# SET units = units + ...) : deux commandes simultanées ne s'écrasent pas.
+# Une annulation retire la commande de ses agrégats, une "désannulation"
+# l'y remet.
+
+# (jour, variante) -> [produit, unités, chiffre d'affaires]
+SalesDeltas = Dict[Tuple[date, int], list]
+
+
+def _as_date(value) -> date:
+    # date() renvoie une chaîne "AAAA-MM-JJ" en SQLite, une date en PostgreSQL
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _upsert_statement(dialect_name: str, rows: List[dict]):
+    """INSERT ... ON CONFLICT (day, variant_id) DO UPDATE SET units = units + ..."""
+    dialect_insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    table = VariantDailySales.__table__
+    statement = dialect_insert(table).values(rows)
+    return statement.on_conflict_do_update(
+        index_elements=[table.c.day, table.c.variant_id],
+        set_={
+            "units": table.c.units + statement.excluded.units,
+            "revenue": table.c.revenue + statement.excluded.revenue,
+        },
+    )
+
+
+async def _apply(session: AsyncSession, deltas: SalesDeltas, sign: int) -> None:
+    if not deltas:
+        return
+    # Ordre fixe (jour, variante) : deux transactions verrouillent les
+    # lignes d'agrégat dans le même ordre, sans interblocage.
+    rows = [
+        {
+            "day": day,
+            "variant_id": variant_id,
+            "product_id": product_id,
+            "units": sign * units,
+            "revenue": sign * revenue,
+        }
+        for (day, variant_id), (product_id, units, revenue) in sorted(deltas.items())
+    ]
+    await session.execute(_upsert_statement(session.bind.dialect.name, rows))
+
+
+async def record_order_sales(session: AsyncSession, order: Order) -> None:
+    """Ajoute une commande qui vient d'être créée (lignes et variantes en mémoire)."""
+    deltas: SalesDeltas = {}
+    day = order.created_at.date()
+    for item in order.items:
+        entry = deltas.setdefault((day, item.variant_id), [item.variant.product_id, 0, 0.0])
+        entry[1] += item.quantity
+        entry[2] += item.quantity * item.unit_price
+    await _apply(session, deltas, 1)
+
+
+async def apply_orders_sales(session: AsyncSession, order_ids: Iterable[int], sign: int) -> None:
+    """Ajoute (sign=1) ou retire (sign=-1) des commandes existantes de leurs agrégats."""
+    order_ids = list(order_ids)
+    if not order_ids:
+        return
+    statement = (
+        select(
+            func.date(Order.created_at),
+            OrderItem.variant_id,
+            Variant.product_id,
+            func.sum(OrderItem.quantity),
+            func.sum(OrderItem.quantity * OrderItem.unit_price),
+        )
+        .join(OrderItem, OrderItem.order_id == Order.id)
+        .join(Variant, Variant.id == OrderItem.variant_id)
+        .where(Order.id.in_(order_ids))
+        .group_by(func.date(Order.created_at), OrderItem.variant_id, Variant.product_id)
+    )
+    deltas: SalesDeltas = {
+        (_as_date(day), variant_id): [product_id, int(units), float(revenue)]
+        for day, variant_id, product_id, units, revenue in (await session.execute(statement)).all()
+    }
+    await _apply(session, deltas, sign)
+
+
+def rebuild_daily_sales(connection) -> int:
+    """
+    Recalcule TOUS les agrégats depuis les lignes de commande (connexion
+    synchrone, dans la transaction de l'appelant). À n'utiliser qu'après un
+    chargement en masse qui a contourné l'API (jeu de données du banc...).
+    """
+    day = func.date(Order.created_at)
+    aggregate = (
+        select(
+            day,
+            OrderItem.variant_id,
+            Variant.product_id,
+            func.sum(OrderItem.quantity),
+            func.sum(OrderItem.quantity * OrderItem.unit_price),
+        )
+        .join(OrderItem, OrderItem.order_id == Order.id)
+        .join(Variant, Variant.id == OrderItem.variant_id)
+        .where(Order.status != ANNULEE)
+        .group_by(day, OrderItem.variant_id, Variant.product_id)
+    )
+    table = VariantDailySales.__table__
+    connection.execute(delete(table))
+    result = connection.execute(
+        insert(table).from_select(
+            ["day", "variant_id", "product_id", "units", "revenue"], aggregate
+        )
+    )
+    return result.rowcount
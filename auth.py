@@ -1,20 +1,24 @@
 from datetime import datetime, timedelta
 from typing import Optional
+import hashlib
+import uuid
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 import os # Ajout pour la clé secrète
 
 from database import get_session
-from models import User
+from models import User, CurrentUser
+from cache import MISSING, TTLCache
+from revocation import revocation_list
+# Le hachage bcrypt vit dans hashing.py (pool de processus dédié) ;
+# ces noms restent importables depuis auth pour le code existant.
+from hashing import pwd_context, verify_password, get_password_hash
 
 # --- Configuration de la Sécurité ---
 
-# Contexte pour le hachage des mots de passe (nous utilisons bcrypt)
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 # Schéma OAuth2 : indique à FastAPI comment trouver le token.
 # "tokenUrl" est l'endpoint (relatif) où le client doit aller pour obtenir un token.
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
@@ -25,20 +29,28 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 # Utiliser une variable d'environnement.
 SECRET_KEY = os.getenv("SECRET_KEY", "une_cle_secrete_tres_faible_pour_le_dev")
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30 # Le token expirera après 30 minutes
-
-# --- Fonctions Utilitaires de Sécurité ---
+# Tokens d'accès courts (une révocation "oubliée" ne dure pas) ;
+# le refresh token, long, permet d'en obtenir de nouveaux sans mot de passe
+# (donc sans le coût de bcrypt). Il change à chaque utilisation (rotation).
+ACCESS_TOKEN_EXPIRE_MINUTES = 15 # Le token expirera après 15 minutes
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Vérifie si un mot de passe en clair correspond au hachage."""
-    return pwd_context.verify(plain_password, hashed_password)
+# Cache des utilisateurs authentifiés, clé = empreinte SHA-256 du token
+# (les plus anciens tokens n'ont pas de jti ; le token lui-même n'est pas
+# gardé en mémoire). Ne sert qu'aux anciens tokens sans claims "uid"/"adm"
+# (émis avant leur ajout) : une seule requête SQL par token, puis le cache.
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+principal_cache = TTLCache(maxsize=10000, ttl=PRINCIPAL_CACHE_TTL)
 
-def get_password_hash(password: str) -> str:
-    """Hache un mot de passe."""
-    return pwd_context.hash(password)
+# --- Fonctions Utilitaires de Sécurité ---
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    """Crée un token JWT."""
+    """
+    Crée un token JWT.
+    'data' contient "sub" (username) et, pour éviter toute requête SQL à
+    l'authentification, "uid" (id) et "adm" (is_admin). Un identifiant
+    unique "jti" est ajouté pour pouvoir révoquer le token.
+    """
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -46,24 +58,67 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         # Durée de vie par défaut si non fournie
         expire = datetime.utcnow() + timedelta(minutes=15)
     
-    to_encode.update({"exp": expire}) # Ajoute la date d'expiration
+    to_encode.setdefault("typ", "access")
+    to_encode.update({
+        "exp": expire, # Ajoute la date d'expiration
+        "jti": uuid.uuid4().hex,
+    })
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None):
+    """Crée un refresh token (JWT de type "refresh", longue durée)."""
+    return create_access_token(
+        {**data, "typ": "refresh"},
+        expires_delta or timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    )
+
+def create_token_pair(user: User) -> dict:
+    """Token d'accès + refresh token pour un utilisateur."""
+    claims = {"sub": user.username, "uid": user.id, "adm": user.is_admin}
+    return {
+        "access_token": create_access_token(
+            claims, timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        ),
+        "refresh_token": create_refresh_token(claims),
+        "token_type": "bearer",
+    }
+
+def decode_refresh_token(token: str) -> dict:
+    """Décode et valide un refresh token (signature, expiration, type, révocation)."""
+    refresh_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Refresh token invalide ou expiré",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise refresh_exception
+    if (
+        payload.get("typ") != "refresh"
+        or payload.get("jti") is None
+        or revocation_list.is_revoked(payload["jti"])
+    ):
+        raise refresh_exception
+    return payload
+
 # --- Fonctions de Dépendance ---
 
-def get_user(session: Session, username: str) -> Optional[User]:
+async def get_user(session: AsyncSession, username: str) -> Optional[User]:
     """Récupère un utilisateur par son username depuis la DB."""
     statement = select(User).where(User.username == username)
-    return session.exec(statement).first()
+    return (await session.exec(statement)).first()
 
-def get_current_user(
+async def get_current_user(
     token: str = Depends(oauth2_scheme), 
-    session: Session = Depends(get_session)
-) -> User:
+    session: AsyncSession = Depends(get_session)
+) -> CurrentUser:
     """
     Dépendance principale pour la sécurité des endpoints.
-    Décode le token, valide l'utilisateur et renvoie l'objet User.
+    Décode le token, valide l'utilisateur et renvoie un CurrentUser.
+    Chemin rapide : tout est dans le token, AUCUNE requête SQL
+    (la session n'ouvre de connexion que si on s'en sert).
     """
     # Exception standard en cas d'échec
     credentials_exception = HTTPException(
@@ -81,19 +136,50 @@ def get_current_user(
     except JWTError:
         # Si le token est malformé ou expiré
         raise credentials_exception
-    
-    # Trouve l'utilisateur dans la DB
-    user = get_user(session, username=username)
+
+    # Un refresh token ne permet PAS d'appeler l'API
+    if payload.get("typ", "access") != "access":
+        raise credentials_exception
+
+    # Token révoqué (déconnexion...) : vérifié en mémoire, en O(1)
+    token_id = payload.get("jti")
+    if token_id is not None and revocation_list.is_revoked(token_id):
+        raise credentials_exception
+
+    # Chemin rapide : l'id et le rôle sont dans le token
+    if payload.get("uid") is not None and payload.get("adm") is not None:
+        return CurrentUser(
+            id=payload["uid"],
+            username=username,
+            is_admin=payload["adm"],
+            token_id=token_id,
+            token_expires_at=payload.get("exp"),
+        )
+
+    # Ancien token (sans claims) : une requête SQL, puis le cache
+    cache_key = hashlib.sha256(token.encode()).hexdigest()
+    principal = principal_cache.get(cache_key)
+    if principal is not MISSING:
+        return principal
+
+    user = await get_user(session, username=username)
     if user is None:
         # Si l'utilisateur n'existe plus (ex: compte supprimé)
         raise credentials_exception
-    
-    # Renvoie l'objet User, qui peut être utilisé dans l'endpoint
-    return user
 
-def get_current_admin_user(
-    current_user: User = Depends(get_current_user)
-) -> User:
+    principal = CurrentUser(
+        id=user.id,
+        username=user.username,
+        is_admin=user.is_admin,
+        token_id=token_id,
+        token_expires_at=payload.get("exp"),
+    )
+    principal_cache.set(cache_key, principal)
+    return principal
+
+async def get_current_admin_user(
+    current_user: CurrentUser = Depends(get_current_user)
+) -> CurrentUser:
     """
     Dépendance qui vérifie si l'utilisateur est
     connecté ET s'il est un administrateur.
@@ -0,0 +1,62 @@
+"""
+Compare deux résultats de bench/run.py (avant / après un changement) :
+
+    python -m bench.compare bench-before.json bench-after.json
+"""
+import json
+import sys
+
+# (libellé, chemin dans le résultat, une hausse est-elle une amélioration ?)
+COLUMNS = [
+    ("req/s", ("throughput_rps",), True),
+    ("p50 ms", ("latency_ms", "p50"), False),
+    ("p95 ms", ("latency_ms", "p95"), False),
+    ("p99 ms", ("latency_ms", "p99"), False),
+    ("SQL/req", ("queries_per_request",), False),
+]
+
+
+def _get(result: dict, path):
+    for key in path:
+        result = result.get(key, {}) if isinstance(result, dict) else {}
+    return result if isinstance(result, (int, float)) else None
+
+
+def _delta(before, after, higher_is_better: bool) -> str:
+    if before is None or after is None:
+        return "—"
+    if before == 0:
+        return f"{after}"
+    change = (after - before) / before * 100
+    better = change > 0 if higher_is_better else change < 0
+    marker = "" if abs(change) < 5 else (" +" if better else " !")
+    return f"{before} -> {after} ({change:+.0f}%){marker}"
+
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print(__doc__, file=sys.stderr)
+        return 2
+    with open(argv[0], encoding="utf-8") as file:
+        before = json.load(file)
+    with open(argv[1], encoding="utf-8") as file:
+        after = json.load(file)
+
+    print(f"avant : {before['meta'].get('commit')}  ({before['meta'].get('database')}, {before['meta'].get('scale')})")
+    print(f"après : {after['meta'].get('commit')}  ({after['meta'].get('database')}, {after['meta'].get('scale')})")
+    print("(+ = amélioration, ! = régression, au-delà de 5 %)\n")
+    for name in sorted(set(before["scenarios"]) | set(after["scenarios"])):
+        old = before["scenarios"].get(name, {})
+        new = after["scenarios"].get(name, {})
+        print(name)
+        for label, path, higher_is_better in COLUMNS:
+            print(f"  {label:<8} {_delta(_get(old, path), _get(new, path), higher_is_better)}")
+        for key in ("errors", "oversold_variants"):
+            if old.get(key) or new.get(key):
+                print(f"  {key:<8} {old.get(key)} -> {new.get(key)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
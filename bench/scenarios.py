@@ -0,0 +1,283 @@
+import asyncio
+import math
+import random
+import time
+from collections import Counter
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+from sqlalchemy import func, select
+from sqlmodel import Session
+
+from cache import catalog_cache
+from database import QueryCounter, async_engine, engine
+from models import OrderItem, Variant
+
+from bench import seed
+
+# --- Scénarios de charge ---
+# Chaque scénario envoie de vraies requêtes HTTP à l'application, dans le
+# même processus (httpx + transport ASGI : pas de réseau, pas de serveur),
+# avec N "clients virtuels" en parallèle, et mesure chaque requête.
+
+SEARCH_WORDS = [word.lower()[:4] for word in seed.NOUNS + seed.MATERIALS]
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Percentile "au rang le plus proche" d'une liste déjà triée."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Recorder:
+    """Latences (ms) et codes HTTP d'un scénario, plus ses requêtes SQL."""
+
+    def __init__(self, name: str, concurrency: int):
+        self.name = name
+        self.concurrency = concurrency
+        self.latencies: List[float] = []
+        self.statuses: Counter = Counter()
+        self.extra: Dict = {}
+        self.started = 0.0
+        self.elapsed = 0.0
+        # Requêtes SQL des endpoints (moteur async) et des tâches en thread
+        self._counters = [QueryCounter(async_engine.sync_engine), QueryCounter(engine)]
+
+    def __enter__(self):
+        for counter in self._counters:
+            counter.__enter__()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.started
+        for counter in self._counters:
+            counter.__exit__(*exc)
+        return False
+
+    async def request(self, client: httpx.AsyncClient, method: str, url: str, **kwargs) -> httpx.Response:
+        started = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        self.latencies.append((time.perf_counter() - started) * 1000)
+        self.statuses[response.status_code] += 1
+        return response
+
+    def report(self) -> Dict:
+        latencies = sorted(self.latencies)
+        requests = len(latencies)
+        queries = sum(counter.count for counter in self._counters)
+        errors = sum(count for status, count in self.statuses.items() if status >= 500)
+        return {
+            "concurrency": self.concurrency,
+            "requests": requests,
+            "errors": errors,
+            "statuses": {str(status): count for status, count in sorted(self.statuses.items())},
+            "duration_s": round(self.elapsed, 3),
+            "throughput_rps": round(requests / self.elapsed, 1) if self.elapsed else 0.0,
+            "latency_ms": {
+                "p50": round(percentile(latencies, 0.50), 2),
+                "p95": round(percentile(latencies, 0.95), 2),
+                "p99": round(percentile(latencies, 0.99), 2),
+                "max": round(latencies[-1], 2) if latencies else 0.0,
+                "mean": round(sum(latencies) / requests, 2) if requests else 0.0,
+            },
+            "queries": queries,
+            "queries_per_request": round(queries / requests, 2) if requests else 0.0,
+            **self.extra,
+        }
+
+
+async def run_workers(
+    concurrency: int,
+    total: int,
+    action: Callable[[int], Awaitable[None]],
+) -> None:
+    """Exécute 'total' actions avec 'concurrency' clients virtuels en parallèle."""
+    remaining = iter(range(total))
+
+    async def worker():
+        for index in remaining:
+            await action(index)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+# --- 1. Navigation (lecture) ---
+
+async def browse(
+    client: httpx.AsyncClient,
+    sizes: Dict[str, int],
+    requests: int,
+    concurrency: int,
+) -> Dict:
+    """
+    Parcours du catalogue : pages de la liste (avec ou sans filtre),
+    fiches produit et recherches, dans les proportions d'un vrai trafic.
+    """
+    rng = random.Random(seed.SEED)
+    products = sizes["products"]
+    plan = []
+    for _ in range(requests):
+        draw = rng.random()
+        if draw < 0.55:
+            plan.append(f"/products/?limit=50&after={rng.randrange(products)}")
+        elif draw < 0.70:
+            plan.append(
+                f"/products/?limit=50&size={rng.choice(seed.SIZES)}&color={rng.choice(seed.COLORS)}"
+            )
+        elif draw < 0.90:
+            plan.append(f"/products/{rng.randrange(1, products + 1)}")
+        else:
+            plan.append(f"/products/search?q={rng.choice(SEARCH_WORDS)}&limit=20")
+
+    # Chaque palier part d'un cache vide (sinon le 2e palier ne lit que la mémoire)
+    catalog_cache.clear()
+    with Recorder("browse", concurrency) as recorder:
+        async def action(index: int):
+            await recorder.request(client, "GET", plan[index])
+        await run_workers(concurrency, requests, action)
+    return recorder.report()
+
+
+# --- 2. Rafale d'achats sur quelques produits "vedettes" ---
+
+async def checkout_burst(
+    client: httpx.AsyncClient,
+    customer_headers: List[Dict[str, str]],
+    orders: int,
+    concurrency: int,
+    hot_variants: int = 20,
+    stock: int = 50,
+    name: str = "checkout_burst",
+) -> Dict:
+    """
+    Beaucoup de clients achètent en même temps les mêmes variantes, au stock
+    limité. Vérifie ensuite qu'aucune n'a été survendue :
+    stock final = stock initial - quantités commandées, jamais négatif
+    (extra["oversold_variants"], voir bench/run.py).
+
+    Avec hot_variants=1 (scénario checkout_hot), toutes les commandes se
+    disputent la même ligne : le pire cas pour le verrou de
+    routers/orders.py, une fois le stock épuisé les commandes reçoivent 400.
+
+    Ne vaut que sur PostgreSQL : SQLite ignore SELECT ... FOR UPDATE, des
+    mises à jour concurrentes du stock peuvent s'y écraser.
+    """
+    rng = random.Random(seed.SEED)
+    hot_ids = list(range(1, hot_variants + 1))
+    seed.reset_stock(hot_ids, stock)
+    first_order = seed.last_order_id()
+    carts = [
+        {"items": [
+            {"variant_id": variant_id, "quantity": rng.randint(1, 3)}
+            for variant_id in rng.sample(hot_ids, rng.randint(1, min(3, hot_variants)))
+        ]}
+        for _ in range(orders)
+    ]
+
+    with Recorder(name, concurrency) as recorder:
+        async def action(index: int):
+            await recorder.request(
+                client, "POST", "/orders/", json=carts[index],
+                headers=customer_headers[index % len(customer_headers)],
+            )
+        await run_workers(concurrency, orders, action)
+
+    with Session(engine) as session:
+        ordered = dict(session.execute(
+            select(OrderItem.variant_id, func.sum(OrderItem.quantity))
+            .where(OrderItem.order_id > first_order, OrderItem.variant_id.in_(hot_ids))
+            .group_by(OrderItem.variant_id)
+        ).all())
+        final = dict(session.execute(
+            select(Variant.id, Variant.stock_quantity).where(Variant.id.in_(hot_ids))
+        ).all())
+    recorder.extra["oversold_variants"] = sum(
+        1 for variant_id in hot_ids
+        if final[variant_id] < 0 or final[variant_id] != stock - ordered.get(variant_id, 0)
+    )
+    recorder.extra["units_sold"] = sum(ordered.values())
+    recorder.extra["units_available"] = stock * hot_variants
+
+    seed.delete_orders_after(first_order)
+    seed.reset_stock(hot_ids, seed.INITIAL_STOCK)
+    return recorder.report()
+
+
+# --- 3. Commandes de 1, 10 ou 50 articles ---
+
+async def checkout_cart(
+    client: httpx.AsyncClient,
+    customer_headers: List[Dict[str, str]],
+    sizes: Dict[str, int],
+    items: int,
+    orders: int,
+    concurrency: int,
+) -> Dict:
+    """Coût d'une commande selon sa taille (variantes différentes, stock suffisant)."""
+    rng = random.Random(seed.SEED + items)
+    # Les variantes "vedettes" de checkout_burst sont exclues
+    candidates = range(100, sizes["variants"] + 1)
+    carts = [
+        {"items": [
+            {"variant_id": variant_id, "quantity": 1}
+            for variant_id in rng.sample(candidates, items)
+        ]}
+        for _ in range(orders)
+    ]
+    first_order = seed.last_order_id()
+
+    with Recorder(f"checkout_{items}_items", concurrency) as recorder:
+        async def action(index: int):
+            await recorder.request(
+                client, "POST", "/orders/", json=carts[index],
+                headers=customer_headers[index % len(customer_headers)],
+            )
+        await run_workers(concurrency, orders, action)
+
+    seed.delete_orders_after(first_order)
+    seed.reset_stock(
+        sorted({item["variant_id"] for cart in carts for item in cart["items"]}),
+        seed.INITIAL_STOCK,
+    )
+    return recorder.report()
+
+
+# --- 4. Administration : export et liste des commandes ---
+
+async def admin_export(
+    client: httpx.AsyncClient,
+    admin_headers: Dict[str, str],
+    repeat: int,
+) -> Dict:
+    """Export complet des commandes (NDJSON puis CSV), lu jusqu'au bout."""
+    with Recorder("admin_export", 1) as recorder:
+        exported = Counter()
+        for _ in range(repeat):
+            for fmt in ("ndjson", "csv"):
+                response = await recorder.request(
+                    client, "GET", f"/orders/export?format={fmt}", headers=admin_headers
+                )
+                exported[f"{fmt}_bytes"] = len(response.content)
+                exported[f"{fmt}_lines"] = response.content.count(b"\n")
+    recorder.extra.update(exported)
+    return recorder.report()
+
+
+async def admin_list(
+    client: httpx.AsyncClient,
+    admin_headers: Dict[str, str],
+    pages: int,
+) -> Dict:
+    """Parcours paginé (curseur) de la liste admin des commandes."""
+    with Recorder("admin_list", 1) as recorder:
+        after: Optional[str] = None
+        for _ in range(pages):
+            url = "/orders/?limit=200" + (f"&after={after}" if after else "")
+            response = await recorder.request(client, "GET", url, headers=admin_headers)
+            after = response.headers.get("x-next-cursor")
+            if after is None:
+                break
+    return recorder.report()
@@ -0,0 +1,186 @@
+import random
+import time
+from datetime import timedelta
+from typing import Dict, List
+
+from sqlalchemy import delete, func, insert, select, text
+from sqlmodel import SQLModel, Session
+
+from database import engine
+from hashing import get_password_hash
+from analytics import rebuild_daily_sales
+from models import Order, OrderItem, Product, User, Variant, utcnow
+
+# --- Jeu de données synthétique ---
+# Déterministe (graine fixe) : deux exécutions à la même échelle produisent
+# exactement le même catalogue, les mêmes clients et les mêmes commandes,
+# donc des mesures comparables d'un commit à l'autre.
+
+SCALES = {
+    # produits, clients, commandes
+    "1k": {"products": 1_000, "users": 200, "orders": 2_000},
+    "10k": {"products": 10_000, "users": 1_000, "orders": 10_000},
+    "100k": {"products": 100_000, "users": 5_000, "orders": 50_000},
+}
+
+SEED = 42
+BATCH_SIZE = 2_000
+BENCH_PASSWORD = "bench-password"
+ADMIN_USERNAME = "bench_admin"
+
+SIZES = ["XS", "S", "M", "L", "XL"]
+COLORS = ["noir", "blanc", "rouge", "bleu", "vert", "beige", "rose", "kaki"]
+NOUNS = ["Robe", "Jupe", "Chemise", "Pantalon", "Veste", "Pull", "Short", "Manteau", "Top", "Gilet"]
+ADJECTIVES = ["longue", "courte", "fleurie", "plissée", "ample", "ajustée", "légère", "brodée", "rayée", "unie"]
+MATERIALS = ["coton", "lin", "soie", "laine", "denim", "viscose", "polyester", "velours"]
+STATUSES = ["en_attente", "en_attente", "expediee", "livree", "annulee"]
+VARIANTS_PER_PRODUCT = 3
+INITIAL_STOCK = 1_000
+ORDER_HISTORY_DAYS = 90 # commandes réparties sur les derniers jours (statistiques)
+
+
+def _batched(rows: List[dict], size: int = BATCH_SIZE):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def _insert_returning_ids(session: Session, model, rows: List[dict]) -> List[int]:
+    ids: List[int] = []
+    for batch in _batched(rows):
+        ids += session.execute(
+            insert(model).returning(model.id, sort_by_parameter_order=True), batch
+        ).scalars().all()
+    return ids
+
+
+def dataset_size() -> Dict[str, int]:
+    with Session(engine) as session:
+        return {
+            "products": session.execute(select(func.count()).select_from(Product)).scalar_one(),
+            "variants": session.execute(select(func.count()).select_from(Variant)).scalar_one(),
+            "users": session.execute(select(func.count()).select_from(User)).scalar_one(),
+            "orders": session.execute(select(func.count()).select_from(Order)).scalar_one(),
+        }
+
+
+def reset_database() -> None:
+    """Supprime TOUTES les tables (y compris le suivi des migrations)."""
+    SQLModel.metadata.drop_all(engine)
+    with engine.begin() as connection:
+        connection.execute(text("DROP TABLE IF EXISTS alembic_version"))
+
+
+def seed(products: int, users: int, orders: int) -> Dict[str, float]:
+    """Remplit une base vide ; renvoie le nombre de lignes et la durée."""
+    started = time.perf_counter()
+    rng = random.Random(SEED)
+    # Un seul hachage bcrypt pour tous les clients (sinon des minutes de CPU)
+    password_hash = get_password_hash(BENCH_PASSWORD)
+
+    with Session(engine) as session:
+        user_ids = _insert_returning_ids(session, User, [
+            {"username": ADMIN_USERNAME, "hashed_password": password_hash, "is_admin": True}
+        ] + [
+            {"username": f"bench_user_{i}", "hashed_password": password_hash, "is_admin": False}
+            for i in range(users)
+        ])[1:]
+
+        product_ids = _insert_returning_ids(session, Product, [
+            {
+                "name": f"{rng.choice(NOUNS)} {rng.choice(ADJECTIVES)} {rng.choice(MATERIALS)} {i}",
+                "description": (
+                    f"{rng.choice(NOUNS)} en {rng.choice(MATERIALS)}, "
+                    f"coupe {rng.choice(ADJECTIVES)}. Référence {i}."
+                ),
+                "image_urls": [f"https://cdn.example.com/products/{i}/{n}.jpg" for n in range(2)],
+            }
+            for i in range(products)
+        ])
+
+        variant_rows = []
+        for product_id in product_ids:
+            for size in rng.sample(SIZES, VARIANTS_PER_PRODUCT):
+                variant_rows.append({
+                    "product_id": product_id,
+                    "size": size,
+                    "color": rng.choice(COLORS),
+                    "price": round(rng.uniform(5, 120), 2),
+                    "alibaba_source_url": f"https://alibaba.example.com/item/{len(variant_rows)}",
+                    "stock_quantity": INITIAL_STOCK,
+                })
+        variant_ids = _insert_returning_ids(session, Variant, variant_rows)
+
+        # Générateur à part pour les dates : le reste du jeu de données ne change pas
+        dates = random.Random(SEED + 1)
+        now = utcnow()
+        order_ids = _insert_returning_ids(session, Order, [
+            {
+                "user_id": rng.choice(user_ids),
+                "status": rng.choice(STATUSES),
+                "created_at": now - timedelta(seconds=dates.randrange(ORDER_HISTORY_DAYS * 86400)),
+            }
+            for _ in range(orders)
+        ])
+        prices = {
+            variant_id: row["price"] for variant_id, row in zip(variant_ids, variant_rows)
+        }
+        item_rows = [
+            {
+                "order_id": order_id,
+                "variant_id": variant_id,
+                "quantity": rng.randint(1, 3),
+                "unit_price": prices[variant_id],
+            }
+            for order_id in order_ids
+            for variant_id in rng.sample(variant_ids, rng.randint(1, 4))
+        ]
+        for batch in _batched(item_rows):
+            session.execute(insert(OrderItem), batch)
+        # Les commandes ont été insérées sans passer par l'API : agrégats recalculés
+        rebuild_daily_sales(session.connection())
+        session.commit()
+
+    return {
+        "products": len(product_ids),
+        "variants": len(variant_ids),
+        "users": len(user_ids),
+        "orders": len(order_ids),
+        "order_items": len(item_rows),
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def bench_users(limit: int) -> List[User]:
+    """Les premiers clients (non admins) et l'admin, pour signer leurs tokens."""
+    with Session(engine) as session:
+        admin = session.execute(
+            select(User).where(User.username == ADMIN_USERNAME)
+        ).scalar_one()
+        users = session.execute(
+            select(User).where(User.is_admin == False).order_by(User.id).limit(limit) # noqa: E712
+        ).scalars().all()
+        session.expunge_all()
+    return [admin] + list(users)
+
+
+def reset_stock(variant_ids: List[int], stock: int) -> None:
+    """Remet le stock de ces variantes à une valeur connue (avant un scénario d'achat)."""
+    with engine.begin() as connection:
+        connection.execute(
+            Variant.__table__.update()
+            .where(Variant.__table__.c.id.in_(variant_ids))
+            .values(stock_quantity=stock)
+        )
+
+
+def delete_orders_after(order_id: int) -> None:
+    """Supprime les commandes créées par un scénario (la base reste réutilisable)."""
+    with engine.begin() as connection:
+        connection.execute(delete(OrderItem).where(OrderItem.order_id > order_id))
+        connection.execute(delete(Order).where(Order.id > order_id))
+        rebuild_daily_sales(connection)
+
+
+def last_order_id() -> int:
+    with Session(engine) as session:
+        return session.execute(select(func.max(Order.id))).scalar() or 0
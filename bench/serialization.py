@@ -0,0 +1,150 @@
+"""
+Micro-benchmark de la sérialisation des réponses (sans base ni HTTP) :
+le chemin d'avant (model_dump dans l'endpoint, puis revalidation par le
+response_model de FastAPI et encodage par le module json) comparé à
+serialization.dump_json (une passe pydantic-core, directement en bytes).
+
+    python -m bench.serialization --variants 10000
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from typing import Callable, Dict, List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from models import Order, OrderItem, OrderReadAdmin, Product, ProductReadWithVariants, User, Variant
+from serialization import FastJSONResponse, dump_json
+
+from bench import seed
+
+
+def build_catalog(variants: int) -> List[Product]:
+    """Produits (objets ORM en mémoire) totalisant 'variants' variantes."""
+    rng = random.Random(seed.SEED)
+    products = []
+    variant_id = 0
+    for product_id in range(1, variants // seed.VARIANTS_PER_PRODUCT + 1):
+        product = Product(
+            id=product_id,
+            name=f"{rng.choice(seed.NOUNS)} {rng.choice(seed.ADJECTIVES)} {product_id}",
+            description=f"{rng.choice(seed.NOUNS)} en {rng.choice(seed.MATERIALS)}.",
+            image_urls=[f"https://cdn.example.com/products/{product_id}/{n}.jpg" for n in range(2)],
+        )
+        for size in rng.sample(seed.SIZES, seed.VARIANTS_PER_PRODUCT):
+            variant_id += 1
+            product.variants.append(Variant(
+                id=variant_id,
+                product_id=product_id,
+                size=size,
+                color=rng.choice(seed.COLORS),
+                price=round(rng.uniform(5, 120), 2),
+                alibaba_source_url=f"https://alibaba.example.com/item/{variant_id}",
+                stock_quantity=seed.INITIAL_STOCK,
+            ))
+        products.append(product)
+    return products
+
+
+def build_orders(items: int, catalog: List[Product]) -> List[Order]:
+    """Commandes (objets ORM en mémoire, modèle ADMIN) totalisant 'items' lignes."""
+    rng = random.Random(seed.SEED)
+    variants = [variant for product in catalog for variant in product.variants]
+    user = User(id=1, username="bench_user_0", hashed_password="x", is_admin=False)
+    orders = []
+    for order_id in range(1, items // 5 + 1):
+        order = Order(id=order_id, user_id=user.id, status=rng.choice(seed.STATUSES))
+        order.user = user
+        for line in range(5):
+            variant = rng.choice(variants)
+            order.items.append(OrderItem(
+                id=order_id * 5 + line, order_id=order_id, variant_id=variant.id,
+                quantity=rng.randint(1, 3), variant=variant,
+            ))
+        orders.append(order)
+    return orders
+
+
+def timed(function: Callable[[], bytes], repeat: int) -> Dict:
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = function()
+        durations.append(time.perf_counter() - started)
+    durations.sort()
+    return {
+        "median_ms": round(durations[len(durations) // 2] * 1000, 1),
+        "min_ms": round(durations[0] * 1000, 1),
+        "bytes": len(body),
+    }
+
+
+def compare(name: str, response_type, objects, repeat: int) -> Dict:
+    # Le response_model tel que FastAPI le construit pour la route
+    field = create_model_field(name="Response", type_=response_type, mode="serialization")
+    item_type = response_type.__args__[0]
+
+    def fastapi_path() -> bytes:
+        # Avant : model_dump dans l'endpoint (c'est ce qui était mis en
+        # cache), puis revalidation + dump par FastAPI et json.dumps
+        content = [item_type.model_validate(obj).model_dump(mode="json") for obj in objects]
+        return fastapi_encode(content)
+
+    def fastapi_encode(content) -> bytes:
+        serialized = asyncio.run(serialize_response(field=field, response_content=content))
+        return JSONResponse(serialized).body
+
+    def fast_path() -> bytes:
+        return FastJSONResponse(dump_json(response_type, objects)).body
+
+    before = fastapi_path()
+    after = fast_path()
+    if json.loads(before) != json.loads(after):
+        raise SystemExit(f"{name} : les deux chemins ne produisent pas le même JSON")
+
+    cached = [item_type.model_validate(obj).model_dump(mode="json") for obj in objects]
+    result = {
+        "objects": len(objects),
+        "before": timed(fastapi_path, repeat),
+        "after": timed(fast_path, repeat),
+        # Réponse servie depuis le cache : avant, le dict était revalidé et
+        # réencodé à chaque hit ; maintenant les bytes partent tels quels
+        "cache_hit_before": timed(lambda: fastapi_encode(cached), repeat),
+        "cache_hit_after": timed(lambda: FastJSONResponse(after).body, repeat),
+    }
+    result["speedup"] = round(result["before"]["median_ms"] / max(result["after"]["median_ms"], 0.1), 1)
+    return result
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Micro-benchmark de la sérialisation")
+    parser.add_argument("--variants", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    catalog = build_catalog(args.variants)
+    orders = build_orders(args.variants, catalog)
+    results = {
+        "catalog": compare("catalog", List[ProductReadWithVariants], catalog, args.repeat),
+        "admin_orders": compare("admin_orders", List[OrderReadAdmin], orders, args.repeat),
+    }
+    for name, result in results.items():
+        print(
+            f"{name:<13} {result['objects']:>6} objets  "
+            f"avant {result['before']['median_ms']:>7} ms  "
+            f"après {result['after']['median_ms']:>7} ms  (x{result['speedup']})  "
+            f"hit du cache {result['cache_hit_before']['median_ms']} -> "
+            f"{result['cache_hit_after']['median_ms']} ms",
+            file=sys.stderr,
+        )
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
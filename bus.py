@@ -0,0 +1,257 @@
+import json
+import logging
+import os
+import select
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# --- Bus d'invalidation entre processus ---
+# Le Dockerfile lance "gunicorn -w 4" : 4 processus, donc 4 caches en mémoire.
+# Quand un admin modifie le catalogue, seul le worker qui a traité la requête
+# voit l'écriture. Le bus diffuse l'invalidation à TOUS les workers.
+#
+# Trois implémentations interchangeables :
+# - LocalBus    : un seul processus (dev, tests unitaires)
+# - FileBus     : journal partagé sur le disque (tests multi-workers en local)
+# - PostgresBus : LISTEN/NOTIFY PostgreSQL (production)
+
+# Callback d'un abonné. Il reçoit les données du message, ou None quand des
+# messages ont pu être perdus (reconnexion...) : l'abonné doit alors
+# considérer que TOUT est potentiellement périmé.
+Subscriber = Callable[[Optional[Dict[str, Any]]], None]
+
+
+class InvalidationBus:
+    """
+    Base commune : gestion des abonnés et livraison locale.
+    Les sous-classes implémentent _send() (diffusion aux autres processus)
+    et éventuellement start()/stop() (thread d'écoute).
+    """
+
+    def __init__(self):
+        # Identifiant unique de CE processus (pour ignorer nos propres messages)
+        self.origin = uuid.uuid4().hex
+        self._subscribers: Dict[str, List[Subscriber]] = defaultdict(list)
+
+    def subscribe(self, topic: str, callback: Subscriber, first: bool = False) -> None:
+        """Les abonnés sont appelés dans l'ordre ; 'first' : avant les autres."""
+        if first:
+            self._subscribers[topic].insert(0, callback)
+        else:
+            self._subscribers[topic].append(callback)
+
+    def publish(self, topic: str, data: Dict[str, Any]) -> None:
+        """
+        Livre le message tout de suite dans CE processus (l'admin voit sa
+        propre écriture), puis le diffuse aux autres workers.
+        """
+        self._deliver(topic, data)
+        message = {"origin": self.origin, "topic": topic, "data": data}
+        self._send(json.dumps(message, separators=(",", ":")))
+
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+    def _send(self, payload: str) -> None:
+        raise NotImplementedError
+
+    def _deliver(self, topic: str, data: Optional[Dict[str, Any]]) -> None:
+        for callback in self._subscribers.get(topic, []):
+            try:
+                callback(data)
+            except Exception:
+                logger.exception("Erreur d'un abonné du bus", extra={"topic": topic})
+
+    def _receive(self, payload: str) -> None:
+        """Message brut venant d'un autre processus."""
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            return
+        if message.get("origin") == self.origin:
+            return  # Déjà livré localement par publish()
+        self._deliver(message.get("topic"), message.get("data"))
+
+    def _deliver_gap(self) -> None:
+        """Des messages ont pu être perdus : on prévient tous les abonnés."""
+        for topic in list(self._subscribers):
+            self._deliver(topic, None)
+
+
+class LocalBus(InvalidationBus):
+    """Un seul processus : la livraison locale suffit."""
+
+    def _send(self, payload: str) -> None:
+        pass
+
+
+class _ListenerThreadMixin:
+    """Gestion du thread d'écoute en arrière-plan."""
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, name=type(self).__name__, daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+class FileBus(_ListenerThreadMixin, InvalidationBus):
+    """
+    Bus basé sur un fichier journal partagé (ajout en fin de fichier).
+    Chaque worker lit périodiquement les nouvelles lignes.
+    Prévu pour les tests et le développement multi-workers sur une machine.
+    """
+
+    def __init__(self, path: str, poll_interval: float = 0.2):
+        super().__init__()
+        self.path = path
+        self.poll_interval = poll_interval
+        self._stop_event = threading.Event()
+        self._thread = None
+        # On ne rejoue pas l'historique : le cache démarre vide.
+        self._offset = os.path.getsize(path) if os.path.exists(path) else 0
+
+    def _send(self, payload: str) -> None:
+        # O_APPEND : chaque écriture (courte) est ajoutée atomiquement en fin de fichier
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, (payload + "\n").encode("utf-8"))
+        finally:
+            os.close(fd)
+
+    def poll(self) -> None:
+        """Lit les lignes ajoutées depuis le dernier passage."""
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            size = 0
+        if size < self._offset:
+            # Fichier tronqué ou recréé : des messages ont pu être perdus
+            self._offset = 0
+            self._deliver_gap()
+        if size == self._offset:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            chunk = f.read(size - self._offset)
+        # On ne consomme que les lignes complètes
+        end = chunk.rfind(b"\n") + 1
+        self._offset += end
+        for line in chunk[:end].splitlines():
+            if line:
+                self._receive(line.decode("utf-8"))
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.poll_interval):
+            try:
+                self.poll()
+            except Exception as exc:
+                logger.warning("Erreur de lecture du bus fichier : %r", exc)
+
+
+class PostgresBus(_ListenerThreadMixin, InvalidationBus):
+    """
+    Bus basé sur LISTEN/NOTIFY de PostgreSQL.
+    Un thread par worker garde une connexion dédiée en écoute sur le canal ;
+    la publication passe par le pool du moteur SQLAlchemy.
+    """
+
+    def __init__(self, engine, channel: str = "catalog_invalidation"):
+        super().__init__()
+        self.engine = engine
+        self.channel = channel
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _send(self, payload: str) -> None:
+        from sqlalchemy import text
+        with self.engine.begin() as conn:
+            conn.execute(
+                text("SELECT pg_notify(:channel, :payload)"),
+                {"channel": self.channel, "payload": payload},
+            )
+
+    def _connect(self):
+        import psycopg2
+        from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+        dsn = self.engine.url.set(drivername="postgresql").render_as_string(
+            hide_password=False
+        )
+        conn = psycopg2.connect(dsn)
+        conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cur:
+            cur.execute(f'LISTEN "{self.channel}"')
+        return conn
+
+    def _run(self) -> None:
+        backoff = 1.0
+        while not self._stop_event.is_set():
+            conn = None
+            try:
+                conn = self._connect()
+                # À CHAQUE connexion, y compris la première : des NOTIFY ont
+                # pu partir avant le LISTEN (pendant une coupure, ou entre le
+                # load_catalog_version() du démarrage et ce LISTEN). Les
+                # abonnés rechargent la version et vident leur cache.
+                self._deliver_gap()
+                backoff = 1.0
+                while not self._stop_event.is_set():
+                    readable, _, _ = select.select([conn], [], [], 1.0)
+                    if not readable:
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self._receive(conn.notifies.pop(0).payload)
+            except Exception as exc:
+                logger.warning(
+                    "Bus PostgreSQL déconnecté (%r), nouvel essai dans %.0fs", exc, backoff
+                )
+                self._stop_event.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+
+def build_bus() -> InvalidationBus:
+    """
+    Choisit l'implémentation via la variable d'environnement CACHE_BUS
+    ("local", "file" ou "postgres"). Par défaut : PostgreSQL si la base
+    est PostgreSQL, sinon local.
+    """
+    from database import engine
+
+    backend = os.getenv("CACHE_BUS")
+    if backend is None:
+        backend = "postgres" if engine.dialect.name == "postgresql" else "local"
+    if backend == "postgres":
+        return PostgresBus(engine, channel=os.getenv("CACHE_BUS_CHANNEL", "catalog_invalidation"))
+    if backend == "file":
+        return FileBus(os.getenv("CACHE_BUS_FILE", "/tmp/ecommerce-cache-bus.log"))
+    if backend == "local":
+        return LocalBus()
+    raise ValueError(f"CACHE_BUS inconnu : {backend!r}")
+
+
+bus = build_bus()
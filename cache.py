@@ -0,0 +1,302 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+
+from fastapi import Request, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session
+
+from bus import bus
+from database import engine
+from models import CatalogVersion
+
+# --- Cache du catalogue (en mémoire, par processus) ---
+# Le catalogue ne change que lorsqu'un admin appelle les endpoints
+# create/update/delete de produits ou de variantes. Les lectures publiques
+# peuvent donc être servies depuis la mémoire, et ce sont ces endpoints
+# d'écriture qui invalident précisément les entrées concernées.
+
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", "60"))  # secondes
+CATALOG_CACHE_MAXSIZE = int(os.getenv("CATALOG_CACHE_MAXSIZE", "1024"))
+
+# Valeur renvoyée par get() quand la clé est absente
+# (None pourrait être une valeur légitime).
+MISSING = object()
+
+
+class TTLCache:
+    """
+    Cache LRU avec durée de vie (TTL), protégé par un verrou
+    (le thread d'écoute du bus l'invalide en parallèle des requêtes).
+
+    'generation' est incrémenté à chaque invalidation : un lecteur qui a
+    commencé sa requête SQL AVANT une écriture ne doit pas remettre en
+    cache une donnée déjà périmée (voir set()).
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return MISSING
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, generation: int = None) -> None:
+        """
+        Stocke une valeur. Si 'generation' est fourni et qu'une invalidation
+        a eu lieu depuis, la valeur est ignorée (elle peut être périmée).
+        """
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, keys: Iterable[str] = (), prefixes: Iterable[str] = ()) -> None:
+        """Supprime les clés données et toutes celles commençant par un préfixe."""
+        prefixes = tuple(prefixes)
+        with self._lock:
+            self.generation += 1
+            self.invalidations += 1
+            for key in keys:
+                self._data.pop(key, None)
+            if prefixes:
+                for key in [k for k in self._data if k.startswith(prefixes)]:
+                    del self._data[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self.invalidations += 1
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+catalog_cache = TTLCache(maxsize=CATALOG_CACHE_MAXSIZE, ttl=CATALOG_CACHE_TTL)
+
+# --- Clés du cache ---
+PRODUCT_LIST_PREFIX = "products:list:"
+VARIANT_LIST_PREFIX = "variants:list:"
+SEARCH_PREFIX = "products:search:"
+
+
+def product_key(product_id: int) -> str:
+    return f"product:{product_id}"
+
+
+def variant_key(variant_id: int) -> str:
+    return f"variant:{variant_id}"
+
+
+# --- Version du catalogue (pour les ETags) ---
+# Un compteur persistant en base (table "catalogversion", une seule ligne),
+# incrémenté par chaque écriture du catalogue. Chaque worker en garde une
+# copie en mémoire, tenue à jour par le bus : vérifier un ETag ne coûte
+# donc AUCUNE requête SQL, et tous les workers produisent le même ETag.
+
+_catalog_version = 0
+_version_lock = threading.Lock()
+
+
+def current_catalog_version() -> int:
+    return _catalog_version
+
+
+def _set_catalog_version(version: int) -> None:
+    global _catalog_version
+    with _version_lock:
+        # Les messages peuvent arriver dans le désordre : on ne recule jamais
+        _catalog_version = max(_catalog_version, version)
+
+
+def load_catalog_version() -> int:
+    """Lit la version en base (au démarrage, ou après une coupure du bus)."""
+    with Session(engine) as session:
+        row = session.get(CatalogVersion, 1)
+        if row is None:
+            try:
+                row = CatalogVersion(id=1, version=1)
+                session.add(row)
+                session.commit()
+            except IntegrityError:
+                # Un autre worker l'a créée en même temps
+                session.rollback()
+                row = session.get(CatalogVersion, 1)
+        _set_catalog_version(row.version)
+    return _catalog_version
+
+
+def _bump_catalog_version() -> int:
+    """Incrémente la version en base et renvoie la nouvelle valeur."""
+    with Session(engine) as session:
+        version = session.execute(
+            update(CatalogVersion)
+            .where(CatalogVersion.id == 1)
+            .values(version=CatalogVersion.version + 1)
+            .returning(CatalogVersion.version)
+        ).scalar_one_or_none()
+        session.commit()
+    if version is None:
+        return load_catalog_version()
+    return version
+
+
+CATALOG_CACHE_CONTROL = "no-cache"
+
+
+def catalog_etag() -> str:
+    return f'"catalog-{current_catalog_version()}"'
+
+
+def not_modified(request: Request, response: Response) -> Optional[Response]:
+    """
+    GET conditionnel : si le client a déjà la version courante du catalogue
+    (en-tête If-None-Match), renvoie une réponse 304 vide, sans base de données
+    ni sérialisation. Sinon, ajoute l'ETag à la réponse et renvoie None.
+
+    À appeler AVANT de lire le cache ou la base : la version lue ici est au
+    plus ancienne que les données renvoyées, jamais plus récente.
+    """
+    # Le client peut garder la réponse, mais doit la revalider à chaque fois.
+    # Le 304 porte les mêmes ETag et Cache-Control que le 200 (RFC 9110
+    # §15.4.5) : sans Cache-Control, un cache intermédiaire appliquerait
+    # ses propres règles à la réponse revalidée.
+    headers = {"ETag": catalog_etag(), "Cache-Control": CATALOG_CACHE_CONTROL}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        if headers["ETag"] in candidates or "*" in candidates:
+            return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
+# --- Invalidation (appelée par les endpoints d'écriture, APRÈS le commit) ---
+# Les invalidations passent par le bus : elles sont appliquées tout de suite
+# dans ce processus, puis dans tous les autres workers.
+
+CATALOG_TOPIC = "catalog"
+
+
+def _on_catalog_message(data: Optional[Dict[str, Any]]) -> None:
+    # L'ordre compte : on vide le cache AVANT d'annoncer la nouvelle version,
+    # sinon une donnée périmée pourrait être servie avec le nouvel ETag.
+    if data is None:
+        catalog_cache.clear()
+        load_catalog_version()
+        return
+    if data.get("clear"):
+        catalog_cache.clear()
+    else:
+        catalog_cache.invalidate(
+            keys=data.get("keys", ()),
+            prefixes=data.get("prefixes", ()),
+        )
+    if "version" in data:
+        _set_catalog_version(data["version"])
+
+
+bus.subscribe(CATALOG_TOPIC, _on_catalog_message)
+
+
+def _publish_change(keys, prefixes, clear: bool = False) -> None:
+    """Incrémente la version en base puis diffuse l'invalidation (bloquant)."""
+    bus.publish(CATALOG_TOPIC, {
+        "keys": list(keys),
+        "prefixes": list(prefixes),
+        "clear": clear,
+        "version": _bump_catalog_version(),
+    })
+
+
+# Les fonctions ci-dessous sont appelées depuis des endpoints async :
+# le travail bloquant (UPDATE de la version, NOTIFY) part dans un thread
+# pour ne pas figer la boucle d'événements.
+
+async def invalidate_product(product_id: int) -> None:
+    """Un produit a changé : sa fiche et toutes les listes de produits."""
+    await run_in_threadpool(
+        _publish_change,
+        [product_key(product_id)],
+        [PRODUCT_LIST_PREFIX, SEARCH_PREFIX],
+    )
+
+
+async def invalidate_variant(variant_id: int, product_id: int) -> None:
+    """
+    Une variante a changé : sa fiche, la fiche de son produit
+    (qui embarque ses variantes) et toutes les listes.
+    """
+    await run_in_threadpool(
+        _publish_change,
+        [variant_key(variant_id), product_key(product_id)],
+        [PRODUCT_LIST_PREFIX, VARIANT_LIST_PREFIX, SEARCH_PREFIX],
+    )
+
+
+# Au-delà, on vide tout plutôt que d'envoyer des milliers de clés
+# (un NOTIFY PostgreSQL est limité à 8000 octets).
+MAX_PRECISE_INVALIDATIONS = 50
+
+
+async def invalidate_variants(variants) -> None:
+    """Plusieurs variantes ont changé : liste de (variant_id, product_id)."""
+    variants = list(variants)
+    if len(variants) > MAX_PRECISE_INVALIDATIONS:
+        await invalidate_catalog()
+        return
+    keys = set()
+    for variant_id, product_id in variants:
+        keys.update((variant_key(variant_id), product_key(product_id)))
+    await run_in_threadpool(
+        _publish_change,
+        sorted(keys),
+        [PRODUCT_LIST_PREFIX, VARIANT_LIST_PREFIX, SEARCH_PREFIX],
+    )
+
+
+async def invalidate_catalog() -> None:
+    """
+    Vide le cache catalogue de TOUS les workers et change la version
+    (après un import en masse, ou à la demande d'un admin).
+    """
+    await run_in_threadpool(_publish_change, (), (), True)
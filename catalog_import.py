@@ -0,0 +1,358 @@
+import csv
+import json
+import logging
+import time
+from collections import deque
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from models import (
+    ImportProductRow,
+    ImportReport,
+    ImportRowError,
+    Product,
+    Variant,
+)
+
+logger = logging.getLogger(__name__)
+
+# --- Import en masse du catalogue (flux fournisseur) ---
+# Le fichier est lu en flux (ligne par ligne, jamais en entier en mémoire),
+# validé et écrit par lots : une poignée de requêtes SQL par lot au lieu
+# de deux requêtes HTTP + commit par produit/variante.
+#
+# Formats acceptés :
+# - JSON lines : un produit par ligne, avec ses variantes imbriquées
+#   {"name": ..., "description": ..., "image_urls": [...],
+#    "variants": [{"size", "color", "price", "alibaba_source_url", "stock_quantity"}]}
+# - CSV (en-tête obligatoire) : une variante par ligne ; les lignes
+#   consécutives avec le même product_name forment un produit. Un champ
+#   entre guillemets peut contenir des retours à la ligne (descriptions).
+#   Colonnes : product_name, description, image_urls (séparées par "|"),
+#   size, color, price, alibaba_source_url, stock_quantity
+#
+# Produits et variantes existants : seuls les champs présents dans la ligne
+# sont mis à jour (une cellule CSV vide compte comme absente). Un flux qui
+# ne donne que le prix ne remet ni le stock à 0 ni la description à NULL.
+
+IMPORT_CHUNK_SIZE = 500 # produits par lot (une transaction par lot)
+VARIANT_INSERT_BATCH = 1000 # lignes par INSERT (limite de paramètres SQL)
+MAX_REPORTED_ERRORS = 1000
+INVALID_ENCODING = "Encodage invalide (UTF-8 attendu)"
+
+CSV_COLUMNS = [
+    "product_name", "description", "image_urls",
+    "size", "color", "price", "alibaba_source_url", "stock_quantity",
+]
+
+# Champs mis à jour quand la variante existe déjà (même lien Alibaba),
+# s'ils sont fournis par la ligne
+UPSERT_VARIANT_FIELDS = ("size", "color", "price", "stock_quantity")
+PRODUCT_FIELDS = {"name", "description", "image_urls"}
+
+
+def _decode(line: bytes) -> Optional[str]:
+    try:
+        return line.decode("utf-8-sig").rstrip("\r")
+    except UnicodeDecodeError:
+        return None
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Optional[str]]:
+    """
+    Découpe un flux d'octets en lignes de texte (UTF-8), sans tout charger.
+    Une ligne qui n'est pas de l'UTF-8 valide donne None (erreur de ligne).
+    """
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield _decode(line)
+    if pending:
+        yield _decode(pending)
+
+
+async def parse_jsonl(lines: AsyncIterator[str], report: ImportReport):
+    """
+    Produit des tuples (numéro de ligne, dict produit | None, erreur | None).
+    Chaque ligne non vide compte dans report.rows_read.
+    """
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if line is not None and not line.strip():
+            continue
+        report.rows_read += 1
+        if line is None:
+            yield line_number, None, INVALID_ENCODING
+            continue
+        try:
+            yield line_number, json.loads(line), None
+        except ValueError as exc:
+            yield line_number, None, f"JSON invalide : {exc}"
+
+
+class _RecordFeed:
+    """
+    Source du csv.reader unique de parse_csv : on n'y dépose qu'un
+    enregistrement complet à la fois (le lecteur ne bute jamais sur la
+    fin des données au milieu d'un champ entre guillemets).
+    """
+
+    def __init__(self):
+        self.lines = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if not self.lines:
+            raise StopIteration
+        return self.lines.popleft()
+
+
+async def iter_csv_records(lines: AsyncIterator[Optional[str]]):
+    """
+    Produit des tuples (numéro de la première ligne, valeurs | None, erreur | None).
+    Un enregistrement se termine à la fin d'une ligne quand le nombre de
+    guillemets lus est pair (les guillemets d'un champ sont doublés).
+    """
+    feed = _RecordFeed()
+    reader = csv.reader(feed)
+    record: List[str] = []
+    quotes = 0
+    first_line = line_number = 0
+    async for line in lines:
+        line_number += 1
+        if line is None:
+            # L'enregistrement en cours est perdu avec la ligne illisible
+            yield first_line if record else line_number, None, INVALID_ENCODING
+            record, quotes = [], 0
+            continue
+        if not record:
+            first_line = line_number
+        record.append(line + "\n")
+        quotes += line.count('"')
+        if quotes % 2:
+            continue # champ entre guillemets sur plusieurs lignes
+        feed.lines.extend(record)
+        record, quotes = [], 0
+        try:
+            values = next(reader)
+        except csv.Error as exc:
+            yield first_line, None, f"CSV invalide : {exc}"
+            continue
+        if any(value.strip() for value in values):
+            yield first_line, values, None
+    if record:
+        yield first_line, None, "CSV invalide : guillemet non fermé"
+
+
+async def parse_csv(lines: AsyncIterator[Optional[str]], report: ImportReport):
+    """
+    Regroupe les lignes CSV consécutives d'un même produit.
+    Le numéro renvoyé est celui de la première ligne du produit.
+    Chaque enregistrement CSV (une variante), hors en-tête, compte dans
+    report.rows_read : un produit peut en regrouper plusieurs.
+    """
+    header: Optional[List[str]] = None
+    current: Optional[dict] = None
+    current_line = 0
+    async for line_number, values, error in iter_csv_records(lines):
+        if header is not None or error is not None:
+            report.rows_read += 1
+        if error is not None:
+            yield line_number, None, error
+            if header is None:
+                return # sans en-tête, rien n'est lisible
+            continue
+        if header is None:
+            header = [column.strip() for column in values]
+            missing = set(CSV_COLUMNS) - set(header) - {"description", "image_urls"}
+            if missing:
+                yield line_number, None, f"Colonnes manquantes : {', '.join(sorted(missing))}"
+                return
+            continue
+        row = dict(zip(header, values))
+        variant = {
+            "size": row.get("size"),
+            "color": row.get("color"),
+            "price": row.get("price"),
+            "alibaba_source_url": row.get("alibaba_source_url"),
+        }
+        if row.get("stock_quantity"):
+            variant["stock_quantity"] = row["stock_quantity"]
+        name = row.get("product_name")
+        if current is not None and current["name"] == name:
+            current["variants"].append(variant)
+            continue
+        if current is not None:
+            yield current_line, current, None
+        current = {"name": name, "variants": [variant]}
+        if row.get("description"):
+            current["description"] = row["description"]
+        if row.get("image_urls"):
+            current["image_urls"] = row["image_urls"].split("|")
+        current_line = line_number
+    if current is not None:
+        yield current_line, current, None
+
+
+def _upsert_variants_statement(dialect_name: str, rows: List[dict], fields: Tuple[str, ...]):
+    """
+    INSERT ... ON CONFLICT (alibaba_source_url) DO UPDATE, multi-lignes.
+    Seuls les champs 'fields' d'une variante existante sont mis à jour.
+    """
+    dialect_insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    statement = dialect_insert(Variant).values(rows)
+    if not fields:
+        return statement.on_conflict_do_nothing(index_elements=[Variant.alibaba_source_url])
+    return statement.on_conflict_do_update(
+        index_elements=[Variant.alibaba_source_url],
+        set_={field: statement.excluded[field] for field in fields},
+    )
+
+
+async def _save_chunk(
+    session: AsyncSession,
+    products: List[Tuple[int, ImportProductRow]],
+    report: ImportReport,
+) -> None:
+    """Écrit un lot de produits validés, en une transaction."""
+    # 1. Liens Alibaba du lot
+    urls = [v.alibaba_source_url for _, product in products for v in product.variants]
+
+    # 2. Produits déjà connus : retrouvés via le lien d'une de leurs variantes
+    existing = dict((await session.execute(
+        select(Variant.alibaba_source_url, Variant.product_id)
+        .where(Variant.alibaba_source_url.in_(set(urls)))
+    )).all())
+
+    product_ids: List[Optional[int]] = []
+    to_create: List[dict] = []
+    to_update: List[dict] = []
+    for _, product in products:
+        known_ids = [
+            existing[v.alibaba_source_url]
+            for v in product.variants if v.alibaba_source_url in existing
+        ]
+        # Champs fournis par la ligne (None ne remplace jamais une valeur)
+        fields = product.model_dump(include=PRODUCT_FIELDS, exclude_unset=True, exclude_none=True)
+        if known_ids:
+            product_ids.append(known_ids[0])
+            to_update.append({"id": known_ids[0], **fields})
+        else:
+            product_ids.append(None)
+            to_create.append({"description": None, "image_urls": None, **fields})
+
+    # 3. Création des nouveaux produits en UN INSERT (ids renvoyés dans l'ordre)
+    if to_create:
+        created_ids = iter((await session.execute(
+            insert(Product).returning(Product.id, sort_by_parameter_order=True),
+            to_create,
+        )).scalars().all())
+        product_ids = [pid if pid is not None else next(created_ids) for pid in product_ids]
+
+    # 4. Mise à jour des produits existants (UPDATE groupé par clé primaire ;
+    #    SQLAlchemy regroupe les lignes qui modifient les mêmes colonnes)
+    if to_update:
+        await session.execute(update(Product), to_update)
+
+    # 5. Upsert des variantes, par paquets. Un même lien ne peut apparaître
+    #    qu'une fois par INSERT (sinon ON CONFLICT échoue) : la dernière
+    #    occurrence gagne. Un INSERT par ensemble de champs fournis (la
+    #    clause DO UPDATE SET est commune à toutes ses lignes).
+    variant_rows: Dict[str, Tuple[Tuple[str, ...], dict]] = {}
+    for (_, product), product_id in zip(products, product_ids):
+        for variant in product.variants:
+            provided = variant.model_dump(exclude_unset=True, exclude_none=True)
+            fields = tuple(field for field in UPSERT_VARIANT_FIELDS if field in provided)
+            variant_rows[variant.alibaba_source_url] = (
+                fields, {"stock_quantity": 0, **provided, "product_id": product_id}
+            )
+    by_fields: Dict[Tuple[str, ...], List[dict]] = {}
+    for fields, row in variant_rows.values():
+        by_fields.setdefault(fields, []).append(row)
+    dialect_name = session.bind.dialect.name
+    for fields, rows in by_fields.items():
+        for start in range(0, len(rows), VARIANT_INSERT_BATCH):
+            await session.execute(_upsert_variants_statement(
+                dialect_name, rows[start:start + VARIANT_INSERT_BATCH], fields
+            ))
+
+    await session.commit()
+    report.products_created += len(to_create)
+    report.products_updated += len(to_update)
+    report.variants_upserted += len(variant_rows)
+
+
+async def _write_chunk(
+    session: AsyncSession,
+    products: List[Tuple[int, ImportProductRow]],
+    report: ImportReport,
+) -> None:
+    """
+    Écrit un lot ; s'il échoue en base (contrainte, valeur hors limites...),
+    le lot est annulé, chacune de ses lignes est signalée et l'import
+    continue avec le lot suivant.
+    """
+    try:
+        await _save_chunk(session, products, report)
+    except SQLAlchemyError as exc:
+        await session.rollback()
+        logger.warning("Lot d'import non enregistré", exc_info=True,
+                       extra={"products": len(products)})
+        reason = str(getattr(exc, "orig", None) or exc).splitlines()[0]
+        for line_number, _ in products:
+            _add_error(report, line_number, f"Lot non enregistré : {reason}")
+
+
+def _add_error(report: ImportReport, line: int, error: str) -> None:
+    if len(report.errors) < MAX_REPORTED_ERRORS:
+        report.errors.append(ImportRowError(line=line, error=error))
+
+
+async def import_catalog(
+    session: AsyncSession,
+    chunks: AsyncIterator[bytes],
+    fmt: str,
+) -> ImportReport:
+    """
+    Importe un flux (JSON lines ou CSV) et renvoie le rapport :
+    compteurs, erreurs ligne par ligne, débit (lignes/s).
+    Les lignes invalides sont signalées et ignorées ; les lots valides
+    sont enregistrés.
+    """
+    started = time.perf_counter()
+    report = ImportReport()
+    parser = parse_csv if fmt == "csv" else parse_jsonl
+
+    chunk: List[Tuple[int, ImportProductRow]] = []
+    async for line_number, raw, error in parser(iter_lines(chunks), report):
+        if error is not None:
+            _add_error(report, line_number, error)
+            continue
+        try:
+            chunk.append((line_number, ImportProductRow.model_validate(raw)))
+        except ValidationError as exc:
+            _add_error(report, line_number, "; ".join(
+                f"{'.'.join(str(part) for part in e['loc'])}: {e['msg']}"
+                for e in exc.errors()
+            ))
+            continue
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            await _write_chunk(session, chunk, report)
+            chunk = []
+    if chunk:
+        await _write_chunk(session, chunk, report)
+
+    report.elapsed_seconds = round(time.perf_counter() - started, 3)
+    if report.elapsed_seconds > 0:
+        report.rows_per_second = round(report.rows_read / report.elapsed_seconds, 1)
+    return report
@@ -0,0 +1,48 @@
+from typing import List, Optional
+from fastapi import Query
+
+from models import Variant
+
+
+class VariantFilters:
+    """
+    Dépendance FastAPI pour filtrer côté serveur sur les colonnes
+    indexées de Variant (taille, couleur) et sur une fourchette de prix.
+    """
+
+    def __init__(
+        self,
+        size: Optional[str] = Query(None),
+        color: Optional[str] = Query(None),
+        min_price: Optional[float] = Query(None, ge=0),
+        max_price: Optional[float] = Query(None, ge=0),
+    ):
+        self.size = size
+        self.color = color
+        self.min_price = min_price
+        self.max_price = max_price
+
+    def cache_key(self) -> str:
+        return f"{self.size}:{self.color}:{self.min_price}:{self.max_price}"
+
+    def clauses(self) -> List:
+        """Renvoie les conditions SQL (vide si aucun filtre n'est demandé)."""
+        clauses = []
+        if self.size is not None:
+            clauses.append(Variant.size == self.size)
+        if self.color is not None:
+            clauses.append(Variant.color == self.color)
+        if self.min_price is not None:
+            clauses.append(Variant.price >= self.min_price)
+        if self.max_price is not None:
+            clauses.append(Variant.price <= self.max_price)
+        return clauses
+
+    def matches(self, size: str, color: str, price: float) -> bool:
+        """Même test que clauses(), en Python (index de recherche en mémoire)."""
+        return (
+            (self.size is None or size == self.size)
+            and (self.color is None or color == self.color)
+            and (self.min_price is None or price >= self.min_price)
+            and (self.max_price is None or price <= self.max_price)
+        )
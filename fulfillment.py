@@ -0,0 +1,338 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional
+
+from sqlalchemy import func, update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database import async_session_maker
+from metrics import Counter, Gauge, Histogram, register
+from models import LOT_EN_COURS, LOT_PASSE, Order, OrderItem, PurchaseBatch, Variant, utcnow
+from order_status import COMMANDEE, EN_ATTENTE, set_order_status
+
+logger = logging.getLogger(__name__)
+
+# --- Traitement des commandes auprès du fournisseur ---
+# Les commandes arrivent "en_attente". Au lieu qu'un admin passe les achats
+# à la main, lien Alibaba par lien Alibaba, une tâche de fond :
+# 1. réserve un lot de commandes en attente (SELECT ... FOR UPDATE SKIP
+#    LOCKED : chaque worker gunicorn prend des commandes différentes, sans
+#    attendre les autres) et l'enregistre (PurchaseBatch, référence
+#    unique) : transaction validée AVANT d'appeler le fournisseur ;
+# 2. additionne les quantités par lien fournisseur (un achat par lien, quel
+#    que soit le nombre de commandes) ;
+# 3. passe l'achat groupé avec la référence du lot (clé d'idempotence),
+#    puis les commandes à "commandee" (UN UPDATE) et le lot à "passe".
+# Si l'étape 3 échoue n'importe où (erreur ou délai dépassé alors que le
+# fournisseur a peut-être accepté l'achat, commit perdu...), le lot reste
+# "en_cours" : le cycle suivant le rejoue avec la MÊME référence, et le
+# fournisseur renvoie l'achat déjà passé au lieu d'en passer un second.
+# Un lot en échec n'est rejoué qu'après un délai qui double à chaque échec
+# (FULFILLMENT_RETRY_SECONDS, au plus FULFILLMENT_RETRY_MAX_SECONDS) ; une
+# erreur ne concerne que son lot, le cycle passe aux suivants : un lot
+# impossible à acheter (lien fournisseur mort...) ne bloque pas la file.
+
+FULFILLMENT_INTERVAL = float(os.getenv("FULFILLMENT_INTERVAL", "0")) # secondes ; 0 = désactivé
+FULFILLMENT_BATCH_SIZE = int(os.getenv("FULFILLMENT_BATCH_SIZE", "200")) # commandes par lot
+FULFILLMENT_SUPPLIER_TIMEOUT = float(os.getenv("FULFILLMENT_SUPPLIER_TIMEOUT", "20"))
+FULFILLMENT_SUPPLIER_LATENCY = float(os.getenv("FULFILLMENT_SUPPLIER_LATENCY", "0.05"))
+FULFILLMENT_RETRY_SECONDS = float(os.getenv("FULFILLMENT_RETRY_SECONDS", "60"))
+FULFILLMENT_RETRY_MAX_SECONDS = float(os.getenv("FULFILLMENT_RETRY_MAX_SECONDS", "3600"))
+
+QUEUE_DEPTH = register(Gauge(
+    "fulfillment_queue_depth", "Commandes en attente de traitement fournisseur."
+))
+BATCH_SECONDS = register(Histogram(
+    "fulfillment_batch_duration_seconds",
+    "Durée d'un lot (réservation, achat fournisseur, mise à jour des statuts).",
+))
+BATCHES = register(Counter(
+    "fulfillment_batches_total", "Lots traités, par issue (ok, error).", ("outcome",)
+))
+ORDERS = register(Counter(
+    "fulfillment_orders_total", "Commandes passées chez le fournisseur."
+))
+
+
+class PurchaseLine(NamedTuple):
+    alibaba_source_url: str
+    quantity: int
+
+
+class FulfillmentReport(NamedTuple):
+    batch_reference: str
+    orders: int
+    lines: int
+    units: int
+    supplier_reference: str
+    seconds: float
+
+
+class LocalSupplier:
+    """
+    Remplace le fournisseur (pas d'API Alibaba ici) : simule le délai d'un
+    appel réseau, journalise l'achat et renvoie une référence.
+    Un vrai client fournisseur n'a qu'à fournir la même méthode, idempotente
+    par 'batch_reference' (identifiant de commande côté client, que l'API
+    du fournisseur utilise pour dédoublonner).
+    """
+
+    def __init__(self, latency: float = FULFILLMENT_SUPPLIER_LATENCY):
+        self.latency = latency
+        self.purchases: Dict[str, str] = {} # référence du lot -> référence fournisseur
+
+    async def place_purchase(self, lines: List[PurchaseLine], batch_reference: str) -> str:
+        await asyncio.sleep(self.latency)
+        if batch_reference in self.purchases:
+            return self.purchases[batch_reference] # déjà acheté : même réponse
+        reference = self.purchases[batch_reference] = f"LOCAL-{uuid.uuid4().hex[:12]}"
+        logger.info(
+            "Achat fournisseur (simulé)",
+            extra={"reference": reference, "batch": batch_reference, "lines": len(lines),
+                   "units": sum(line.quantity for line in lines)},
+        )
+        return reference
+
+
+async def pending_orders(session: AsyncSession) -> int:
+    statement = select(func.count()).select_from(Order).where(Order.status == EN_ATTENTE)
+    return (await session.exec(statement)).one()
+
+
+async def claim_batch(batch_size: int = FULFILLMENT_BATCH_SIZE) -> Optional[int]:
+    """
+    Étape 1 : réserve jusqu'à 'batch_size' commandes en attente pour un
+    nouveau lot, en une transaction validée. Renvoie l'id du lot, ou None
+    s'il n'y a rien à réserver.
+    """
+    async with async_session_maker() as session:
+        # Les commandes verrouillées par un autre worker sont sautées
+        claim = (
+            select(Order.id)
+            .where(Order.status == EN_ATTENTE, Order.purchase_batch_id.is_(None))
+            .order_by(Order.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        order_ids = (await session.exec(claim)).all()
+        if not order_ids:
+            return None
+        batch = PurchaseBatch(reference=uuid.uuid4().hex)
+        session.add(batch)
+        await session.flush()
+        await session.execute(
+            update(Order).where(Order.id.in_(order_ids)).values(purchase_batch_id=batch.id)
+        )
+        await session.commit()
+        return batch.id
+
+
+async def unfinished_batches(session: AsyncSession, due_at: Optional[datetime] = None) -> List[int]:
+    """
+    Lots réservés dont l'achat n'a pas abouti (ou pas encore), les plus
+    anciens d'abord. Avec 'due_at' : seulement ceux à rejouer à cette date.
+    """
+    statement = select(PurchaseBatch.id).where(PurchaseBatch.status == LOT_EN_COURS)
+    if due_at is not None:
+        statement = statement.where(
+            (PurchaseBatch.next_attempt_at.is_(None)) | (PurchaseBatch.next_attempt_at <= due_at)
+        )
+    return list((await session.exec(statement.order_by(PurchaseBatch.id))).all())
+
+
+def retry_delay(attempts: int) -> float:
+    """Délai avant de rejouer un lot qui a échoué 'attempts' fois."""
+    return min(FULFILLMENT_RETRY_MAX_SECONDS, FULFILLMENT_RETRY_SECONDS * 2 ** (attempts - 1))
+
+
+async def _record_failure(
+    session: AsyncSession, batch_id: int, attempts: int, error: Exception
+) -> None:
+    """Enregistre le 'attempts'-ième échec et repousse la prochaine tentative."""
+    await session.execute(
+        update(PurchaseBatch)
+        .where(PurchaseBatch.id == batch_id)
+        .values(
+            attempts=attempts,
+            next_attempt_at=utcnow() + timedelta(seconds=retry_delay(attempts)),
+            last_error=repr(error)[:500],
+        )
+    )
+    await session.commit()
+
+
+async def purchase_batch(supplier, batch_id: int) -> Optional[FulfillmentReport]:
+    """
+    Étapes 2 et 3 pour un lot "en_cours" (nouveau ou à rejouer). Renvoie
+    None si le lot est déjà passé ou traité en ce moment par un autre worker.
+    """
+    started = time.perf_counter()
+    async with async_session_maker() as session:
+        # Verrou du lot pendant l'achat : un autre worker ne le rejoue pas en même temps
+        batch = (await session.exec(
+            select(PurchaseBatch)
+            .where(PurchaseBatch.id == batch_id, PurchaseBatch.status == LOT_EN_COURS)
+            .with_for_update(skip_locked=True)
+        )).first()
+        if batch is None:
+            return None
+        order_ids = (await session.exec(
+            select(Order.id).where(Order.purchase_batch_id == batch.id)
+        )).all()
+
+        # 2. Quantités par lien fournisseur, additionnées par la base
+        totals = (
+            select(Variant.alibaba_source_url, func.sum(OrderItem.quantity))
+            .join(Variant, Variant.id == OrderItem.variant_id)
+            .where(OrderItem.order_id.in_(order_ids))
+            .group_by(Variant.alibaba_source_url)
+            .order_by(Variant.alibaba_source_url)
+        )
+        lines = [PurchaseLine(url, int(quantity)) for url, quantity in (await session.exec(totals)).all()]
+
+        # 3. Achat groupé (idempotent par référence du lot), puis statuts
+        attempts = batch.attempts # lisible après un rollback
+        try:
+            reference = await asyncio.wait_for(
+                supplier.place_purchase(lines, batch.reference), FULFILLMENT_SUPPLIER_TIMEOUT
+            )
+            updated = await set_order_status(session, order_ids, COMMANDEE, expected=EN_ATTENTE)
+            if len(updated) < len(order_ids):
+                # Annulées (par un admin) pendant l'achat : achetées quand même
+                logger.warning(
+                    "Commandes du lot modifiées pendant l'achat",
+                    extra={"batch": batch.reference,
+                           "orders": sorted(set(order_ids) - set(updated))},
+                )
+            batch.status = LOT_PASSE
+            batch.supplier_reference = reference
+            batch.completed_at = utcnow()
+            session.add(batch)
+            await session.commit()
+        except Exception as error:
+            # Le lot reste "en_cours" (même référence), rejoué plus tard
+            await session.rollback()
+            await _record_failure(session, batch_id, attempts + 1, error)
+            raise
+
+    elapsed = time.perf_counter() - started
+    BATCH_SECONDS.observe((), elapsed)
+    BATCHES.inc(("ok",))
+    ORDERS.inc((), len(updated))
+    report = FulfillmentReport(
+        batch_reference=batch.reference,
+        orders=len(updated),
+        lines=len(lines),
+        units=sum(line.quantity for line in lines),
+        supplier_reference=reference,
+        seconds=round(elapsed, 3),
+    )
+    logger.info("Lot de commandes traité", extra=report._asdict())
+    return report
+
+
+async def fulfill_batch(supplier, batch_size: int = FULFILLMENT_BATCH_SIZE) -> Optional[FulfillmentReport]:
+    """
+    Traite UN nouveau lot de commandes en attente. Renvoie None s'il n'y en
+    avait aucune (ou si toutes sont déjà prises par un autre worker).
+    """
+    batch_id = await claim_batch(batch_size)
+    if batch_id is None:
+        return None
+    return await purchase_batch(supplier, batch_id)
+
+
+class FulfillmentWorker:
+    """
+    Tâche asyncio de CE worker : tous les 'interval' secondes, traite des
+    lots jusqu'à ce qu'il n'y ait plus de commande en attente.
+    """
+
+    def __init__(
+        self, supplier, interval: float = FULFILLMENT_INTERVAL,
+        batch_size: int = FULFILLMENT_BATCH_SIZE,
+    ):
+        self.supplier = supplier
+        self.interval = interval
+        self.batch_size = batch_size
+        self.last_report: Optional[FulfillmentReport] = None
+        self.last_error: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def run_once(self) -> List[FulfillmentReport]:
+        """
+        Un cycle : met à jour la profondeur de la file, rejoue les lots
+        interrompus dont le délai est écoulé, puis vide la file. L'échec
+        d'un lot n'arrête pas le cycle.
+        """
+        reports = []
+        self.last_error = None
+        async with async_session_maker() as session:
+            QUEUE_DEPTH.set((), await pending_orders(session))
+            due = await unfinished_batches(session, due_at=utcnow())
+        for batch_id in due:
+            report = await self._purchase(batch_id)
+            if report is not None:
+                reports.append(report)
+        while True:
+            batch_id = await claim_batch(self.batch_size)
+            if batch_id is None:
+                break
+            report = await self._purchase(batch_id)
+            if report is not None:
+                reports.append(report)
+        if reports:
+            async with async_session_maker() as session:
+                QUEUE_DEPTH.set((), await pending_orders(session))
+        return reports
+
+    async def _purchase(self, batch_id: int) -> Optional[FulfillmentReport]:
+        """Un lot ; en cas d'échec, l'erreur est journalisée et le cycle continue."""
+        try:
+            report = await purchase_batch(self.supplier, batch_id)
+        except Exception as exc:
+            BATCHES.inc(("error",))
+            self.last_error = repr(exc)
+            logger.exception("Échec de l'achat d'un lot", extra={"batch_id": batch_id})
+            return None
+        if report is not None:
+            self.last_report = report
+        return report
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                # La transaction a été annulée : les commandes restent en attente
+                self.last_error = repr(exc)
+                logger.exception("Échec du traitement des commandes")
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self._task is not None,
+            "interval_seconds": self.interval,
+            "batch_size": self.batch_size,
+            "last_batch": self.last_report._asdict() if self.last_report else None,
+            "last_error": self.last_error,
+        }
+
+
+fulfillment_worker = FulfillmentWorker(LocalSupplier())
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+logger = logging.getLogger(__name__)
+
+# --- Hachage des mots de passe (bcrypt) hors de la boucle d'événements ---
+# Un hachage/une vérification bcrypt coûte ~250 ms de CPU. Exécuté dans le
+# worker, il bloque toutes les autres requêtes pendant ce temps. On l'envoie
+# donc dans un petit pool de PROCESSUS dédié (le GIL empêche des threads de
+# paralléliser ce calcul), avec une file d'attente bornée : au-delà, on
+# répond 429 plutôt que d'accumuler des requêtes qui expireront de toute façon.
+
+# Coût bcrypt (2^rounds itérations). Les hachages existants avec un coût
+# plus faible sont recalculés de façon transparente à la connexion.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", "2")) # processus par worker gunicorn
+HASH_MAX_PENDING = int(os.getenv("HASH_MAX_PENDING", "16")) # en cours + en attente
+
+# Contexte pour le hachage des mots de passe (nous utilisons bcrypt)
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS, # needs_update() si le coût stocké est plus faible
+)
+
+# --- Fonctions exécutées dans les processus du pool ---
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Vérifie si un mot de passe en clair correspond au hachage."""
+    return pwd_context.verify(plain_password, hashed_password)
+
+def get_password_hash(password: str) -> str:
+    """Hache un mot de passe."""
+    return pwd_context.hash(password)
+
+def verify_and_update(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Vérifie le mot de passe et, si le hachage stocké est obsolète
+    (pwd_context.needs_update), renvoie aussi le nouveau hachage à enregistrer.
+    """
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+# --- Pool de processus (un par worker, créé à la première utilisation) ---
+
+_executor: Optional[ProcessPoolExecutor] = None
+_pending = 0
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # "spawn" : les processus repartent de zéro au lieu de copier un
+        # worker qui a déjà des threads et des connexions ouvertes.
+        _executor = ProcessPoolExecutor(
+            max_workers=HASH_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+def _discard_executor(executor: ProcessPoolExecutor) -> None:
+    """
+    Abandonne un pool cassé (un processus est mort : OOM, segfault...) ;
+    le suivant sera recréé à la première utilisation. Sans cela, toutes les
+    connexions de ce worker échoueraient jusqu'à son redémarrage.
+    """
+    global _executor
+    if _executor is executor: # pas déjà remplacé par une autre requête
+        _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+async def _run_in_pool(func, *args):
+    global _pending
+    if _pending >= HASH_MAX_PENDING:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Trop de connexions en cours, réessayez dans un instant",
+            headers={"Retry-After": "1"},
+        )
+    _pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        # Un seul nouvel essai sur un pool neuf (le calcul n'a pas d'effet de bord)
+        for attempt in range(2):
+            executor = _get_executor()
+            try:
+                return await loop.run_in_executor(executor, func, *args)
+            except BrokenProcessPool:
+                logger.warning("Pool de hachage cassé, recréé", extra={"attempt": attempt + 1})
+                _discard_executor(executor)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Service de connexion momentanément indisponible",
+            headers={"Retry-After": "1"},
+        )
+    finally:
+        _pending -= 1
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_in_pool(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    return await _run_in_pool(get_password_hash, password)
+
+async def verify_and_update_async(
+    plain_password: str, hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    return await _run_in_pool(verify_and_update, plain_password, hashed_password)
+
+def hash_pool_stats() -> dict:
+    return {
+        "workers": HASH_WORKERS,
+        "max_pending": HASH_MAX_PENDING,
+        "pending": _pending,
+        "bcrypt_rounds": BCRYPT_ROUNDS,
+    }
+
+def shutdown_hash_pool() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,171 @@
+import asyncio
+import hashlib
+import os
+import time
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from cache import MISSING, TTLCache
+from database import engine
+from metrics import Counter, register
+from models import IdempotencyKey
+
+# --- Idempotence de POST /orders/ ---
+# Un client mobile qui n'a pas reçu la réponse (timeout) renvoie la même
+# requête avec le même en-tête Idempotency-Key : il doit recevoir la réponse
+# de la première, pas une seconde commande (ni un second passage sur le stock).
+#
+# - En base (table "idempotencykey") : la ligne est écrite dans la MÊME
+#   transaction que la commande ; si deux workers traitent la même clé en
+#   même temps, la clé primaire n'en laisse passer qu'un, l'autre annule sa
+#   transaction et renvoie la réponse du premier.
+# - En mémoire (LRU) : les répétitions sont servies sans base de données.
+# - Pendant l'exécution : les doublons qui arrivent sur CE worker attendent
+#   le résultat de la première exécution au lieu de la rejouer.
+
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", str(24 * 3600)))  # secondes
+IDEMPOTENCY_CACHE_MAXSIZE = int(os.getenv("IDEMPOTENCY_CACHE_MAXSIZE", "10000"))
+
+REQUESTS = register(Counter(
+    "idempotency_requests_total",
+    "Requêtes avec Idempotency-Key, par issue (new, replayed, coalesced, rejected).",
+    ("outcome",),
+))
+
+
+class StoredResponse(NamedTuple):
+    request_hash: str
+    status_code: int
+    body: bytes
+
+
+def request_fingerprint(payload: SQLModel) -> str:
+    """Empreinte du corps de la requête (après validation : l'ordre des clés JSON n'y change rien)."""
+    return hashlib.sha256(payload.model_dump_json().encode()).hexdigest()
+
+
+def _check_same_request(stored_hash: str, request_hash: str) -> None:
+    if stored_hash != request_hash:
+        REQUESTS.inc(("rejected",))
+        raise HTTPException(
+            status_code=422,
+            detail=f"Cette clé {IDEMPOTENCY_KEY_HEADER} a déjà servi pour une autre requête.",
+        )
+
+
+def _retrieve_exception(future: asyncio.Future) -> None:
+    # Évite "Future exception was never retrieved" quand aucun doublon n'attendait
+    if not future.cancelled():
+        future.exception()
+
+
+class IdempotencyStore:
+    def __init__(self, maxsize: int, ttl: int):
+        self.ttl = ttl
+        self._responses = TTLCache(maxsize, ttl)
+        # (client, clé) -> (empreinte, résultat à venir) des exécutions en cours
+        self._in_flight: Dict[Tuple[int, str], Tuple[str, asyncio.Future]] = {}
+
+    async def run(
+        self,
+        session: AsyncSession,
+        user_id: int,
+        key: str,
+        request_hash: str,
+        operation: Callable[[], Awaitable[Tuple[bytes, Optional[int]]]],
+        status_code: int,
+    ) -> Tuple[StoredResponse, bool]:
+        """
+        Exécute 'operation' une seule fois pour (client, clé), et renvoie
+        (réponse, rejouée ?). 'operation' fait son travail dans 'session'
+        SANS commit et renvoie (corps JSON, id de la commande) : le commit,
+        qui enregistre aussi la clé, est fait ici.
+        Lève une HTTPException 422 si la clé a servi pour un autre corps.
+        """
+        scope = (user_id, key)
+        stored = self._responses.get(f"{user_id}:{key}")
+        if stored is not MISSING:
+            _check_same_request(stored.request_hash, request_hash)
+            REQUESTS.inc(("replayed",))
+            return stored, True
+
+        in_flight = self._in_flight.get(scope)
+        if in_flight is not None:
+            _check_same_request(in_flight[0], request_hash)
+            REQUESTS.inc(("coalesced",))
+            # shield : un client qui abandonne n'annule pas l'exécution des autres
+            return await asyncio.shield(in_flight[1]), True
+
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(_retrieve_exception)
+        self._in_flight[scope] = (request_hash, future)
+        try:
+            stored, replayed = await self._execute(
+                session, user_id, key, request_hash, operation, status_code
+            )
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(stored)
+        finally:
+            del self._in_flight[scope]
+        self._responses.set(f"{user_id}:{key}", stored)
+        return stored, replayed
+
+    async def _execute(self, session, user_id, key, request_hash, operation, status_code):
+        row = await session.get(IdempotencyKey, (user_id, key))
+        if row is not None:
+            if row.expires_at > time.time():
+                return self._replay(row, request_hash), True
+            await session.delete(row) # clé expirée : elle peut resservir
+            await session.flush()
+
+        body, order_id = await operation()
+        session.add(IdempotencyKey(
+            user_id=user_id,
+            key=key,
+            request_hash=request_hash,
+            status_code=status_code,
+            response_body=body.decode(),
+            order_id=order_id,
+            expires_at=int(time.time()) + self.ttl,
+        ))
+        try:
+            await session.commit()
+        except IntegrityError:
+            # Un autre worker a enregistré cette clé pendant qu'on travaillait :
+            # le rollback annule NOTRE commande (et son stock), on renvoie la sienne.
+            await session.rollback()
+            row = await session.get(IdempotencyKey, (user_id, key))
+            if row is None:
+                raise
+            return self._replay(row, request_hash), True
+        REQUESTS.inc(("new",))
+        return StoredResponse(request_hash, status_code, body), False
+
+    def _replay(self, row: IdempotencyKey, request_hash: str) -> StoredResponse:
+        _check_same_request(row.request_hash, request_hash)
+        REQUESTS.inc(("replayed",))
+        return StoredResponse(row.request_hash, row.status_code, row.response_body.encode())
+
+
+idempotency_store = IdempotencyStore(IDEMPOTENCY_CACHE_MAXSIZE, IDEMPOTENCY_TTL)
+
+
+def purge_idempotency_keys() -> int:
+    """Supprime les clés expirées (au démarrage) ; renvoie le nombre de lignes supprimées."""
+    with Session(engine) as session:
+        result = session.execute(
+            delete(IdempotencyKey).where(IdempotencyKey.expires_at <= int(time.time()))
+        )
+        session.commit()
+    return result.rowcount
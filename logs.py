@@ -0,0 +1,79 @@
+import json
+import logging
+import os
+import sys
+from contextvars import ContextVar
+from typing import Optional
+
+# --- Logs structurés ---
+# Remplacent les print() : chaque ligne est un objet JSON (une ligne par
+# événement), avec les champs passés dans "extra" et l'identifiant de la
+# requête HTTP en cours. LOG_FORMAT=text donne une sortie lisible en local.
+#
+#     logger.info("Import terminé", extra={"rows": 1200, "errors": 3})
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json") # "json" ou "text"
+
+# Identifiant de la requête en cours (posé par le middleware de metrics.py)
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Attributs standard d'un LogRecord : tout le reste vient de "extra"
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+def _extra_fields(record: logging.LogRecord) -> dict:
+    return {
+        key: value for key, value in vars(record).items()
+        if key not in _RECORD_ATTRIBUTES
+    }
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "request_id"):
+            record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        payload.update(
+            (key, value) for key, value in _extra_fields(record).items()
+            if value is not None
+        )
+        if record.exc_info:
+            payload["exception"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s [%(name)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = " ".join(
+            f"{key}={value}" for key, value in _extra_fields(record).items()
+            if value is not None
+        )
+        return f"{line} {fields}" if fields else line
+
+
+def configure_logging() -> None:
+    """Installe le format des logs sur le logger racine (une seule fois)."""
+    root = logging.getLogger()
+    if any(getattr(handler, "_structured", False) for handler in root.handlers):
+        return
+    handler = logging.StreamHandler(sys.stderr)
+    handler._structured = True
+    handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+    handler.addFilter(RequestIdFilter())
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
@@ -1,23 +1,65 @@
 from fastapi import FastAPI
-from database import create_db_and_tables
-from routers import products, users, auth, variants, orders 
+from logs import configure_logging
+from bus import bus
+from cache import load_catalog_version
+from hashing import shutdown_hash_pool
+from revocation import load_revocations
+from idempotency import purge_idempotency_keys
+from fulfillment import fulfillment_worker
+from metrics import MetricsMiddleware, metrics_exporter
+from replicas import ReadYourWritesMiddleware, replica_router
+from serialization import FastJSONResponse
+from routers import products, users, auth, variants, orders, admin, metrics, analytics
+
+# Logs structurés (JSON) à la place des print()
+configure_logging()
 
 app = FastAPI(
     title="API E-Commerce de Madjiguene",
     description="L'API backend pour le projet de dropshipping.",
-    version="1.0.0"
+    version="1.0.0",
+    # Les réponses JSON sont encodées avec orjson (voir serialization.py)
+    default_response_class=FastJSONResponse
 )
 
+# Latence, requêtes SQL et temps en base de chaque requête (voir GET /metrics)
+app.add_middleware(MetricsMiddleware)
+# Après une écriture, le client lit sur le primaire (voir replicas.py)
+app.add_middleware(ReadYourWritesMiddleware)
+
 @app.on_event("startup")
 def on_startup():
-    create_db_and_tables()
+    # Le schéma n'est plus créé ici : "python migrate.py" l'a mis à jour
+    # une seule fois, avant le démarrage des workers (voir Dockerfile).
+    load_catalog_version()
+    load_revocations()
+    purge_idempotency_keys()
+    # Chaque worker écoute les invalidations de cache des autres workers
+    bus.start()
+    # Passe les commandes en attente au fournisseur (si FULFILLMENT_INTERVAL > 0)
+    fulfillment_worker.start()
+    # Contrôle de santé des réplicas de lecture (si DATABASE_REPLICA_URLS)
+    replica_router.start()
+    # Métriques de ce worker dans METRICS_DIR (si défini), pour /metrics
+    metrics_exporter.start()
+
+@app.on_event("shutdown")
+def on_shutdown():
+    metrics_exporter.stop()
+    replica_router.stop()
+    fulfillment_worker.stop()
+    bus.stop()
+    shutdown_hash_pool()
 
 # 3. Inclure les routeurs
 app.include_router(products.router)
 app.include_router(users.router)
 app.include_router(auth.router)
 app.include_router(variants.router)
-app.include_router(orders.router) 
+app.include_router(orders.router)
+app.include_router(admin.router)
+app.include_router(metrics.router)
+app.include_router(analytics.router)
 
 @app.get("/")
 def read_root():
@@ -0,0 +1,431 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+
+from cache import catalog_cache
+from database import async_engine, engine, pool_metrics
+from logs import request_id_var
+
+logger = logging.getLogger("api.requests")
+
+# --- Métriques de performance (format Prometheus) ---
+# Par requête HTTP : latence (histogramme par route), nombre de requêtes SQL
+# et temps passé en base ; plus les requêtes en cours, l'état des pools de
+# connexions et du cache catalogue. Exposé sur GET /metrics.
+#
+# Les valeurs sont celles de CE processus : chaque série porte un label
+# "worker" (pid), pour que Prometheus ne mélange pas les compteurs des
+# différents workers gunicorn. Un scrape de /metrics tombe sur un worker au
+# hasard : avec METRICS_DIR, il renvoie ceux de TOUS les workers (voir
+# "Plusieurs workers" plus bas).
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "1"))
+# Répertoire partagé par les workers d'une même machine (non défini : un
+# scrape ne voit que le worker qui le reçoit)
+METRICS_DIR = os.getenv("METRICS_DIR")
+METRICS_WRITE_INTERVAL = float(os.getenv("METRICS_WRITE_INTERVAL", "5")) # secondes
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+# Chemins non reconnus : un seul label (sinon une série par URL inventée)
+UNMATCHED_ROUTE = "<unmatched>"
+
+WORKER = str(os.getpid())
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.append(f'worker="{WORKER}"')
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+
+    def _header(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, labels: tuple = (), amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return self._header() + [
+            f"{self.name}{_labels(self.labelnames, labels)} {value}"
+            for labels, value in values
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, labels: tuple = (), amount: float = 1) -> None:
+        self.inc(labels, -amount)
+
+    def set(self, labels: tuple, value: float) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [compte par intervalle (+ dernier = au-delà), somme]
+        self._values: Dict[tuple, list] = {}
+
+    def observe(self, labels: tuple, value: float) -> None:
+        position = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][position] += 1
+            entry[1] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(
+                (labels, (list(counts), total))
+                for labels, (counts, total) in self._values.items()
+            )
+        lines = self._header()
+        for labels, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                bucket_labels = _labels(self.labelnames, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {round(total, 6)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+REQUESTS = Counter(
+    "http_requests_total", "Requêtes HTTP traitées.", ("method", "route", "status")
+)
+LATENCY = Histogram(
+    "http_request_duration_seconds", "Durée des requêtes HTTP (secondes).",
+    ("method", "route"),
+)
+DB_STATEMENTS = Histogram(
+    "http_request_db_statements", "Requêtes SQL exécutées par requête HTTP.",
+    ("method", "route"), buckets=STATEMENT_BUCKETS,
+)
+DB_TIME = Histogram(
+    "http_request_db_seconds", "Temps passé en base par requête HTTP (secondes).",
+    ("method", "route"),
+)
+IN_PROGRESS = Gauge("http_requests_in_progress", "Requêtes HTTP en cours.")
+
+_registry: List[_Metric] = [REQUESTS, LATENCY, DB_STATEMENTS, DB_TIME, IN_PROGRESS]
+
+
+def register(metric: _Metric) -> _Metric:
+    """Ajoute une métrique (d'un autre module) à la sortie de /metrics."""
+    _registry.append(metric)
+    return metric
+
+
+# --- Requêtes SQL de la requête HTTP en cours ---
+# Un objet par requête HTTP, posé dans une ContextVar par le middleware.
+# Les événements SQLAlchemy le retrouvent dans le même contexte (y compris
+# dans les threads de run_in_threadpool, qui copient le contexte).
+
+class RequestDbStats:
+    __slots__ = ("statements", "seconds")
+
+    def __init__(self):
+        self.statements = 0
+        self.seconds = 0.0
+
+
+_db_stats: ContextVar[Optional[RequestDbStats]] = ContextVar("db_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    stats = _db_stats.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.seconds += time.perf_counter() - started
+
+
+def _handle_error(exception_context):
+    # La requête a échoué : after_cursor_execute ne sera pas appelé
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_started"):
+        connection.info["query_started"].pop()
+
+
+def instrument_engine(sync_engine) -> None:
+    """Mesure les requêtes SQL d'un moteur (synchrone, ou .sync_engine d'un moteur async)."""
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
+
+
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+
+
+# --- Middleware ASGI ---
+# ASGI "pur" (pas BaseHTTPMiddleware) : la mesure couvre aussi le corps des
+# réponses en flux (export des commandes), envoyé après le retour de l'endpoint.
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = _request_id(scope)
+        request_token = request_id_var.set(request_id)
+        stats = RequestDbStats()
+        stats_token = _db_stats.set(stats)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = list(message.get("headers", ())) + [
+                    (REQUEST_ID_HEADER.lower().encode(), request_id.encode())
+                ]
+            await send(message)
+
+        IN_PROGRESS.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            IN_PROGRESS.dec()
+            route = scope.get("route")
+            path = getattr(route, "path_format", None) or UNMATCHED_ROUTE
+            method = scope["method"]
+            REQUESTS.inc((method, path, str(status_code)))
+            LATENCY.observe((method, path), elapsed)
+            DB_STATEMENTS.observe((method, path), stats.statements)
+            DB_TIME.observe((method, path), stats.seconds)
+            logger.log(
+                logging.WARNING if elapsed >= SLOW_REQUEST_SECONDS else logging.INFO,
+                "%s %s %s", method, path, status_code,
+                extra={
+                    "method": method,
+                    "route": path,
+                    "status": status_code,
+                    "duration_ms": round(elapsed * 1000, 2),
+                    "db_statements": stats.statements,
+                    "db_ms": round(stats.seconds * 1000, 2),
+                },
+            )
+            _db_stats.reset(stats_token)
+            request_id_var.reset(request_token)
+
+
+def _request_id(scope) -> str:
+    """Reprend l'X-Request-ID du proxy s'il y en a un, sinon en crée un."""
+    for name, value in scope.get("headers", ()):
+        if name == b"x-request-id":
+            return value.decode("latin-1")[:128]
+    return uuid.uuid4().hex
+
+
+# --- Sortie Prometheus ---
+
+def _pool_lines() -> List[str]:
+    gauges = {
+        "db_pool_size": ("Connexions permanentes du pool.", "size"),
+        "db_pool_checked_out": ("Connexions empruntées en ce moment.", "checked_out"),
+        "db_pool_overflow": ("Connexions en débordement (au-delà de pool_size).", "overflow"),
+        "db_pool_checkouts_total": ("Connexions obtenues depuis le démarrage.", "checkouts"),
+        "db_pool_timeouts_total": ("Attentes de connexion abandonnées (délai dépassé).", "timeouts"),
+        "db_pool_wait_seconds_total": ("Temps total passé à attendre une connexion.", "wait_seconds_total"),
+        "db_pool_wait_seconds_max": ("Plus longue attente d'une connexion.", "wait_seconds_max"),
+    }
+    stats = {name: metrics.stats() for name, metrics in pool_metrics.items()}
+    lines = []
+    for metric, (documentation, key) in gauges.items():
+        kind = "counter" if metric.endswith("_total") else "gauge"
+        lines += [f"# HELP {metric} {documentation}", f"# TYPE {metric} {kind}"]
+        for pool, values in sorted(stats.items()):
+            if key in values:
+                lines.append(f"{metric}{_labels(('pool',), (pool,))} {values[key]}")
+    return lines
+
+
+def _cache_lines() -> List[str]:
+    stats = catalog_cache.stats()
+    lines = []
+    for key, kind in (("hits", "counter"), ("misses", "counter"),
+                      ("evictions", "counter"), ("invalidations", "counter"),
+                      ("size", "gauge")):
+        metric = f"catalog_cache_{key}" + ("_total" if kind == "counter" else "")
+        lines += [
+            f"# HELP {metric} Cache catalogue : {key}.",
+            f"# TYPE {metric} {kind}",
+            f"{metric}{_labels((), ())} {stats[key]}",
+        ]
+    return lines
+
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    for metric in _registry:
+        lines += metric.render()
+    lines += _pool_lines()
+    lines += _cache_lines()
+    return "\n".join(lines) + "\n"
+
+
+# --- Plusieurs workers ---
+# Chaque worker écrit ses métriques (texte Prometheus, déjà étiquetées par
+# "worker") dans METRICS_DIR/<pid>.prom toutes les METRICS_WRITE_INTERVAL
+# secondes. Le worker qui reçoit le scrape y ajoute les siennes, à jour, et
+# fusionne le tout : une seule en-tête HELP/TYPE par métrique, suivie des
+# séries de tous les workers. Le fichier d'un worker arrêté n'est plus mis
+# à jour : ignoré puis supprimé (ses séries disparaissent, comme après un
+# redémarrage).
+
+STALE_AFTER_SECONDS = 3 * METRICS_WRITE_INTERVAL
+
+
+def _snapshot_path(worker: str) -> str:
+    return os.path.join(METRICS_DIR, f"{worker}.prom")
+
+
+def write_snapshot(text: Optional[str] = None) -> None:
+    """Écrit les métriques de ce worker dans METRICS_DIR (remplacement atomique)."""
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = _snapshot_path(WORKER)
+    temporary = f"{path}.tmp"
+    with open(temporary, "w", encoding="utf-8") as output:
+        output.write(render_metrics() if text is None else text)
+    os.replace(temporary, path)
+
+
+def _other_snapshots() -> List[str]:
+    texts = []
+    now = time.time()
+    for name in sorted(os.listdir(METRICS_DIR)):
+        if not name.endswith(".prom") or name == f"{WORKER}.prom":
+            continue
+        path = os.path.join(METRICS_DIR, name)
+        try:
+            if now - os.path.getmtime(path) > STALE_AFTER_SECONDS:
+                os.remove(path)
+                continue
+            with open(path, encoding="utf-8") as snapshot:
+                texts.append(snapshot.read())
+        except OSError: # supprimé entre-temps (worker arrêté)
+            continue
+    return texts
+
+
+def _merge(texts: Iterable[str]) -> str:
+    """Regroupe par métrique les séries de plusieurs sorties Prometheus."""
+    headers: Dict[str, List[str]] = {} # dans l'ordre de première apparition
+    samples: Dict[str, List[str]] = {}
+    for text in texts:
+        current = None
+        for line in text.splitlines():
+            if line.startswith("# HELP "):
+                current = line.split(" ", 3)[2]
+                if current not in headers:
+                    headers[current] = [line]
+                    samples[current] = []
+            elif line.startswith("# TYPE "):
+                if len(headers[current]) == 1:
+                    headers[current].append(line)
+            elif line and current is not None:
+                samples[current].append(line)
+    lines: List[str] = []
+    for name, header in headers.items():
+        lines += header + samples[name]
+    return "\n".join(lines) + "\n"
+
+
+def collect_metrics() -> str:
+    """Sortie de GET /metrics : ce worker, ou tous ceux de METRICS_DIR."""
+    text = render_metrics()
+    if not METRICS_DIR:
+        return text
+    write_snapshot(text)
+    return _merge([text] + _other_snapshots())
+
+
+class MetricsExporter:
+    """Tâche de fond qui tient à jour le fichier de ce worker dans METRICS_DIR."""
+
+    def __init__(self, interval: float = METRICS_WRITE_INTERVAL):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if METRICS_DIR and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+            try:
+                os.remove(_snapshot_path(WORKER))
+            except OSError:
+                pass
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                write_snapshot()
+            except Exception:
+                logger.exception("Échec de l'écriture des métriques dans METRICS_DIR")
+            await asyncio.sleep(self.interval)
+
+
+metrics_exporter = MetricsExporter()
@@ -0,0 +1,60 @@
+import logging
+import os
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, inspect, pool, text
+
+from database import DATABASE_URL
+from logs import configure_logging
+
+logger = logging.getLogger("migrate") # aussi lancé en script (__main__)
+
+# --- Migrations du schéma ---
+# Le schéma appartient aux migrations (dossier migrations/), plus au
+# démarrage des workers : chaque worker faisait un create_all (inspection de
+# toutes les tables, en concurrence avec les 3 autres) et ne savait pas
+# ajouter un index à une table existante.
+#
+# À lancer UNE fois avant les workers (c'est ce que fait le Dockerfile) :
+#     python migrate.py
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini")
+
+# Révision correspondant au schéma que créait l'ancien create_all
+BASELINE_REVISION = "0001"
+
+# Même verrou que migrations/env.py
+MIGRATION_LOCK_ID = 720_018
+
+
+def run_migrations() -> None:
+    """
+    Amène la base à la dernière révision. Une base créée avant les
+    migrations (tables présentes, pas de table "alembic_version") est
+    d'abord marquée à la révision initiale, puis mise à jour.
+    """
+    config = Config(ALEMBIC_INI)
+    # Connexion dédiée, sans le statement_timeout de l'application
+    engine = create_engine(DATABASE_URL, poolclass=pool.NullPool)
+    with engine.begin() as connection:
+        if connection.dialect.name == "postgresql":
+            # Tout (vérification + stamp + migrations) sous le même verrou
+            connection.execute(
+                text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_ID}
+            )
+        config.attributes["connection"] = connection
+        tables = set(inspect(connection).get_table_names())
+        if "alembic_version" not in tables and "product" in tables:
+            logger.info(
+                "Base existante sans migrations : marquée à la révision initiale",
+                extra={"revision": BASELINE_REVISION},
+            )
+            command.stamp(config, BASELINE_REVISION)
+        command.upgrade(config, "head")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    configure_logging()
+    run_migrations()
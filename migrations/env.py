@@ -0,0 +1,67 @@
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine, pool, text
+from sqlmodel import SQLModel
+
+import models # noqa: F401 (enregistre toutes les tables dans SQLModel.metadata)
+from database import DATABASE_URL
+
+# --- Environnement Alembic ---
+# Lancé par "python migrate.py" (qui fournit sa connexion, voir
+# config.attributes) ou directement par la commande "alembic".
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = SQLModel.metadata
+
+# Verrou PostgreSQL : si plusieurs conteneurs démarrent en même temps,
+# un seul applique les migrations, les autres attendent puis ne font rien.
+MIGRATION_LOCK_ID = 720_018
+
+
+def run_migrations_offline() -> None:
+    """Génère le SQL sans se connecter ("alembic upgrade head --sql")."""
+    context.configure(
+        url=DATABASE_URL,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def _run_migrations(connection) -> None:
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        # SQLite ne sait pas modifier une table (ALTER) : Alembic la recopie
+        render_as_batch=connection.dialect.name == "sqlite",
+    )
+    with context.begin_transaction():
+        if connection.dialect.name == "postgresql":
+            connection.execute(
+                text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_ID}
+            )
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        _run_migrations(connection)
+        return
+    # Connexion dédiée, sans le statement_timeout de l'application
+    # (créer un index sur une grosse table peut être long).
+    connectable = create_engine(DATABASE_URL, poolclass=pool.NullPool)
+    with connectable.connect() as connection:
+        _run_migrations(connection)
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
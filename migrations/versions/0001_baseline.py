@@ -0,0 +1,93 @@
+"""Schéma initial (tel que créé par l'ancien create_all au démarrage)
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+
+Les bases créées avant les migrations contiennent déjà ces tables :
+migrate.py les marque ("stamp") à cette révision au lieu de la rejouer.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "user",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("username", sa.String(), nullable=False),
+        sa.Column("hashed_password", sa.String(), nullable=False),
+        sa.Column("is_admin", sa.Boolean(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_user_username", "user", ["username"], unique=True)
+
+    op.create_table(
+        "product",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("description", sa.String(), nullable=True),
+        sa.Column("image_urls", sa.JSON(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+    op.create_table(
+        "variant",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("size", sa.String(), nullable=False),
+        sa.Column("color", sa.String(), nullable=False),
+        sa.Column("price", sa.Float(), nullable=False),
+        sa.Column("alibaba_source_url", sa.String(), nullable=False),
+        sa.Column("stock_quantity", sa.Integer(), nullable=False),
+        sa.Column("product_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["product_id"], ["product.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_variant_size", "variant", ["size"])
+    op.create_index("ix_variant_color", "variant", ["color"])
+    op.create_index("ix_variant_alibaba_source_url", "variant", ["alibaba_source_url"])
+
+    op.create_table(
+        "order",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_order_status", "order", ["status"])
+
+    op.create_table(
+        "orderitem",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+        sa.Column("variant_id", sa.Integer(), nullable=False),
+        sa.Column("order_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["order_id"], ["order.id"]),
+        sa.ForeignKeyConstraint(["variant_id"], ["variant.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("orderitem")
+    op.drop_index("ix_order_status", table_name="order")
+    op.drop_table("order")
+    op.drop_index("ix_variant_alibaba_source_url", table_name="variant")
+    op.drop_index("ix_variant_color", table_name="variant")
+    op.drop_index("ix_variant_size", table_name="variant")
+    op.drop_table("variant")
+    op.drop_table("product")
+    op.drop_index("ix_user_username", table_name="user")
+    op.drop_table("user")
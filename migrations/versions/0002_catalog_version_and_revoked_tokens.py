@@ -0,0 +1,89 @@
+"""Version du catalogue, tokens révoqués, lien Alibaba unique
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+
+Ces tables ont d'abord été créées par create_all : une base qui a tourné
+avec ces versions du code les a déjà. On ne crée donc que ce qui manque
+(en mode --sql, sans base à inspecter, on part du schéma 0001).
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _has_table(name: str) -> bool:
+    if context.is_offline_mode():
+        return False
+    return sa.inspect(op.get_bind()).has_table(name)
+
+
+def _url_index():
+    if context.is_offline_mode():
+        return {"unique": False}
+    indexes = sa.inspect(op.get_bind()).get_indexes("variant")
+    return next((i for i in indexes if i["name"] == "ix_variant_alibaba_source_url"), None)
+
+
+def _check_duplicate_urls() -> None:
+    if context.is_offline_mode():
+        return
+    duplicates = op.get_bind().execute(sa.text(
+        "SELECT count(*) FROM (SELECT alibaba_source_url FROM variant "
+        "GROUP BY alibaba_source_url HAVING count(*) > 1) AS duplicates"
+    )).scalar()
+    if duplicates:
+        raise RuntimeError(
+            f"{duplicates} liens Alibaba sont partagés par plusieurs variantes : "
+            "les fusionner avant de relancer la migration."
+        )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if not _has_table("catalogversion"):
+        op.create_table(
+            "catalogversion",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("version", sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+        )
+
+    if not _has_table("revokedtoken"):
+        op.create_table(
+            "revokedtoken",
+            sa.Column("jti", sa.String(), nullable=False),
+            sa.Column("expires_at", sa.Integer(), nullable=False),
+            sa.Column("user_id", sa.Integer(), nullable=True),
+            sa.ForeignKeyConstraint(["user_id"], ["user.id"]),
+            sa.PrimaryKeyConstraint("jti"),
+        )
+        op.create_index("ix_revokedtoken_expires_at", "revokedtoken", ["expires_at"])
+
+    # Le lien Alibaba devient unique (clé des upserts de l'import en masse)
+    url_index = _url_index()
+    if url_index is None or not url_index["unique"]:
+        _check_duplicate_urls()
+        if url_index is not None:
+            op.drop_index("ix_variant_alibaba_source_url", table_name="variant")
+        op.create_index(
+            "ix_variant_alibaba_source_url", "variant", ["alibaba_source_url"], unique=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_variant_alibaba_source_url", table_name="variant")
+    op.create_index("ix_variant_alibaba_source_url", "variant", ["alibaba_source_url"])
+    op.drop_index("ix_revokedtoken_expires_at", table_name="revokedtoken")
+    op.drop_table("revokedtoken")
+    op.drop_table("catalogversion")
@@ -0,0 +1,64 @@
+"""Index des clés étrangères et de la recherche plein texte
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+
+PostgreSQL n'indexe pas les clés étrangères : sans ces index, charger les
+variantes d'une page de produits ou les lignes d'une commande parcourt
+toute la table. Certains ont pu être créés par create_all (bases récentes) :
+on ne crée que ceux qui manquent.
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, Sequence[str], None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FOREIGN_KEY_INDEXES = [
+    ("ix_variant_product_id", "variant", "product_id"),
+    ("ix_orderitem_order_id", "orderitem", "order_id"),
+    ("ix_orderitem_variant_id", "orderitem", "variant_id"),
+    ("ix_order_user_id", "order", "user_id"),
+]
+
+# Copie figée de models.product_search_document() : l'expression doit être
+# identique à celle des requêtes pour que PostgreSQL utilise l'index.
+SEARCH_INDEX = "ix_product_search_document"
+SEARCH_DOCUMENT = (
+    "(setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'B'))"
+)
+
+
+def _index_names(table: str) -> set:
+    if context.is_offline_mode(): # --sql : pas de base à inspecter
+        return set()
+    return {index["name"] for index in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for name, table, column in FOREIGN_KEY_INDEXES:
+        if name not in _index_names(table):
+            op.create_index(name, table, [column])
+
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute(
+            f"CREATE INDEX IF NOT EXISTS {SEARCH_INDEX} ON product "
+            f"USING gin ({SEARCH_DOCUMENT})"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute(f"DROP INDEX IF EXISTS {SEARCH_INDEX}")
+    for name, table, _ in reversed(FOREIGN_KEY_INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,82 @@
+"""Prix payé, date des commandes, agrégats de ventes journaliers
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+
+Pour les commandes déjà en base :
+- unit_price reprend le prix ACTUEL de la variante (le prix payé n'a pas
+  été conservé) ;
+- created_at vaut la date de la migration (la vraie date est inconnue) ;
+- les agrégats sont calculés à partir de ces valeurs : tout l'historique
+  est compté le jour de la migration.
+"""
+from datetime import datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, Sequence[str], None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    migrated_at = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+
+    op.add_column("orderitem", sa.Column("unit_price", sa.Float(), nullable=True))
+    op.execute(
+        "UPDATE orderitem SET unit_price = "
+        "(SELECT variant.price FROM variant WHERE variant.id = orderitem.variant_id)"
+    )
+    op.add_column("order", sa.Column("created_at", sa.DateTime(), nullable=True))
+    op.execute(
+        sa.text('UPDATE "order" SET created_at = :migrated_at')
+        .bindparams(migrated_at=migrated_at)
+    )
+    # Batch : SQLite ne sait pas modifier une colonne (table recréée)
+    with op.batch_alter_table("orderitem") as batch:
+        batch.alter_column("unit_price", existing_type=sa.Float(), nullable=False)
+    with op.batch_alter_table("order") as batch:
+        batch.alter_column("created_at", existing_type=sa.DateTime(), nullable=False)
+
+    op.create_table(
+        "variantdailysales",
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("variant_id", sa.Integer(), nullable=False),
+        sa.Column("product_id", sa.Integer(), nullable=False),
+        sa.Column("units", sa.Integer(), nullable=False),
+        sa.Column("revenue", sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(["product_id"], ["product.id"]),
+        sa.ForeignKeyConstraint(["variant_id"], ["variant.id"]),
+        sa.PrimaryKeyConstraint("day", "variant_id"),
+    )
+    op.create_index("ix_variantdailysales_product_id", "variantdailysales", ["product_id"])
+    # PostgreSQL refuse un littéral non typé dans une colonne date (INSERT ... SELECT)
+    day = "CAST(:day AS DATE)" if op.get_bind().dialect.name == "postgresql" else ":day"
+    op.execute(
+        sa.text(
+            "INSERT INTO variantdailysales (day, variant_id, product_id, units, revenue) "
+            f"SELECT {day}, orderitem.variant_id, variant.product_id, "
+            "sum(orderitem.quantity), sum(orderitem.quantity * orderitem.unit_price) "
+            'FROM orderitem JOIN "order" ON "order".id = orderitem.order_id '
+            "JOIN variant ON variant.id = orderitem.variant_id "
+            "WHERE \"order\".status != 'annulee' "
+            "GROUP BY orderitem.variant_id, variant.product_id"
+        ).bindparams(sa.bindparam("day", migrated_at.date(), type_=sa.Date()))
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_variantdailysales_product_id", table_name="variantdailysales")
+    op.drop_table("variantdailysales")
+    with op.batch_alter_table("order") as batch:
+        batch.drop_column("created_at")
+    with op.batch_alter_table("orderitem") as batch:
+        batch.drop_column("unit_price")
@@ -0,0 +1,78 @@
+"""Recherche insensible aux accents
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+
+"ete" doit trouver "été". L'extension unaccent n'est pas disponible
+partout (droits, hébergeurs) : la fonction catalog_unaccent() est un
+simple translate() des lettres latines accentuées vers leur lettre de
+base, déclaré IMMUTABLE pour pouvoir être indexé. L'index plein texte est
+reconstruit avec cette fonction.
+"""
+import unicodedata
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, Sequence[str], None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEARCH_INDEX = "ix_product_search_document"
+
+# Copies figées de models.product_search_document(), avant / après
+OLD_SEARCH_DOCUMENT = (
+    "(setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'B'))"
+)
+SEARCH_DOCUMENT = (
+    "(setweight(to_tsvector('simple', catalog_unaccent(coalesce(name, ''))), 'A') || "
+    "setweight(to_tsvector('simple', catalog_unaccent(coalesce(description, ''))), 'B'))"
+)
+
+# Latin-1, Latin étendu A/B et additionnel : même résultat que
+# search.fold_accents() (décomposition NFKD sans les diacritiques) pour
+# chaque lettre qui se réduit à une lettre ASCII. Les décompositions
+# Unicode sont stables : la table ne dépend pas de la version de Python.
+ACCENT_RANGES = [(0x00C0, 0x0250), (0x1E00, 0x1F00)]
+
+
+def _accent_table():
+    accented, plain = [], []
+    for start, end in ACCENT_RANGES:
+        for code in range(start, end):
+            char = chr(code)
+            base = "".join(
+                c for c in unicodedata.normalize("NFKD", char) if not unicodedata.combining(c)
+            )
+            if len(base) == 1 and base != char and base.isascii() and base.isalpha():
+                accented.append(char)
+                plain.append(base)
+    return "".join(accented), "".join(plain)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        return # SQLite : index en mémoire (search.py), rien à créer
+    accented, plain = _accent_table()
+    op.execute(
+        "CREATE OR REPLACE FUNCTION catalog_unaccent(value text) RETURNS text "
+        "LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE "
+        f"AS $$ SELECT translate(value, '{accented}', '{plain}') $$"
+    )
+    op.execute(f"DROP INDEX IF EXISTS {SEARCH_INDEX}")
+    op.execute(f"CREATE INDEX {SEARCH_INDEX} ON product USING gin ({SEARCH_DOCUMENT})")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute(f"DROP INDEX IF EXISTS {SEARCH_INDEX}")
+    op.execute(f"CREATE INDEX {SEARCH_INDEX} ON product USING gin ({OLD_SEARCH_DOCUMENT})")
+    op.execute("DROP FUNCTION IF EXISTS catalog_unaccent(text)")
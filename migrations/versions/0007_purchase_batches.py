@@ -0,0 +1,54 @@
+"""Lots d'achat fournisseur
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+
+Les commandes sont réservées par un lot enregistré AVANT l'appel au
+fournisseur : un lot interrompu est rejoué avec la même référence
+(clé d'idempotence) au lieu d'être acheté une seconde fois.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, Sequence[str], None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "purchasebatch",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("reference", sa.String(length=64), nullable=False),
+        sa.Column("status", sa.String(length=20), nullable=False),
+        sa.Column("supplier_reference", sa.String(length=255), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("completed_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("reference"),
+    )
+    op.create_index("ix_purchasebatch_status", "purchasebatch", ["status"])
+    # Batch : SQLite n'ajoute pas de clé étrangère à une table existante
+    with op.batch_alter_table("order") as batch:
+        batch.add_column(sa.Column("purchase_batch_id", sa.Integer(), nullable=True))
+        batch.create_foreign_key(
+            "fk_order_purchase_batch_id", "purchasebatch", ["purchase_batch_id"], ["id"]
+        )
+        batch.create_index("ix_order_purchase_batch_id", ["purchase_batch_id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("order") as batch:
+        batch.drop_index("ix_order_purchase_batch_id")
+        batch.drop_constraint("fk_order_purchase_batch_id", type_="foreignkey")
+        batch.drop_column("purchase_batch_id")
+    op.drop_index("ix_purchasebatch_status", table_name="purchasebatch")
+    op.drop_table("purchasebatch")
@@ -0,0 +1,39 @@
+"""Nouvelles tentatives des lots d'achat
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18
+
+Un lot dont l'achat échoue est rejoué plus tard (délai croissant) au
+lieu de passer avant tous les autres à chaque cycle.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0008"
+down_revision: Union[str, Sequence[str], None] = "0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("purchasebatch", sa.Column("attempts", sa.Integer(), nullable=True))
+    op.execute("UPDATE purchasebatch SET attempts = 0")
+    # Batch : SQLite ne sait pas modifier une colonne (table recréée)
+    with op.batch_alter_table("purchasebatch") as batch:
+        batch.alter_column("attempts", existing_type=sa.Integer(), nullable=False)
+    op.add_column("purchasebatch", sa.Column("next_attempt_at", sa.DateTime(), nullable=True))
+    op.add_column("purchasebatch", sa.Column("last_error", sa.String(length=500), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("purchasebatch") as batch:
+        batch.drop_column("last_error")
+        batch.drop_column("next_attempt_at")
+        batch.drop_column("attempts")
@@ -1,6 +1,9 @@
-from typing import Optional, List
+from datetime import date, datetime, timezone
+from typing import Dict, Literal, Optional, List
+from pydantic import model_validator
 from sqlmodel import Field, SQLModel, Relationship
-from sqlalchemy import Column
+from sqlalchemy import Column, Index, func, text
+from sqlalchemy.dialects import postgresql # noqa: F401 (types de to_tsvector/to_tsquery)
 from sqlalchemy.types import JSON
 
 # --- Modèles pour les Utilisateurs (Users) ---
@@ -19,6 +22,34 @@ class UserRead(UserBase):
     id: int
     is_admin: bool
 
+class CurrentUser(UserRead):
+    """
+    Utilisateur authentifié, reconstruit à partir des "claims" du token JWT
+    (sans requête SQL). 'token_id' est le "jti" du token, utilisé pour le
+    révoquer ; 'token_expires_at' son expiration (timestamp).
+    """
+    token_id: Optional[str] = None
+    token_expires_at: Optional[float] = None
+
+# Tokens JWT révoqués avant leur expiration (déconnexion, refresh token déjà
+# utilisé). Les lignes expirées sont supprimées au démarrage.
+class RevokedToken(SQLModel, table=True):
+    jti: str = Field(primary_key=True)
+    expires_at: int = Field(index=True) # timestamp, comme le "exp" du JWT
+    user_id: Optional[int] = Field(default=None, foreign_key="user.id")
+
+# Réponse de /token et /token/refresh
+class TokenPair(SQLModel):
+    access_token: str
+    refresh_token: str
+    token_type: str = "bearer"
+
+class RefreshRequest(SQLModel):
+    refresh_token: str
+
+class LogoutRequest(SQLModel):
+    refresh_token: Optional[str] = None
+
 
 # --- Structure E-Commerce ---
 
@@ -30,7 +61,41 @@ class ProductBase(SQLModel):
 
 class Product(ProductBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    variants: List["Variant"] = Relationship(back_populates="product")
+    # "selectin" : les variantes de TOUS les produits chargés sont récupérées
+    # en UNE seule requête (WHERE product_id IN (...)) au lieu d'une par produit.
+    variants: List["Variant"] = Relationship(
+        back_populates="product",
+        sa_relationship_kwargs={"lazy": "selectin"}
+    )
+
+# Recherche plein texte (PostgreSQL) sur le nom (poids A) et la description
+# (poids B). Configuration 'simple' : pas de racinisation, les mots sont
+# seulement mis en minuscules (le catalogue mélange plusieurs langues).
+# Les accents sont retirés avant l'indexation ("ete" trouve "été") par
+# catalog_unaccent(), fonction SQL IMMUTABLE créée par la migration 0006
+# (translate(), sans l'extension unaccent).
+SEARCH_CONFIG = "simple"
+
+def product_search_document():
+    """
+    Expression tsvector indexée (index GIN "fonctionnel" ci-dessous).
+    Les requêtes doivent utiliser EXACTEMENT la même expression pour que
+    PostgreSQL se serve de l'index : d'où des littéraux, pas de paramètres.
+    """
+    config = text(f"'{SEARCH_CONFIG}'")
+    def weighted(column, weight: str):
+        return func.setweight(
+            func.to_tsvector(config, func.catalog_unaccent(func.coalesce(column, text("''")))),
+            text(f"'{weight}'"),
+        )
+    columns = Product.__table__.c
+    return weighted(columns.name, "A").op("||")(weighted(columns.description, "B"))
+
+Index(
+    "ix_product_search_document",
+    product_search_document(),
+    postgresql_using="gin",
+).ddl_if(dialect="postgresql")
 
 class ProductCreate(ProductBase):
     pass
@@ -48,9 +113,14 @@ class VariantBase(SQLModel):
     size: str = Field(index=True)
     color: str = Field(index=True)
     price: float
-    alibaba_source_url: str = Field(index=True)
+    # Unique : le lien désigne la DÉCLINAISON précise chez le fournisseur
+    # (taille + couleur, ex. ...item/123.html?skuId=456), pas la fiche
+    # produit. C'est la clé des imports (upsert ON CONFLICT), de la mise à
+    # jour en masse, et du traitement des commandes, qui achète par lien :
+    # deux variantes sur un même lien ne diraient pas quelle taille acheter.
+    alibaba_source_url: str = Field(index=True, unique=True)
     stock_quantity: int = Field(default=0)
-    product_id: int = Field(foreign_key="product.id")
+    product_id: int = Field(foreign_key="product.id", index=True)
 
 class Variant(VariantBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -59,36 +129,172 @@ class Variant(VariantBase, table=True):
 class VariantCreate(VariantBase):
     pass
 
+# Import en masse (flux fournisseur) : un produit et ses variantes.
+# La variante est identifiée par son lien Alibaba (pas d'id côté fournisseur).
+# Un champ absent de la ligne ne modifie pas une variante (ou un produit)
+# existant : seuls les champs fournis sont écrits.
+class ImportVariantRow(SQLModel):
+    size: str
+    color: str
+    price: float = Field(ge=0)
+    alibaba_source_url: str = Field(min_length=1)
+    stock_quantity: Optional[int] = Field(default=None, ge=0) # absent : 0 à la création
+
+class ImportProductRow(ProductBase):
+    variants: List[ImportVariantRow] = Field(min_length=1)
+
+# Mise à jour en masse du stock et du prix (synchronisation fournisseur).
+# Chaque ligne désigne la variante par son id OU par son lien Alibaba.
+class VariantStockUpdate(SQLModel):
+    variant_id: Optional[int] = None
+    alibaba_source_url: Optional[str] = None
+    stock_quantity: Optional[int] = Field(default=None, ge=0)
+    price: Optional[float] = Field(default=None, ge=0)
+
+    @model_validator(mode="after")
+    def check_fields(self):
+        if (self.variant_id is None) == (self.alibaba_source_url is None):
+            raise ValueError("Fournir 'variant_id' OU 'alibaba_source_url'")
+        if self.stock_quantity is None and self.price is None:
+            raise ValueError("Fournir 'stock_quantity' et/ou 'price'")
+        return self
+
+class VariantBulkUpdate(SQLModel):
+    items: List[VariantStockUpdate] = Field(max_length=20000)
+    dry_run: bool = False # True : calcule les différences sans rien écrire
+
+class VariantChange(SQLModel):
+    variant_id: int
+    alibaba_source_url: str
+    old_stock_quantity: int
+    new_stock_quantity: int
+    old_price: float
+    new_price: float
+
+class VariantBulkUpdateReport(SQLModel):
+    dry_run: bool
+    received: int
+    matched: int
+    changed: int
+    not_found: List[str] = [] # id ou lien des lignes sans variante correspondante
+    changes: List[VariantChange] = []
+    elapsed_seconds: float = 0.0
+
+class ImportRowError(SQLModel):
+    line: int
+    error: str
+
+class ImportReport(SQLModel):
+    rows_read: int = 0
+    products_created: int = 0
+    products_updated: int = 0
+    variants_upserted: int = 0
+    errors: List[ImportRowError] = []
+    elapsed_seconds: float = 0.0
+    rows_per_second: float = 0.0
+
+# Compteur de version du catalogue (une seule ligne, id=1).
+# Incrémenté à chaque écriture de produit/variante ; sert à calculer les ETags.
+class CatalogVersion(SQLModel, table=True):
+    id: int = Field(default=1, primary_key=True)
+    version: int = Field(default=1)
+
 # 3. Commande (Order)
+def utcnow() -> datetime:
+    """Date et heure UTC (sans fuseau : c'est ainsi qu'elles sont stockées)."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
 class OrderItemBase(SQLModel):
     quantity: int = Field(gt=0)
-    variant_id: int = Field(foreign_key="variant.id")
-    order_id: int = Field(foreign_key="order.id")
+    # Prix de la variante AU MOMENT de la commande (Variant.price peut changer)
+    unit_price: float
+    variant_id: int = Field(foreign_key="variant.id", index=True)
+    order_id: int = Field(foreign_key="order.id", index=True)
 
 class OrderItem(OrderItemBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     variant: "Variant" = Relationship()
     order: "Order" = Relationship(back_populates="items")
 
+# Statuts d'une commande :
+#   en_attente -> commandee (achetée chez le fournisseur) -> expediee -> livree
+# et, à tout moment, annulee. Les changements passent par order_status.py.
+EN_ATTENTE = "en_attente"
+COMMANDEE = "commandee"
+EXPEDIEE = "expediee"
+LIVREE = "livree"
+ANNULEE = "annulee"
+# Statuts acceptés par l'API (toute autre valeur : 422)
+OrderStatus = Literal[EN_ATTENTE, COMMANDEE, EXPEDIEE, LIVREE, ANNULEE]
+
 class OrderBase(SQLModel):
-    status: str = Field(default="en_attente", index=True)
-    user_id: int = Field(foreign_key="user.id")
+    status: str = Field(default=EN_ATTENTE, index=True)
+    user_id: int = Field(foreign_key="user.id", index=True)
+    created_at: datetime = Field(default_factory=utcnow) # UTC
 
 class Order(OrderBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
+    # Lot d'achat fournisseur qui a réservé la commande (voir fulfillment.py)
+    purchase_batch_id: Optional[int] = Field(
+        default=None, foreign_key="purchasebatch.id", index=True
+    )
     user: "User" = Relationship()
     items: List[OrderItem] = Relationship(back_populates="order")
 
+# Achat groupé chez le fournisseur. Créé (et les commandes réservées)
+# AVANT l'appel au fournisseur, dans sa propre transaction : sa référence
+# sert de clé d'idempotence, et un lot resté "en_cours" (appel en échec,
+# délai dépassé, commit perdu) est rejoué avec la MÊME référence.
+LOT_EN_COURS = "en_cours"
+LOT_PASSE = "passe"
+
+class PurchaseBatch(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    reference: str = Field(max_length=64, unique=True)
+    status: str = Field(default=LOT_EN_COURS, max_length=20, index=True)
+    supplier_reference: Optional[str] = Field(default=None, max_length=255)
+    created_at: datetime = Field(default_factory=utcnow) # UTC
+    completed_at: Optional[datetime] = None
+    # Achats échoués : le lot n'est rejoué qu'à partir de next_attempt_at
+    # (délai qui double à chaque échec), sans bloquer les autres lots
+    attempts: int = Field(default=0)
+    next_attempt_at: Optional[datetime] = None # UTC ; None = dès le prochain cycle
+    last_error: Optional[str] = Field(default=None, max_length=500)
+
 class OrderUpdate(SQLModel):
-    status: str
+    status: OrderStatus
+
+# Ventes par variante et par jour (jour de création de la commande, UTC),
+# tenues à jour à chaque commande et à chaque (dés)annulation : les
+# statistiques lisent quelques lignes par jour et par variante au lieu de
+# parcourir toutes les lignes de commande. Les commandes annulées n'y
+# figurent pas.
+class VariantDailySales(SQLModel, table=True):
+    day: date = Field(primary_key=True)
+    variant_id: int = Field(foreign_key="variant.id", primary_key=True)
+    product_id: int = Field(foreign_key="product.id", index=True)
+    units: int = 0
+    revenue: float = 0.0
 
 # 4. Modèles d'Entrée (Ce que le client envoie)
 class OrderItemCreate(SQLModel):
     variant_id: int
-    quantity: int
+    quantity: int = Field(gt=0) # Une quantité négative augmenterait le stock !
 
 class OrderCreate(SQLModel):
-    items: List[OrderItemCreate]
+    items: List[OrderItemCreate] = Field(min_length=1) # Pas de commande vide
+
+# Réponse déjà envoyée pour un en-tête Idempotency-Key de POST /orders/ :
+# un client qui renvoie la même requête (après un timeout) reçoit cette
+# réponse au lieu de créer une seconde commande. Clé propre à chaque client.
+class IdempotencyKey(SQLModel, table=True):
+    user_id: int = Field(foreign_key="user.id", primary_key=True)
+    key: str = Field(primary_key=True, max_length=255)
+    request_hash: str # empreinte (sha256) du corps de la requête
+    status_code: int
+    response_body: str # JSON renvoyé au client
+    order_id: Optional[int] = Field(default=None, foreign_key="order.id")
+    expires_at: int = Field(index=True) # timestamp ; lignes expirées supprimées au démarrage
 
 
 # ====================================================================
@@ -117,6 +323,20 @@ class ProductReadWithVariants(ProductBase):
     id: int
     variants: List[VariantRead] = [] # Utilise le modèle VariantRead PUBLIC
 
+class SearchFacets(SQLModel):
+    """Nombre de produits trouvés, par taille et par couleur de variante."""
+    size: Dict[str, int] = {}
+    color: Dict[str, int] = {}
+
+class ProductSearchResult(SQLModel):
+    """
+    Modèle PUBLIC pour GET /products/search : une page de résultats
+    (triés par pertinence), le nombre total de résultats et les facettes.
+    """
+    items: List[ProductReadWithVariants] = []
+    total: int = 0
+    facets: SearchFacets = SearchFacets()
+
 class OrderItemRead(OrderItemBase):
     id: int
 
@@ -154,4 +374,28 @@ class OrderReadAdmin(OrderBase):
     """
     id: int
     items: List[OrderItemReadAdmin] = [] # Utilise le modèle ADMIN
-    user: UserRead = None # L'admin peut voir qui a commandé
\ No newline at end of file
+    user: UserRead = None # L'admin peut voir qui a commandé
+
+# --- 5C. Statistiques (ADMIN) ---
+
+class SalesRow(SQLModel):
+    """
+    Ventes d'une période (GET /analytics/sales), regroupées par jour,
+    par produit ou par variante : seuls les champs du regroupement sont remplis.
+    """
+    day: Optional[date] = None
+    product_id: Optional[int] = None
+    product_name: Optional[str] = None
+    variant_id: Optional[int] = None
+    units: int
+    revenue: float
+
+class StockAlert(SQLModel):
+    """Variante qui risque la rupture (GET /analytics/stock-alerts)."""
+    variant_id: int
+    product_id: int
+    size: str
+    color: str
+    stock_quantity: int
+    units_per_day: float # ventes moyennes sur la période observée
+    days_left: float # stock / ventes par jour
\ No newline at end of file
@@ -0,0 +1,59 @@
+from typing import Iterable, List, Optional
+
+from sqlalchemy import select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from analytics import apply_orders_sales
+from models import ANNULEE, COMMANDEE, EN_ATTENTE, EXPEDIEE, LIVREE, Order # noqa: F401 (réexportés)
+
+# --- Changements de statut des commandes ---
+# Les changements de statut passent tous par set_order_status() :
+# PATCH /orders/{id} (admin) comme le traitement automatique des commandes
+# (fulfillment.py). Une commande annulée (ou désannulée) est retirée des
+# (ou remise dans les) agrégats de ventes, dans la même transaction.
+
+
+async def set_order_status(
+    session: AsyncSession,
+    order_ids: Iterable[int],
+    status: str,
+    expected: Optional[str] = None,
+) -> List[int]:
+    """
+    Passe ces commandes au statut 'status', en UN seul UPDATE (sans commit).
+    Avec 'expected', seules les commandes encore dans ce statut changent
+    (une commande déjà traitée entre-temps n'est pas écrasée).
+    Renvoie les id des commandes modifiées.
+    """
+    order_ids = list(order_ids)
+    if not order_ids:
+        return []
+
+    # Statut actuel (verrouillé) des commandes qui peuvent entrer dans ou
+    # sortir de "annulee" ; inutile pour en_attente -> commandee, par exemple.
+    previous = {}
+    if status == ANNULEE or expected is None or expected == ANNULEE:
+        lock = select(Order.id, Order.status).where(Order.id.in_(order_ids)).with_for_update()
+        previous = dict((await session.execute(lock)).all())
+
+    statement = (
+        update(Order)
+        .where(Order.id.in_(order_ids))
+        .values(status=status)
+        .returning(Order.id)
+        # Met aussi à jour les objets Order déjà chargés dans la session
+        .execution_options(synchronize_session="fetch")
+    )
+    if expected is not None:
+        statement = statement.where(Order.status == expected)
+    updated = list((await session.execute(statement)).scalars().all())
+
+    if status == ANNULEE:
+        await apply_orders_sales(
+            session, [i for i in updated if previous.get(i, ANNULEE) != ANNULEE], -1
+        )
+    else:
+        await apply_orders_sales(
+            session, [i for i in updated if previous.get(i) == ANNULEE], 1
+        )
+    return updated
@@ -0,0 +1,56 @@
+from typing import List, Optional
+from fastapi import Query, Response
+
+# --- Pagination par curseur (keyset) ---
+# Au lieu de OFFSET (qui relit toutes les lignes précédentes), on demande
+# "les N lignes dont l'id est > au dernier id vu". Le coût d'une page est
+# constant, quelle que soit sa position dans le catalogue.
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Le curseur de la page suivante est renvoyé dans cet en-tête
+# (absent quand il n'y a plus de page).
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class PageParams:
+    """
+    Dépendance FastAPI regroupant les paramètres de pagination :
+    - limit : nombre d'éléments par page
+    - after : curseur = id du dernier élément de la page précédente
+    """
+
+    def __init__(
+        self,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        after: Optional[int] = Query(None, ge=0),
+    ):
+        self.limit = limit
+        self.after = after
+
+    def cache_key(self) -> str:
+        return f"{self.limit}:{self.after}"
+
+
+def keyset(statement, id_column, page: PageParams):
+    """
+    Applique la pagination keyset à une requête SELECT.
+    On demande UNE ligne de plus que la limite pour savoir
+    s'il existe une page suivante sans faire de COUNT(*).
+    """
+    if page.after is not None:
+        statement = statement.where(id_column > page.after)
+    return statement.order_by(id_column).limit(page.limit + 1)
+
+
+def finalize_page(rows: List, page: PageParams, response: Response) -> List:
+    """
+    Coupe la ligne "sentinelle" et écrit le curseur suivant
+    dans l'en-tête de la réponse.
+    """
+    rows = list(rows)
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        response.headers[NEXT_CURSOR_HEADER] = str(rows[-1].id)
+    return rows
@@ -0,0 +1,278 @@
+import asyncio
+import itertools
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from fastapi import Request
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from bus import bus
+from cache import CATALOG_TOPIC
+from database import async_session_maker, make_async_engine
+from metrics import Counter, Gauge, instrument_engine, register
+
+logger = logging.getLogger(__name__)
+
+# --- Lecture sur des réplicas ---
+# Les lectures publiques du catalogue (GET /products, /variants) et les
+# statistiques peuvent être servies par des réplicas PostgreSQL en lecture
+# seule : un pic de navigation ne prend plus de connexions ni de CPU au
+# primaire, qui garde les commandes et les écritures admin.
+#
+#     DATABASE_REPLICA_URLS=postgresql://...@replica1/db,postgresql://...@replica2/db
+#
+# - Répartition : à tour de rôle entre les réplicas en bonne santé ; s'il
+#   n'y en a aucun (ou aucun de configuré), tout va au primaire.
+# - Santé : un "SELECT 1" (et le retard de réplication) toutes les
+#   REPLICA_HEALTH_INTERVAL secondes ; une erreur de connexion pendant une
+#   requête écarte aussi le réplica jusqu'au prochain contrôle réussi.
+# - Lire ses propres écritures : un réplica a toujours un peu de retard.
+#   Après une écriture (POST/PUT/PATCH/DELETE réussi), le client reçoit un
+#   cookie qui envoie ses lectures au primaire pendant REPLICA_PIN_SECONDS.
+#   Après une modification du catalogue, TOUS les workers lisent le
+#   catalogue sur le primaire pendant ce délai : sinon le cache, qui vient
+#   d'être vidé, se remplirait de données pas encore répliquées (et les
+#   garderait, sous le nouvel ETag, jusqu'à la modification suivante).
+#   Ce délai doit donc couvrir le pire retard d'un réplica jugé sain :
+#   REPLICA_MAX_LAG_SECONDS au dernier contrôle, plus le temps écoulé
+#   depuis (REPLICA_HEALTH_INTERVAL). Vérifié au démarrage.
+
+DATABASE_REPLICA_URLS = [
+    url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()
+]
+REPLICA_HEALTH_INTERVAL = float(os.getenv("REPLICA_HEALTH_INTERVAL", "2")) # secondes
+REPLICA_HEALTH_TIMEOUT = float(os.getenv("REPLICA_HEALTH_TIMEOUT", "2"))
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "3"))
+REPLICA_PIN_SECONDS = float(os.getenv("REPLICA_PIN_SECONDS", "5"))
+
+if DATABASE_REPLICA_URLS and REPLICA_PIN_SECONDS < REPLICA_MAX_LAG_SECONDS + REPLICA_HEALTH_INTERVAL:
+    raise ValueError(
+        "REPLICA_PIN_SECONDS doit être au moins REPLICA_MAX_LAG_SECONDS + "
+        f"REPLICA_HEALTH_INTERVAL ({REPLICA_MAX_LAG_SECONDS} + {REPLICA_HEALTH_INTERVAL} s), "
+        f"et non {REPLICA_PIN_SECONDS} s"
+    )
+
+PIN_COOKIE = "read_primary_until"
+
+# État d'un réplica PostgreSQL :
+# - en récupération (sinon : base autonome, copie locale ou tests, à jour
+#   par définition) ;
+# - réception du WAL en cours (processus "WAL receiver" présent) : si le
+#   flux est coupé, réception et rejeu s'arrêtent au même point et le
+#   retard calculé ci-dessous resterait à 0 ;
+# - retard de rejeu (secondes) ; 0 s'il a tout rejoué ce qu'il a reçu
+#   (sinon un primaire sans écriture ferait croire à un retard croissant).
+REPLICATION_STATE_SQL = text(
+    "SELECT pg_is_in_recovery(), EXISTS (SELECT 1 FROM pg_stat_wal_receiver), "
+    "COALESCE(CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END, 0)"
+)
+
+READS = register(Counter(
+    "db_read_sessions_total", "Sessions de lecture, par base utilisée.", ("target",)
+))
+REPLICA_UP = register(Gauge(
+    "db_replica_up", "Réplica utilisable (1) ou écarté (0).", ("replica",)
+))
+
+
+class Replica:
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.engine = make_async_engine(url, name)
+        instrument_engine(self.engine.sync_engine) # requêtes SQL comptées dans /metrics
+        self.session_maker = async_sessionmaker(
+            self.engine, class_=AsyncSession, expire_on_commit=False
+        )
+        self.healthy = False # jusqu'au premier contrôle réussi
+        self.lag_seconds: Optional[float] = None
+        self.last_error: Optional[str] = None
+        REPLICA_UP.set((name,), 0)
+
+    def mark(self, healthy: bool, error: Optional[str] = None) -> None:
+        if healthy != self.healthy:
+            logger.log(
+                logging.INFO if healthy else logging.WARNING,
+                "Réplica %s", "rétabli" if healthy else "écarté",
+                extra={"replica": self.name, "error": error},
+            )
+        self.healthy = healthy
+        self.last_error = error
+        REPLICA_UP.set((self.name,), 1 if healthy else 0)
+
+    async def check(self) -> None:
+        try:
+            async with self.engine.connect() as connection:
+                if connection.dialect.name == "postgresql":
+                    in_recovery, receiving, lag = (
+                        await connection.execute(REPLICATION_STATE_SQL)
+                    ).one()
+                else:
+                    await connection.execute(text("SELECT 1"))
+                    in_recovery, receiving, lag = False, False, 0.0
+        except Exception as error:
+            self.lag_seconds = None
+            self.mark(False, repr(error))
+            return
+        self.lag_seconds = float(lag)
+        if in_recovery and not receiving:
+            # Plus rien n'arrive du primaire : le retard grandit sans se voir
+            self.mark(False, "réplication interrompue (pas de WAL receiver)")
+        elif self.lag_seconds > REPLICA_MAX_LAG_SECONDS:
+            self.mark(False, f"retard de réplication : {self.lag_seconds:.1f}s")
+        else:
+            self.mark(True)
+
+
+class ReplicaRouter:
+    def __init__(self, urls: List[str]):
+        self.replicas = [Replica(f"replica{i}", url) for i, url in enumerate(urls, start=1)]
+        self._turn = itertools.count()
+        self._pinned_until = 0.0 # time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+
+    def choose(self, request: Request) -> Optional[Replica]:
+        """Réplica pour cette lecture, ou None pour le primaire."""
+        if not self.replicas or time.monotonic() < self._pinned_until:
+            return None
+        if _pinned_by_cookie(request):
+            return None
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._turn) % len(healthy)]
+
+    def pin_primary(self, seconds: float = REPLICA_PIN_SECONDS) -> None:
+        """Toutes les lectures de ce processus vont au primaire pendant 'seconds'."""
+        self._pinned_until = max(self._pinned_until, time.monotonic() + seconds)
+
+    async def check_all(self) -> None:
+        await asyncio.gather(*(
+            asyncio.wait_for(replica.check(), REPLICA_HEALTH_TIMEOUT)
+            for replica in self.replicas
+        ), return_exceptions=True)
+        for replica in self.replicas:
+            if replica.healthy and replica.lag_seconds is None: # délai dépassé
+                replica.mark(False, "contrôle de santé trop long")
+
+    def start(self) -> None:
+        if self.replicas and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.check_all()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Échec du contrôle des réplicas")
+            await asyncio.sleep(REPLICA_HEALTH_INTERVAL)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pinned_to_primary_seconds": round(max(0.0, self._pinned_until - time.monotonic()), 1),
+            "replicas": [
+                {
+                    "name": replica.name,
+                    "healthy": replica.healthy,
+                    "lag_seconds": replica.lag_seconds,
+                    "last_error": replica.last_error,
+                }
+                for replica in self.replicas
+            ],
+        }
+
+
+def _pinned_by_cookie(request: Request) -> bool:
+    value = request.cookies.get(PIN_COOKIE)
+    if not value:
+        return False
+    try:
+        until = float(value)
+    except ValueError:
+        return False
+    now = time.time()
+    # Une valeur trop lointaine (cookie forgé) ne bloque pas sur le primaire
+    return now < until <= now + REPLICA_PIN_SECONDS + 1
+
+
+replica_router = ReplicaRouter(DATABASE_REPLICA_URLS)
+
+
+def _on_catalog_message(data: Optional[Dict[str, Any]]) -> None:
+    replica_router.pin_primary()
+
+
+# AVANT l'invalidation du cache (abonnée à l'import de cache.py) : sinon,
+# entre les deux, une lecture sur un réplica en retard remettrait en cache
+# des lignes périmées sous la nouvelle génération du cache.
+bus.subscribe(CATALOG_TOPIC, _on_catalog_message, first=True)
+
+
+async def get_read_session(request: Request):
+    """
+    Dépendance FastAPI pour les endpoints en LECTURE SEULE : une session sur
+    un réplica (ou sur le primaire, voir ReplicaRouter.choose).
+    Ne jamais écrire avec cette session.
+    """
+    replica = replica_router.choose(request)
+    READS.inc((replica.name if replica else "primary",))
+    session_maker = replica.session_maker if replica else async_session_maker
+    async with session_maker() as session:
+        try:
+            yield session
+        except DBAPIError as error:
+            # Réplica injoignable : écarté jusqu'au prochain contrôle réussi
+            if replica is not None and (
+                error.connection_invalidated or isinstance(error, (OperationalError, InterfaceError))
+            ):
+                replica.mark(False, repr(error))
+            raise
+
+
+# --- Middleware ASGI : lire ses propres écritures ---
+
+class ReadYourWritesMiddleware:
+    """
+    Après une écriture réussie, pose le cookie qui envoie les lectures de
+    ce client au primaire pendant REPLICA_PIN_SECONDS.
+    """
+
+    WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] not in self.WRITE_METHODS
+            or not replica_router.replicas
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                until = time.time() + REPLICA_PIN_SECONDS
+                cookie = (
+                    f"{PIN_COOKIE}={until:.1f}; Max-Age={int(REPLICA_PIN_SECONDS) + 1}; "
+                    "Path=/; HttpOnly; SameSite=Lax"
+                )
+                message["headers"] = list(message.get("headers", ())) + [
+                    (b"set-cookie", cookie.encode("latin-1"))
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,110 @@
+import heapq
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from bus import bus
+from database import engine
+from models import RevokedToken
+
+# --- Révocation des tokens JWT ---
+# Un token JWT est valable jusqu'à son expiration, sans consulter la base.
+# Pour pouvoir y mettre fin plus tôt (déconnexion, rotation des refresh
+# tokens), on garde la liste des identifiants de tokens ("jti") révoqués :
+# - en base (table "revokedtoken") : survit aux redémarrages ;
+# - en mémoire dans chaque worker : vérification en O(1) à chaque requête.
+# Les révocations sont diffusées à tous les workers par le bus.
+
+AUTH_TOPIC = "auth"
+
+
+class RevocationList:
+    """
+    jti révoqués, avec leur date d'expiration (timestamp).
+    - un dict pour le test d'appartenance en O(1) ;
+    - un tas (heap) trié par expiration pour oublier les tokens expirés
+      (ils sont de toute façon refusés par jwt.decode) sans parcourir le dict.
+    """
+
+    def __init__(self):
+        self._revoked: Dict[str, float] = {}
+        self._by_expiry: List[Tuple[float, str]] = []
+        self._lock = threading.Lock()
+
+    def add(self, jti: str, expires_at: float) -> None:
+        with self._lock:
+            self._purge(time.time())
+            if jti not in self._revoked:
+                heapq.heappush(self._by_expiry, (expires_at, jti))
+            self._revoked[jti] = expires_at
+
+    def is_revoked(self, jti: str) -> bool:
+        expires_at = self._revoked.get(jti)
+        return expires_at is not None and expires_at > time.time()
+
+    def replace(self, entries: Dict[str, float]) -> None:
+        """Remplace tout le contenu (rechargement depuis la base)."""
+        with self._lock:
+            self._revoked = dict(entries)
+            self._by_expiry = [(exp, jti) for jti, exp in entries.items()]
+            heapq.heapify(self._by_expiry)
+
+    def purge(self) -> None:
+        with self._lock:
+            self._purge(time.time())
+
+    def _purge(self, now: float) -> None:
+        while self._by_expiry and self._by_expiry[0][0] <= now:
+            _, jti = heapq.heappop(self._by_expiry)
+            self._revoked.pop(jti, None)
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+
+revocation_list = RevocationList()
+
+
+def load_revocations() -> int:
+    """
+    Recharge les révocations depuis la base (au démarrage, ou après une
+    coupure du bus) et supprime au passage les lignes expirées.
+    """
+    now = int(time.time())
+    with Session(engine) as session:
+        session.execute(delete(RevokedToken).where(RevokedToken.expires_at <= now))
+        session.commit()
+        rows = session.exec(select(RevokedToken)).all()
+    revocation_list.replace({row.jti: row.expires_at for row in rows})
+    return len(revocation_list)
+
+
+def _on_auth_message(data: Optional[Dict[str, Any]]) -> None:
+    if data is None:
+        load_revocations()
+    elif "jti" in data:
+        revocation_list.add(data["jti"], data["exp"])
+
+
+bus.subscribe(AUTH_TOPIC, _on_auth_message)
+
+
+async def revoke_token(
+    session: AsyncSession,
+    jti: str,
+    expires_at: float,
+    user_id: Optional[int] = None,
+) -> None:
+    """
+    Révoque un token : enregistré en base (commit), puis diffusé à TOUS
+    les workers. Lève IntegrityError si ce jti était déjà révoqué : c'est ce
+    qui rend la rotation des refresh tokens sûre face aux requêtes simultanées.
+    """
+    session.add(RevokedToken(jti=jti, expires_at=int(expires_at), user_id=user_id))
+    await session.commit()
+    await run_in_threadpool(bus.publish, AUTH_TOPIC, {"jti": jti, "exp": expires_at})
@@ -0,0 +1,98 @@
+from fastapi import APIRouter, Depends
+
+from models import CurrentUser
+from auth import get_current_admin_user
+from cache import catalog_cache, invalidate_catalog
+from database import pool_metrics, async_session_maker
+from fulfillment import fulfillment_worker, pending_orders, unfinished_batches
+from hashing import hash_pool_stats
+from replicas import replica_router
+from search import search_index
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["Administration"]
+)
+
+# --- Endpoints ADMIN (supervision) ---
+@router.get("/cache")
+async def read_cache_stats(admin_user: CurrentUser = Depends(get_current_admin_user)):
+    """
+    [ADMIN SEULEMENT]
+    Statistiques du cache catalogue de CE processus
+    (hits, misses, évictions, taille...).
+    """
+    return catalog_cache.stats()
+
+@router.delete("/cache")
+async def clear_cache(admin_user: CurrentUser = Depends(get_current_admin_user)):
+    """
+    [ADMIN SEULEMENT]
+    Vide le cache catalogue de tous les workers.
+    """
+    await invalidate_catalog()
+    return catalog_cache.stats()
+
+
+@router.get("/pool")
+async def read_pool_stats(admin_user: CurrentUser = Depends(get_current_admin_user)):
+    """
+    [ADMIN SEULEMENT]
+    État des pools de connexions de CE processus : connexions empruntées,
+    débordement, temps d'attente moyen/max, délais dépassés.
+    Vide en SQLite (pas de pool configuré).
+    """
+    return {name: metrics.stats() for name, metrics in pool_metrics.items()}
+
+@router.get("/hashing")
+async def read_hashing_stats(admin_user: CurrentUser = Depends(get_current_admin_user)):
+    """
+    [ADMIN SEULEMENT]
+    Occupation du pool de hachage bcrypt de ce processus.
+    """
+    return hash_pool_stats()
+
+@router.get("/search")
+async def read_search_stats(admin_user: CurrentUser = Depends(get_current_admin_user)):
+    """
+    [ADMIN SEULEMENT]
+    État de l'index de recherche en mémoire de ce processus
+    (utilisé seulement hors PostgreSQL).
+    """
+    return search_index.stats()
+
+@router.get("/fulfillment")
+async def read_fulfillment_stats(admin_user: CurrentUser = Depends(get_current_admin_user)):
+    """
+    [ADMIN SEULEMENT]
+    Traitement automatique des commandes : commandes en attente, lots dont
+    l'achat est à rejouer, dernier lot traité par CE processus, dernière erreur.
+    """
+    async with async_session_maker() as session:
+        queue_depth = await pending_orders(session)
+        unfinished = await unfinished_batches(session)
+    return {
+        "queue_depth": queue_depth,
+        "unfinished_batches": len(unfinished),
+        **fulfillment_worker.stats(),
+    }
+
+@router.post("/fulfillment/run")
+async def run_fulfillment(admin_user: CurrentUser = Depends(get_current_admin_user)):
+    """
+    [ADMIN SEULEMENT]
+    Traite tout de suite les commandes en attente (sans attendre le
+    prochain cycle) et renvoie les lots passés au fournisseur.
+    """
+    reports = await fulfillment_worker.run_once()
+    return [report._asdict() for report in reports]
+
+@router.get("/replicas")
+async def read_replica_stats(admin_user: CurrentUser = Depends(get_current_admin_user)):
+    """
+    [ADMIN SEULEMENT]
+    Réplicas de lecture vus par CE processus : santé, retard de
+    réplication, dernière erreur, et délai restant pendant lequel les
+    lectures du catalogue vont au primaire (après une modification).
+    """
+    return replica_router.stats()
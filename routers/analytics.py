@@ -0,0 +1,143 @@
+from datetime import date, timedelta
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import func
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from auth import get_current_admin_user
+from replicas import get_read_session
+from models import CurrentUser, Product, SalesRow, StockAlert, Variant, VariantDailySales, utcnow
+
+router = APIRouter(
+    prefix="/analytics",
+    tags=["Statistiques"]
+)
+
+# Toutes ces statistiques lisent la table d'agrégats "variantdailysales"
+# (une ligne par jour et par variante, voir analytics.py) : le coût dépend
+# du nombre de jours x variantes vendues, pas du nombre de commandes.
+# Lues sur un réplica s'il y en a (voir replicas.py) : quelques secondes
+# de retard ne changent rien à ces chiffres.
+
+MAX_PERIOD_DAYS = 366
+
+
+def _period(start: Optional[date], end: Optional[date], default_days: int):
+    """Période [start, end] (jours UTC, bornes incluses) ; par défaut les 'default_days' derniers jours."""
+    end = end or utcnow().date()
+    start = start or end - timedelta(days=default_days - 1)
+    if start > end:
+        raise HTTPException(status_code=422, detail="'start' doit précéder 'end'.")
+    if (end - start).days >= MAX_PERIOD_DAYS:
+        raise HTTPException(
+            status_code=422, detail=f"Période limitée à {MAX_PERIOD_DAYS} jours."
+        )
+    return start, end
+
+# --- Endpoint ADMIN ---
+@router.get("/sales", response_model=List[SalesRow])
+async def read_sales(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    group_by: str = Query("product", pattern="^(day|product|variant)$"),
+    limit: int = Query(50, ge=1, le=1000),
+    session: AsyncSession = Depends(get_read_session),
+    admin_user: CurrentUser = Depends(get_current_admin_user)
+):
+    """
+    [ADMIN SEULEMENT]
+    Unités vendues et chiffre d'affaires (au prix payé) entre 'start' et
+    'end' inclus (par défaut : les 7 derniers jours), hors commandes annulées.
+    - group_by=product : par produit, meilleur chiffre d'affaires d'abord
+    - group_by=variant : par variante, idem
+    - group_by=day     : par jour, dans l'ordre chronologique
+    """
+    start, end = _period(start, end, default_days=7)
+    units = func.sum(VariantDailySales.units)
+    revenue = func.sum(VariantDailySales.revenue)
+    in_period = (VariantDailySales.day >= start, VariantDailySales.day <= end)
+
+    if group_by == "day":
+        statement = (
+            select(VariantDailySales.day, units, revenue)
+            .where(*in_period)
+            .group_by(VariantDailySales.day)
+            .order_by(VariantDailySales.day)
+        )
+        rows = (await session.exec(statement.limit(limit))).all()
+        return [SalesRow(day=day, units=u, revenue=round(r, 2)) for day, u, r in rows]
+
+    if group_by == "variant":
+        statement = (
+            select(VariantDailySales.variant_id, VariantDailySales.product_id, units, revenue)
+            .where(*in_period)
+            .group_by(VariantDailySales.variant_id, VariantDailySales.product_id)
+        )
+    else:
+        statement = (
+            select(VariantDailySales.product_id, units, revenue)
+            .where(*in_period)
+            .group_by(VariantDailySales.product_id)
+        )
+    statement = statement.order_by(revenue.desc(), units.desc()).limit(limit)
+    rows = (await session.exec(statement)).all()
+
+    # Noms des produits de la page (une requête, pas de N+1)
+    product_ids = {row.product_id for row in rows}
+    names = dict((await session.exec(
+        select(Product.id, Product.name).where(Product.id.in_(product_ids))
+    )).all()) if product_ids else {}
+
+    return [
+        SalesRow(
+            product_id=row.product_id,
+            product_name=names.get(row.product_id),
+            variant_id=getattr(row, "variant_id", None),
+            units=row[-2],
+            revenue=round(row[-1], 2),
+        )
+        for row in rows
+    ]
+
+# --- Endpoint ADMIN ---
+@router.get("/stock-alerts", response_model=List[StockAlert])
+async def read_stock_alerts(
+    days: int = Query(14, ge=1, le=90),
+    horizon: float = Query(7, gt=0, le=365),
+    limit: int = Query(100, ge=1, le=1000),
+    session: AsyncSession = Depends(get_read_session),
+    admin_user: CurrentUser = Depends(get_current_admin_user)
+):
+    """
+    [ADMIN SEULEMENT]
+    Variantes en passe d'être épuisées : au rythme des ventes des 'days'
+    derniers jours, leur stock tient moins de 'horizon' jours.
+    Les plus urgentes d'abord.
+    """
+    today = utcnow().date()
+    units = func.sum(VariantDailySales.units)
+    statement = (
+        select(Variant, units)
+        .join(VariantDailySales, VariantDailySales.variant_id == Variant.id)
+        .where(VariantDailySales.day > today - timedelta(days=days))
+        .group_by(Variant.id)
+        # stock / (unités / days) <= horizon, sans division
+        .having(units > 0, Variant.stock_quantity * days <= units * horizon)
+        .order_by((Variant.stock_quantity * 1.0 / units).asc(), Variant.id)
+        .limit(limit)
+    )
+    alerts = []
+    for variant, sold in (await session.exec(statement)).all():
+        units_per_day = sold / days
+        alerts.append(StockAlert(
+            variant_id=variant.id,
+            product_id=variant.product_id,
+            size=variant.size,
+            color=variant.color,
+            stock_quantity=variant.stock_quantity,
+            units_per_day=round(units_per_day, 2),
+            days_left=round(variant.stock_quantity / units_per_day, 1),
+        ))
+    return alerts
@@ -1,47 +1,120 @@
-from datetime import timedelta
+from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlmodel import Session
+from sqlalchemy.exc import IntegrityError
+from sqlmodel.ext.asyncio.session import AsyncSession
 from auth import (
-    ACCESS_TOKEN_EXPIRE_MINUTES, 
-    create_access_token, 
-    get_user, 
-    verify_password
+    create_token_pair,
+    decode_refresh_token,
+    get_current_user,
+    get_user
 )
 from database import get_session
+from hashing import verify_and_update_async
+from models import CurrentUser, LogoutRequest, RefreshRequest, TokenPair, User
+from revocation import revoke_token
 
 router = APIRouter(
     tags=["Authentification"] # Étiquette pour la documentation /docs
 )
 
-@router.post("/token")
-def login_for_access_token(
+@router.post("/token", response_model=TokenPair)
+async def login_for_access_token(
     # FastAPI utilise OAuth2PasswordRequestForm pour récupérer
     # le username et password depuis un formulaire (form-data)
     form_data: OAuth2PasswordRequestForm = Depends(), 
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_session)
 ):
     """
     Endpoint de connexion (login).
     L'utilisateur envoie 'username' et 'password'.
-    Le serveur renvoie un 'access_token' s'ils sont corrects.
+    Le serveur renvoie un 'access_token' (courte durée) et un
+    'refresh_token' (longue durée, voir /token/refresh) s'ils sont corrects.
     """
     # 1. Vérifie si l'utilisateur existe
-    user = get_user(session, form_data.username)
+    user = await get_user(session, form_data.username)
     
     # 2. Vérifie si le mot de passe est correct
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    #    (bcrypt tourne dans le pool de processus dédié, 429 s'il est saturé)
+    is_valid, new_hash = False, None
+    if user:
+        is_valid, new_hash = await verify_and_update_async(
+            form_data.password, user.hashed_password
+        )
+    if not is_valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Nom d'utilisateur ou mot de passe incorrect",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+    # Le hachage stocké est obsolète (coût bcrypt augmenté depuis) :
+    # on enregistre le nouveau, calculé avec le mot de passe en clair.
+    if new_hash:
+        user.hashed_password = new_hash
+        session.add(user)
+        await session.commit()
     
-    # 3. Crée le token
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
-    )
-    
-    # 4. Renvoie le token
-    return {"access_token": access_token, "token_type": "bearer"}
\ No newline at end of file
+    # 3. Crée et renvoie les tokens
+    #    (id et rôle dans le token : les endpoints n'auront pas besoin de la DB)
+    return create_token_pair(user)
+
+@router.post("/token/refresh", response_model=TokenPair)
+async def refresh_access_token(
+    refresh: RefreshRequest,
+    session: AsyncSession = Depends(get_session)
+):
+    """
+    Échange un refresh token valide contre une NOUVELLE paire de tokens,
+    sans mot de passe. Le refresh token utilisé est révoqué (rotation) :
+    il ne peut servir qu'une seule fois.
+    """
+    payload = decode_refresh_token(refresh.refresh_token)
+
+    # Relit l'utilisateur (1 requête, bien moins cher que bcrypt) :
+    # un changement de rôle ou une suppression est pris en compte ici.
+    user = await session.get(User, payload.get("uid"))
+    if user is None or user.username != payload.get("sub"):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Refresh token invalide ou expiré",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    tokens = create_token_pair(user)
+
+    # Rotation : la clé primaire (jti) garantit qu'un même refresh token
+    # utilisé deux fois en même temps ne produit qu'UNE nouvelle paire.
+    try:
+        await revoke_token(session, payload["jti"], payload["exp"], user_id=user.id)
+    except IntegrityError:
+        await session.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Refresh token déjà utilisé",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return tokens
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(
+    body: Optional[LogoutRequest] = None,
+    session: AsyncSession = Depends(get_session),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """
+    Déconnexion : révoque le token utilisé pour cette requête et, s'il est
+    fourni, le refresh token associé (dans tous les workers, immédiatement).
+    """
+    to_revoke = []
+    if current_user.token_id is not None:
+        to_revoke.append((current_user.token_id, current_user.token_expires_at))
+    if body is not None and body.refresh_token:
+        payload = decode_refresh_token(body.refresh_token)
+        if payload.get("uid") == current_user.id:
+            to_revoke.append((payload["jti"], payload["exp"]))
+
+    for jti, expires_at in to_revoke:
+        try:
+            await revoke_token(session, jti, expires_at, user_id=current_user.id)
+        except IntegrityError:
+            await session.rollback() # Déjà révoqué
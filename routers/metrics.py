@@ -0,0 +1,28 @@
+import os
+import secrets
+
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from metrics import collect_metrics
+
+router = APIRouter(tags=["Supervision"])
+
+# Si défini, Prometheus doit envoyer "Authorization: Bearer <METRICS_TOKEN>"
+# (l'API est publique : les métriques ne doivent pas l'être forcément).
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def read_metrics(authorization: str = Header(None)):
+    """
+    Métriques au format texte de Prometheus : celles de CE processus, ou
+    de tous les workers si METRICS_DIR est défini (voir metrics.py).
+    """
+    if METRICS_TOKEN and not secrets.compare_digest(
+        authorization or "", f"Bearer {METRICS_TOKEN}"
+    ):
+        raise HTTPException(status_code=401, detail="Token de supervision invalide")
+    return PlainTextResponse(
+        collect_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
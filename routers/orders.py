@@ -1,117 +1,321 @@
-from fastapi import APIRouter, HTTPException, Depends, status
-from typing import List
-from sqlmodel import Session, select
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Response, status
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+import csv
+import io
+import logging
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
 
-from database import get_session
+from database import async_session_maker, get_session
 from models import (
-    User, Order, OrderCreate, OrderUpdate, Variant, OrderItem,
+    CurrentUser, Order, OrderCreate, OrderStatus, OrderUpdate, Variant, OrderItem,
     OrderRead, # Le modèle PUBLIC
     OrderReadAdmin # <-- Le NOUVEAU modèle ADMIN
 )
 from auth import get_current_user, get_current_admin_user 
+from pagination import PageParams, keyset, finalize_page
+from idempotency import REPLAYED_HEADER, idempotency_store, request_fingerprint
+from order_status import EN_ATTENTE, set_order_status
+from analytics import record_order_sales
+from serialization import dump_json, json_response
 
 router = APIRouter(
     prefix="/orders",
     tags=["Commandes (Panier)"]
 )
 
+logger = logging.getLogger(__name__)
+
+# En asynchrone, les relations ne peuvent pas être chargées "à la demande"
+# pendant la sérialisation : on charge explicitement tout le graphe renvoyé,
+# en un nombre FIXE de requêtes quel que soit le nombre de commandes :
+# 1. les commandes (+ leur client, par jointure : relation "plusieurs-à-un")
+# 2. toutes les lignes de ces commandes (WHERE order_id IN ...),
+#    avec leur variante par jointure
+ORDER_LOAD_OPTIONS = [
+    selectinload(Order.items).joinedload(OrderItem.variant),
+]
+ORDER_ADMIN_LOAD_OPTIONS = ORDER_LOAD_OPTIONS + [
+    joinedload(Order.user),
+]
+
+# Nombre de commandes lues par lot pendant un export
+EXPORT_BATCH_SIZE = 500
+
+EXPORT_CSV_COLUMNS = [
+    "order_id", "status", "user_id", "username",
+    "item_id", "variant_id", "product_id", "size", "color", "price",
+    "quantity", "alibaba_source_url", "unit_price", "created_at",
+]
+
+def admin_order_filters(status_filter: Optional[OrderStatus], user_id: Optional[int]) -> list:
+    """Filtres admin sur les colonnes indexées Order.status et Order.user_id."""
+    clauses = []
+    if status_filter is not None:
+        clauses.append(Order.status == status_filter)
+    if user_id is not None:
+        clauses.append(Order.user_id == user_id)
+    return clauses
+
 # --- Endpoint CLIENT ---
 @router.post("/", response_model=OrderRead, status_code=status.HTTP_201_CREATED)
-def create_order(
+async def create_order(
     order_data: OrderCreate,
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, min_length=1, max_length=255),
+    session: AsyncSession = Depends(get_session),
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Crée une nouvelle commande.
     Renvoie le modèle PUBLIC (OrderRead)
+
+    Avec un en-tête Idempotency-Key (une valeur unique par commande, choisie
+    par le client) : renvoyer la même requête avec la même clé (après un
+    timeout...) ne crée pas de seconde commande, la réponse de la première
+    est renvoyée (en-tête Idempotent-Replayed: true). Réutiliser la clé avec
+    un autre contenu donne une erreur 422.
     """
-    
-    db_order = Order(user_id=current_user.id, status="en_attente")
-    session.add(db_order)
-    session.commit()
-    session.refresh(db_order)
-    
+    async def operation():
+        db_order = await _place_order(session, current_user, order_data)
+        # Tout est déjà en mémoire (commande, lignes, variantes verrouillées) :
+        # on construit la réponse AVANT le commit, sans aucun refresh.
+        return dump_json(OrderRead, db_order), db_order.id
+
+    if idempotency_key is None:
+        body, _ = await operation()
+        await session.commit()
+        return json_response(body, response, status.HTTP_201_CREATED)
+
+    stored, replayed = await idempotency_store.run(
+        session, current_user.id, idempotency_key,
+        request_fingerprint(order_data), operation, status.HTTP_201_CREATED,
+    )
+    if replayed:
+        response.headers[REPLAYED_HEADER] = "true"
+    return json_response(stored.body, response, stored.status_code)
+
+async def _place_order(
+    session: AsyncSession, current_user: CurrentUser, order_data: OrderCreate
+) -> Order:
+    """
+    Vérifie et réserve le stock, puis crée la commande et ses lignes
+    (flush, SANS commit : c'est à l'appelant de terminer la transaction).
+    """
+    # 1. Quantité totale demandée par variante
+    #    (une même variante peut apparaître sur plusieurs lignes)
+    requested = {}
     for item_data in order_data.items:
-        variant = session.get(Variant, item_data.variant_id)
+        requested[item_data.variant_id] = (
+            requested.get(item_data.variant_id, 0) + item_data.quantity
+        )
+
+    # 2. Verrouille TOUTES les variantes demandées en une seule requête
+    #    (SELECT ... FOR UPDATE). Une commande concurrente sur les mêmes
+    #    variantes attend notre commit : le stock ne peut pas être vendu deux
+    #    fois. Le tri par id garantit un ordre de verrouillage identique pour
+    #    toutes les commandes, ce qui évite les interblocages (deadlocks).
+    statement = (
+        select(Variant)
+        .where(Variant.id.in_(requested))
+        .order_by(Variant.id)
+        .with_for_update()
+    )
+    variants = {
+        variant.id: variant for variant in (await session.exec(statement)).all()
+    }
+
+    # 3. Vérifie l'existence et le stock de chaque variante
+    #    (en cas d'erreur, le rollback de la session libère les verrous)
+    for variant_id, quantity in requested.items():
+        variant = variants.get(variant_id)
         if not variant:
             raise HTTPException(
                 status_code=404, 
-                detail=f"Variante avec ID {item_data.variant_id} non trouvée."
+                detail=f"Variante avec ID {variant_id} non trouvée."
             )
-        if variant.stock_quantity < item_data.quantity:
+        if variant.stock_quantity < quantity:
             raise HTTPException(
                 status_code=400,
                 detail=f"Stock insuffisant pour {variant.size} {variant.color}."
             )
-        
-        db_item = OrderItem(
+
+    # 4. Décrémente le stock (les UPDATE sont envoyés groupés au flush)
+    for variant_id, quantity in requested.items():
+        variants[variant_id].stock_quantity -= quantity
+
+    # 5. Crée la commande et TOUTES ses lignes dans la même transaction.
+    #    Au flush, SQLAlchemy insère la commande puis les lignes ; les verrous
+    #    sont tenus jusqu'au commit, et une erreur plus haut n'a laissé aucune
+    #    commande orpheline.
+    #    Sur PostgreSQL, toutes les lignes partent en UN SEUL INSERT groupé
+    #    ("insertmanyvalues" : INSERT ... VALUES (...), (...) RETURNING id) :
+    #    5 requêtes par commande, qu'elle ait 1, 10 ou 50 articles.
+    #    Sur SQLite (tests locaux), SQLAlchemy ne sait pas y renvoyer les id
+    #    dans l'ordre des lignes : un INSERT par ligne (4 + N requêtes).
+    db_order = Order(user_id=current_user.id, status=EN_ATTENTE)
+    db_items = [
+        OrderItem(
             quantity=item_data.quantity,
-            variant_id=item_data.variant_id,
-            order_id=db_order.id
+            unit_price=variants[item_data.variant_id].price, # prix payé, figé
+            variant=variants[item_data.variant_id],
+            order=db_order
         )
-        
-        variant.stock_quantity -= item_data.quantity
-        session.add(variant)
-        session.add(db_item)
-        
-    session.commit()
-    session.refresh(db_order)
+        for item_data in order_data.items
+    ]
+    session.add_all([db_order, *db_items])
+    await session.flush() # Attribue les id sans terminer la transaction
+
+    # 6. Agrégats de ventes du jour, dans la même transaction
+    await record_order_sales(session, db_order)
     return db_order
 
 # --- Endpoint CLIENT ---
 @router.get("/me/", response_model=List[OrderRead])
-def read_my_orders(
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+async def read_my_orders(
+    response: Response,
+    session: AsyncSession = Depends(get_session),
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Récupère les commandes du client.
     Renvoie le modèle PUBLIC (OrderRead)
     """
-    statement = select(Order).where(Order.user_id == current_user.id)
-    orders = session.exec(statement).all()
-    return orders
+    statement = (
+        select(Order)
+        .where(Order.user_id == current_user.id)
+        .options(*ORDER_LOAD_OPTIONS)
+    )
+    orders = (await session.exec(statement)).all()
+    return json_response(dump_json(List[OrderRead], orders), response)
 
 # --- Endpoint ADMIN ---
 # ↓↓↓ MODIFIÉ ICI ↓↓↓
 @router.get("/", response_model=List[OrderReadAdmin]) 
-def read_all_orders(
-    session: Session = Depends(get_session),
-    admin_user: User = Depends(get_current_admin_user)
+async def read_all_orders(
+    response: Response,
+    status_filter: Optional[OrderStatus] = Query(None, alias="status"), # 422 si inconnu
+    user_id: Optional[int] = None,
+    page: PageParams = Depends(),
+    session: AsyncSession = Depends(get_session),
+    admin_user: CurrentUser = Depends(get_current_admin_user)
 ):
     """
     [ADMIN SEULEMENT]
-    Récupère TOUTES les commandes.
+    Récupère une page de commandes, filtrable par statut et par client.
+    L'en-tête X-Next-Cursor donne le curseur ('after') de la page suivante.
     Renvoie le modèle ADMIN (avec tous les détails)
+    Pour TOUT récupérer, utiliser /orders/export (flux, mémoire constante).
+    """
+    logger.info("Liste des commandes (admin)", extra={"user": admin_user.username})
+    statement = (
+        select(Order)
+        .where(*admin_order_filters(status_filter, user_id))
+        .options(*ORDER_ADMIN_LOAD_OPTIONS)
+    )
+    orders = (await session.exec(keyset(statement, Order.id, page))).all()
+    orders = finalize_page(orders, page, response)
+    return json_response(dump_json(List[OrderReadAdmin], orders), response)
+
+# --- Endpoint ADMIN ---
+@router.get("/export", response_class=StreamingResponse)
+async def export_orders(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    status_filter: Optional[OrderStatus] = Query(None, alias="status"), # 422 si inconnu
+    user_id: Optional[int] = None,
+    admin_user: CurrentUser = Depends(get_current_admin_user)
+):
+    """
+    [ADMIN SEULEMENT]
+    Exporte TOUTES les commandes (filtrables par statut et par client)
+    sous forme de flux :
+    - ndjson : une commande (modèle ADMIN) par ligne
+    - csv    : une ligne par article commandé
+    Les commandes sont lues par lots via un curseur côté serveur et envoyées
+    au fur et à mesure : la mémoire utilisée ne dépend pas du nombre de commandes.
+    """
+    logger.info(
+        "Export des commandes",
+        extra={"format": format, "user": admin_user.username},
+    )
+    statement = (
+        select(Order)
+        .where(*admin_order_filters(status_filter, user_id))
+        .options(*ORDER_ADMIN_LOAD_OPTIONS)
+        .order_by(Order.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    if format == "csv":
+        return StreamingResponse(
+            _export_csv(statement),
+            media_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="orders.csv"'},
+        )
+    return StreamingResponse(_export_ndjson(statement), media_type="application/x-ndjson")
+
+async def _stream_order_batches(statement):
     """
-    print(f"Action Admin par: {admin_user.username}")
-    statement = select(Order)
-    orders = session.exec(statement).all()
-    return orders
+    Parcourt la requête lot par lot. La session est ouverte ICI (et non via
+    Depends) car elle doit vivre aussi longtemps que le flux de réponse.
+    """
+    async with async_session_maker() as session:
+        result = await session.stream_scalars(statement)
+        # L'identity map ne garde que des références faibles : les objets
+        # d'un lot déjà envoyé sont libérés dès qu'on passe au suivant.
+        async for batch in result.partitions():
+            yield batch
+
+async def _export_ndjson(statement):
+    async for batch in _stream_order_batches(statement):
+        yield "".join(
+            OrderReadAdmin.model_validate(order).model_dump_json() + "\n"
+            for order in batch
+        )
+
+async def _export_csv(statement):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_CSV_COLUMNS)
+    async for batch in _stream_order_batches(statement):
+        for order in batch:
+            for item in order.items:
+                variant = item.variant
+                writer.writerow([
+                    order.id, order.status, order.user_id, order.user.username,
+                    item.id, item.variant_id, variant.product_id, variant.size,
+                    variant.color, variant.price, item.quantity,
+                    variant.alibaba_source_url, item.unit_price,
+                    order.created_at.isoformat(),
+                ])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
 
 # --- Endpoint ADMIN ---
 # ↓↓↓ MODIFIÉ ICI ↓↓↓
 @router.patch("/{order_id}", response_model=OrderReadAdmin)
-def update_order_status(
+async def update_order_status(
     order_id: int,
     order_update: OrderUpdate,
-    session: Session = Depends(get_session),
-    admin_user: User = Depends(get_current_admin_user)
+    session: AsyncSession = Depends(get_session),
+    admin_user: CurrentUser = Depends(get_current_admin_user)
 ):
     """
     [ADMIN SEULEMENT]
     Met à jour le statut d'une commande.
     Renvoie le modèle ADMIN (avec tous les détails)
     """
-    db_order = session.get(Order, order_id)
+    db_order = await session.get(Order, order_id, options=ORDER_ADMIN_LOAD_OPTIONS)
     if not db_order:
         raise HTTPException(status_code=404, detail="Commande non trouvée")
     
-    db_order.status = order_update.status
-    session.add(db_order)
-    session.commit()
-    session.refresh(db_order)
+    await set_order_status(session, [order_id], order_update.status)
+    await session.commit()
     
-    print(f"Commande {order_id} mise à jour par: {admin_user.username}")
+    logger.info(
+        "Statut de commande mis à jour",
+        extra={"order_id": order_id, "status": order_update.status, "user": admin_user.username},
+    )
     return db_order
\ No newline at end of file
@@ -1,18 +1,48 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+import logging
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response, status
 from typing import List
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import exists
+from sqlalchemy.orm import selectinload
 
 # Importer nos dépendances et modèles
 from database import get_session
+from replicas import get_read_session
 from models import (
     Product, 
     ProductCreate, 
     ProductRead, 
     ProductUpdate, 
-    User,
+    CurrentUser,
+    Variant,
+    ImportReport,
+    ProductSearchResult,
     ProductReadWithVariants # <-- LE MODÈLE LE PLUS IMPORTANT
 )
-from auth import get_current_user
+from auth import get_current_user, get_current_admin_user
+from catalog_import import import_catalog
+from filters import VariantFilters
+from pagination import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    NEXT_CURSOR_HEADER,
+    PageParams,
+    finalize_page,
+    keyset
+)
+from search import MAX_SEARCH_OFFSET, query_terms, search_catalog
+from cache import (
+    MISSING,
+    PRODUCT_LIST_PREFIX,
+    SEARCH_PREFIX,
+    catalog_cache,
+    invalidate_catalog,
+    invalidate_product,
+    not_modified,
+    product_key
+)
+from serialization import dump_json, json_response
 
 # 1. Créer le routeur
 router = APIRouter(
@@ -20,67 +50,212 @@ router = APIRouter(
     tags=["Produits (Concept)"]
 )
 
+logger = logging.getLogger(__name__)
+
 # --- Endpoint SÉCURISÉ (pour l'admin) ---
 # Renvoie le produit AVEC sa liste (vide) de variantes
 @router.post("/", response_model=ProductReadWithVariants, status_code=status.HTTP_201_CREATED) 
-def create_product(
+async def create_product(
     product: ProductCreate, 
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    session: AsyncSession = Depends(get_session),
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Crée un nouveau "Produit Concept" (ex: "Robe Courte").
     Il n'a ni prix, ni taille. Il sert de "conteneur" pour les variantes.
     """
-    print(f"Produit créé par : {current_user.username}")
-    
     db_product = Product.from_orm(product)
     session.add(db_product)
-    session.commit()
-    session.refresh(db_product)
+    await session.commit()
+    await session.refresh(db_product)
+    await invalidate_product(db_product.id)
+    logger.info(
+        "Produit créé",
+        extra={"product_id": db_product.id, "user": current_user.username},
+    )
     
     return db_product
 
-# --- Endpoint PUBLIC (Liste de tous les produits) ---
+# --- Endpoint ADMIN (import en masse) ---
+@router.post("/import", response_model=ImportReport)
+async def import_products(
+    request: Request,
+    session: AsyncSession = Depends(get_session),
+    admin_user: CurrentUser = Depends(get_current_admin_user)
+):
+    """
+    [ADMIN SEULEMENT]
+    Importe un flux fournisseur (produits + variantes) envoyé dans le corps
+    de la requête, lu en flux :
+    - Content-Type: text/csv -> CSV, une variante par ligne
+    - sinon -> JSON lines, un produit (avec ses variantes) par ligne
+    Les variantes sont créées ou mises à jour selon leur 'alibaba_source_url'.
+    Produits et variantes existants : seuls les champs fournis sont modifiés.
+    Renvoie le nombre de lignes traitées, les erreurs ligne par ligne et le débit.
+    """
+    content_type = request.headers.get("content-type", "")
+    fmt = "csv" if content_type.startswith("text/csv") else "jsonl"
+    report = await import_catalog(session, request.stream(), fmt)
+    if report.variants_upserted:
+        await invalidate_catalog()
+    logger.info(
+        "Import du catalogue terminé",
+        extra={
+            "format": fmt,
+            "user": admin_user.username,
+            "rows": report.rows_read,
+            "errors": len(report.errors),
+            "rows_per_second": report.rows_per_second,
+        },
+    )
+    return report
+
+# --- Endpoint PUBLIC (Liste des produits, paginée) ---
 # MODIFIÉ pour renvoyer la liste des produits AVEC leurs variantes
 @router.get("/", response_model=List[ProductReadWithVariants])
-def read_products(session: Session = Depends(get_session)):
+async def read_products(
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(),
+    filters: VariantFilters = Depends(),
+    session: AsyncSession = Depends(get_read_session)
+):
     """
-    Lit tous les produits AVEC leurs variantes.
+    Lit une page de produits AVEC leurs variantes.
     C'est ce que votre page d'accueil affichera.
+
+    - limit / after : pagination par curseur (l'en-tête X-Next-Cursor
+      donne la valeur de 'after' pour la page suivante)
+    - size, color, min_price, max_price : ne garde que les produits ayant
+      au moins une variante correspondante (et seulement ces variantes)
     """
+    # 304 si le client a déjà cette version du catalogue
+    unchanged = not_modified(request, response)
+    if unchanged is not None:
+        return unchanged
+
+    # Le cache stocke la page déjà encodée en JSON + son curseur suivant
+    cache_key = PRODUCT_LIST_PREFIX + page.cache_key() + ":" + filters.cache_key()
+    cached = catalog_cache.get(cache_key)
+    if cached is not MISSING:
+        body, next_cursor = cached
+        if next_cursor is not None:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        return json_response(body, response)
+    generation = catalog_cache.generation
+
+    variant_clauses = filters.clauses()
+    variants_loader = Product.variants
     statement = select(Product)
-    products = session.exec(statement).all()
-    return products
+    if variant_clauses:
+        statement = statement.where(
+            exists().where(Variant.product_id == Product.id, *variant_clauses)
+        )
+        variants_loader = Product.variants.and_(*variant_clauses)
+
+    # selectinload : 2 requêtes au total (produits + toutes leurs variantes),
+    # quel que soit le nombre de produits (pas de N+1).
+    statement = keyset(
+        statement.options(selectinload(variants_loader)), Product.id, page
+    )
+    products = (await session.exec(statement)).all()
+    products = finalize_page(products, page, response)
+
+    body = dump_json(List[ProductReadWithVariants], products)
+    catalog_cache.set(
+        cache_key, (body, response.headers.get(NEXT_CURSOR_HEADER)), generation
+    )
+    return json_response(body, response)
+
+# --- Endpoint PUBLIC (Recherche) ---
+# Déclaré AVANT /{product_id} : sinon "search" serait lu comme un id.
+@router.get("/search", response_model=ProductSearchResult)
+async def search_products(
+    request: Request,
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0, le=MAX_SEARCH_OFFSET),
+    filters: VariantFilters = Depends(),
+    session: AsyncSession = Depends(get_read_session)
+):
+    """
+    Recherche plein texte dans le nom et la description des produits.
+
+    - q : mots recherchés ; tous doivent apparaître, en début de mot
+      ("rob ete" trouve "Robe d'été")
+    - limit / offset : page de résultats, triés par pertinence
+    - size, color, min_price, max_price : mêmes filtres que GET /products/
+    Renvoie aussi le nombre total de résultats et les facettes
+    (nombre de produits par taille et par couleur).
+    """
+    unchanged = not_modified(request, response)
+    if unchanged is not None:
+        return unchanged
+
+    terms = query_terms(q)
+    cache_key = (
+        SEARCH_PREFIX + " ".join(terms)
+        + f":{limit}:{offset}:" + filters.cache_key()
+    )
+    cached = catalog_cache.get(cache_key)
+    if cached is not MISSING:
+        return json_response(cached, response)
+    generation = catalog_cache.generation
+
+    products, total, facets = await search_catalog(
+        session, terms, filters, limit, offset
+    )
+    body = dump_json(
+        ProductSearchResult, {"items": products, "total": total, "facets": facets}
+    )
+    catalog_cache.set(cache_key, body, generation)
+    return json_response(body, response)
 
 # --- Endpoint PUBLIC (Un seul produit) ---
 # MODIFIÉ pour renvoyer UN produit AVEC ses variantes
 @router.get("/{product_id}", response_model=ProductReadWithVariants)
-def read_product(product_id: int, session: Session = Depends(get_session)):
+async def read_product(
+    product_id: int,
+    request: Request,
+    response: Response,
+    session: AsyncSession = Depends(get_read_session)
+):
     """
     Lit un produit spécifique AVEC ses variantes.
     C'est ce que votre page de détail produit affichera.
     """
-    # session.get() est intelligent et récupérera le produit
-    # ET ses variantes associées grâce au "Relationship"
-    db_product = session.get(Product, product_id)
+    unchanged = not_modified(request, response)
+    if unchanged is not None:
+        return unchanged
+
+    cached = catalog_cache.get(product_key(product_id))
+    if cached is not MISSING:
+        return json_response(cached, response)
+    generation = catalog_cache.generation
+
+    # session.get() récupère le produit, puis ses variantes en une
+    # seule requête supplémentaire (relation configurée en "selectin")
+    db_product = await session.get(Product, product_id)
     if not db_product:
         raise HTTPException(status_code=404, detail="Produit non trouvé")
-    
-    return db_product
+
+    body = dump_json(ProductReadWithVariants, db_product)
+    catalog_cache.set(product_key(product_id), body, generation)
+    return json_response(body, response)
 
 # --- Endpoints SÉCURISÉS (Update / Delete) ---
 # (Ces endpoints peuvent renvoyer le ProductRead simple)
 
 @router.patch("/{product_id}", response_model=ProductRead)
-def update_product(
+async def update_product(
     product_id: int, 
     product_update: ProductUpdate, 
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    session: AsyncSession = Depends(get_session),
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """ Met à jour les infos de base d'un produit (nom, description...). """
-    db_product = session.get(Product, product_id)
+    db_product = await session.get(Product, product_id)
     if not db_product:
         raise HTTPException(status_code=404, detail="Produit non trouvé")
 
@@ -89,22 +264,24 @@ def update_product(
         setattr(db_product, key, value) 
 
     session.add(db_product)
-    session.commit()
-    session.refresh(db_product)
+    await session.commit()
+    await session.refresh(db_product)
+    await invalidate_product(product_id)
     return db_product
 
 
 @router.delete("/{product_id}", response_model=ProductRead)
-def delete_product(
+async def delete_product(
     product_id: int, 
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    session: AsyncSession = Depends(get_session),
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """ Supprime un produit. """
-    db_product = session.get(Product, product_id)
+    db_product = await session.get(Product, product_id)
     if not db_product:
         raise HTTPException(status_code=404, detail="Produit non trouvé")
 
-    session.delete(db_product)
-    session.commit()
+    await session.delete(db_product)
+    await session.commit()
+    await invalidate_product(product_id)
     return db_product
\ No newline at end of file
@@ -1,8 +1,10 @@
 from fastapi import APIRouter, HTTPException, Depends, status
-from sqlmodel import Session, select # <-- AJOUTEZ "select"
+from sqlmodel import select # <-- AJOUTEZ "select"
+from sqlmodel.ext.asyncio.session import AsyncSession
 from models import User, UserCreate, UserRead
 from database import get_session
-from auth import get_password_hash, get_user
+from auth import get_user
+from hashing import get_password_hash_async
 
 router = APIRouter(
     prefix="/users",
@@ -10,25 +12,26 @@ router = APIRouter(
 )
 
 @router.post("/", response_model=UserRead, status_code=status.HTTP_201_CREATED)
-def create_user(user: UserCreate, session: Session = Depends(get_session)):
+async def create_user(user: UserCreate, session: AsyncSession = Depends(get_session)):
     """
     Crée un nouvel utilisateur (inscription).
     Le TOUT PREMIER utilisateur (ID 1) sera admin.
     """
     # ... (la vérification 'if db_user:' ne change pas)
-    db_user = get_user(session, user.username)
+    db_user = await get_user(session, user.username)
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Ce nom d'utilisateur est déjà pris"
         )
     
-    hashed_password = get_password_hash(user.password)
+    # bcrypt tourne dans le pool de processus dédié (429 s'il est saturé)
+    hashed_password = await get_password_hash_async(user.password)
     
     # --- ↓↓↓ LOGIQUE ADMIN AJOUTÉE ↓↓↓ ---
     # On vérifie si c'est le tout premier utilisateur
     statement = select(User)
-    first_user = session.exec(statement).first()
+    first_user = (await session.exec(statement)).first()
     is_first_user = first_user is None
     # --- ↑↑↑ FIN LOGIQUE ADMIN ↑↑↑ ---
 
@@ -41,7 +44,7 @@ def create_user(user: UserCreate, session: Session = Depends(get_session)):
     )
     
     session.add(db_user)
-    session.commit()
-    session.refresh(db_user)
+    await session.commit()
+    await session.refresh(db_user)
     
     return db_user
\ No newline at end of file
@@ -1,17 +1,38 @@
-from fastapi import APIRouter, HTTPException, Depends, status
-from typing import List
-from sqlmodel import Session, select
+from fastapi import APIRouter, HTTPException, Depends, Request, Response, status
+from typing import List, Optional
+import logging
+import time
+from sqlmodel import select
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 # Importer nos dépendances et modèles
 from database import get_session
+from replicas import get_read_session
 from models import (
-    User,
+    CurrentUser,
     Variant,
     VariantCreate,
     VariantRead,
+    VariantBulkUpdate,
+    VariantBulkUpdateReport,
+    VariantChange,
     Product # On a besoin de Product pour vérifier que le produit existe
 )
-from auth import get_current_user
+from auth import get_current_user, get_current_admin_user
+from filters import VariantFilters
+from pagination import PageParams, keyset, finalize_page, NEXT_CURSOR_HEADER
+from cache import (
+    MISSING,
+    VARIANT_LIST_PREFIX,
+    catalog_cache,
+    invalidate_variant,
+    invalidate_variants,
+    not_modified,
+    variant_key
+)
+from serialization import dump_json, json_response
 
 # 1. Créer le routeur
 router = APIRouter(
@@ -19,12 +40,14 @@ router = APIRouter(
     tags=["Variantes (Taille, Couleur, Prix)"] # Étiquette pour les /docs
 )
 
+logger = logging.getLogger(__name__)
+
 # --- Endpoint SÉCURISÉ (pour l'admin) ---
 @router.post("/", response_model=VariantRead, status_code=status.HTTP_201_CREATED)
-def create_variant(
+async def create_variant(
     variant: VariantCreate,
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    session: AsyncSession = Depends(get_session),
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Ajoute une nouvelle variante (ex: Taille S, Couleur Kaki, 25.99€)
@@ -34,7 +57,7 @@ def create_variant(
     """
     
     # Étape 1: Vérifier que le produit parent (ex: ID 1) existe
-    product = session.get(Product, variant.product_id)
+    product = await session.get(Product, variant.product_id)
     if not product:
         raise HTTPException(
             status_code=404, 
@@ -47,19 +70,205 @@ def create_variant(
     db_variant = Variant.from_orm(variant)
     
     session.add(db_variant)
-    session.commit()
-    session.refresh(db_variant)
+    try:
+        await session.commit()
+    except IntegrityError:
+        # Le lien Alibaba identifie la variante (unique, voir models.py)
+        await session.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=(
+                f"Une variante utilise déjà le lien {variant.alibaba_source_url!r} : "
+                "chaque variante a son propre lien fournisseur (lien de la déclinaison)."
+            ),
+        )
+    await session.refresh(db_variant)
+    await invalidate_variant(db_variant.id, db_variant.product_id)
     
-    print(f"Variante créée par: {current_user.username}")
+    logger.info(
+        "Variante créée",
+        extra={"variant_id": db_variant.id, "user": current_user.username},
+    )
     return db_variant
 
+# Nombre maximal de clés par requête "IN (...)" (limite de paramètres SQL)
+BULK_LOOKUP_BATCH = 5000
+
+# --- Endpoint ADMIN (synchronisation stock / prix) ---
+@router.post("/bulk-update", response_model=VariantBulkUpdateReport)
+async def bulk_update_variants(
+    payload: VariantBulkUpdate,
+    session: AsyncSession = Depends(get_session),
+    admin_user: CurrentUser = Depends(get_current_admin_user)
+):
+    """
+    [ADMIN SEULEMENT]
+    Applique en UNE transaction des milliers de mises à jour de stock et/ou
+    de prix, chaque variante étant désignée par son id ou son lien Alibaba.
+    - dry_run=true : renvoie les différences (ancien -> nouveau) sans rien écrire
+    - sinon : les variantes concernées sont verrouillées, puis modifiées par un
+      seul UPDATE groupé (executemany par clé primaire)
+    Seules les variantes réellement modifiées sont écrites.
+    """
+    started = time.perf_counter()
+
+    # 1. Une seule consigne par variante (la dernière l'emporte)
+    by_id = {}
+    by_url = {}
+    for item in payload.items:
+        if item.variant_id is not None:
+            by_id[item.variant_id] = item
+        else:
+            by_url[item.alibaba_source_url] = item
+
+    # 2. Liens Alibaba -> id, par un SELECT simple (sans verrou)
+    url_ids = {}
+    for urls in _batches(list(by_url), BULK_LOOKUP_BATCH):
+        url_ids.update((await session.execute(
+            select(Variant.alibaba_source_url, Variant.id)
+            .where(Variant.alibaba_source_url.in_(urls))
+        )).all())
+    # Consigne de chaque variante (celle donnée par id l'emporte sur le lien)
+    items = {variant_id: by_url[url] for url, variant_id in url_ids.items()}
+    items.update(by_id)
+
+    # 3. Lecture (et verrouillage) des variantes, en UNE passe triée par id :
+    #    les paquets se suivent dans l'ordre croissant des id : toute la
+    #    synchronisation verrouille dans le même ordre que les commandes
+    #    (routers/orders.py), sans risque d'interblocage avec elles.
+    variants = {}
+    for ids in _batches(sorted(items), BULK_LOOKUP_BATCH):
+        statement = select(Variant).where(Variant.id.in_(ids)).order_by(Variant.id)
+        if not payload.dry_run:
+            statement = statement.with_for_update()
+        for variant in (await session.exec(statement)).all():
+            variants[variant.id] = variant
+
+    # 4. Calcul des différences
+    changes = []
+    rows = []
+    for variant in variants.values():
+        item = items[variant.id]
+        new_stock = (
+            item.stock_quantity if item.stock_quantity is not None
+            else variant.stock_quantity
+        )
+        new_price = item.price if item.price is not None else variant.price
+        if new_stock == variant.stock_quantity and new_price == variant.price:
+            continue
+        changes.append(VariantChange(
+            variant_id=variant.id,
+            alibaba_source_url=variant.alibaba_source_url,
+            old_stock_quantity=variant.stock_quantity,
+            new_stock_quantity=new_stock,
+            old_price=variant.price,
+            new_price=new_price,
+        ))
+        rows.append({"id": variant.id, "stock_quantity": new_stock, "price": new_price})
+
+    not_found = [str(variant_id) for variant_id in by_id if variant_id not in variants]
+    not_found += [url for url in by_url if url_ids.get(url) not in variants]
+
+    # 5. Écriture : un UPDATE groupé, un commit
+    if payload.dry_run:
+        await session.rollback()
+    else:
+        if rows:
+            await session.execute(update(Variant), rows)
+        await session.commit()
+        # Le stock n'est pas public : seul un changement de prix invalide le cache
+        repriced = [
+            (change.variant_id, variants[change.variant_id].product_id)
+            for change in changes if change.old_price != change.new_price
+        ]
+        if repriced:
+            await invalidate_variants(repriced)
+        logger.info(
+            "Synchronisation du stock et des prix",
+            extra={"changed": len(rows), "user": admin_user.username},
+        )
+
+    return VariantBulkUpdateReport(
+        dry_run=payload.dry_run,
+        received=len(payload.items),
+        matched=len(variants),
+        changed=len(changes),
+        not_found=not_found,
+        changes=changes,
+        elapsed_seconds=round(time.perf_counter() - started, 3),
+    )
+
+def _batches(values: list, size: int):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+# --- Endpoint PUBLIC (liste des variantes, paginée) ---
+@router.get("/", response_model=List[VariantRead])
+async def read_variants(
+    request: Request,
+    response: Response,
+    product_id: Optional[int] = None,
+    page: PageParams = Depends(),
+    filters: VariantFilters = Depends(),
+    session: AsyncSession = Depends(get_read_session)
+):
+    """
+    Lit une page de variantes, filtrable par produit, taille,
+    couleur et fourchette de prix.
+    L'en-tête X-Next-Cursor donne le curseur de la page suivante.
+    """
+    unchanged = not_modified(request, response)
+    if unchanged is not None:
+        return unchanged
+
+    cache_key = (
+        VARIANT_LIST_PREFIX
+        + f"{product_id}:" + page.cache_key() + ":" + filters.cache_key()
+    )
+    cached = catalog_cache.get(cache_key)
+    if cached is not MISSING:
+        body, next_cursor = cached
+        if next_cursor is not None:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        return json_response(body, response)
+    generation = catalog_cache.generation
+
+    statement = select(Variant).where(*filters.clauses())
+    if product_id is not None:
+        statement = statement.where(Variant.product_id == product_id)
+    variants = (await session.exec(keyset(statement, Variant.id, page))).all()
+    variants = finalize_page(variants, page, response)
+
+    body = dump_json(List[VariantRead], variants)
+    catalog_cache.set(
+        cache_key, (body, response.headers.get(NEXT_CURSOR_HEADER)), generation
+    )
+    return json_response(body, response)
+
 # --- Endpoint PUBLIC (pour voir une variante spécifique) ---
 @router.get("/{variant_id}", response_model=VariantRead)
-def read_variant(variant_id: int, session: Session = Depends(get_session)):
+async def read_variant(
+    variant_id: int,
+    request: Request,
+    response: Response,
+    session: AsyncSession = Depends(get_read_session)
+):
     """
     Lit les détails d'une variante spécifique par son ID.
     """
-    db_variant = session.get(Variant, variant_id)
+    unchanged = not_modified(request, response)
+    if unchanged is not None:
+        return unchanged
+
+    cached = catalog_cache.get(variant_key(variant_id))
+    if cached is not MISSING:
+        return json_response(cached, response)
+    generation = catalog_cache.generation
+
+    db_variant = await session.get(Variant, variant_id)
     if not db_variant:
         raise HTTPException(status_code=404, detail="Variante non trouvée")
-    return db_variant
\ No newline at end of file
+
+    body = dump_json(VariantRead, db_variant)
+    catalog_cache.set(variant_key(variant_id), body, generation)
+    return json_response(body, response)
\ No newline at end of file
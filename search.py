@@ -0,0 +1,302 @@
+import math
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import distinct, exists, func, text
+from sqlalchemy.orm import selectinload
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from bus import bus
+from cache import CATALOG_TOPIC
+from database import engine
+from filters import VariantFilters
+from models import SEARCH_CONFIG, Product, Variant, product_search_document
+
+# --- Recherche plein texte dans le catalogue ---
+# - PostgreSQL : tsvector (nom + description) et index GIN, classement
+#   par ts_rank ; tout est calculé par la base.
+# - Autres bases (SQLite, en développement et dans les tests) : un index
+#   inversé en mémoire, construit à la première recherche et reconstruit
+#   après chaque changement du catalogue (messages du bus).
+#
+# Les deux moteurs suivent les mêmes règles :
+# - les mots sont mis en minuscules et sans accents ("ete" trouve "été"),
+#   sans racinisation (config 'simple') ;
+# - chaque mot de la recherche doit apparaître (ET), en préfixe :
+#   "rob" trouve "robe" ; un mot d'une seule lettre doit être exact ;
+# - les filtres (taille, couleur, prix) gardent les produits ayant au moins
+#   une variante correspondante, comme GET /products/ ;
+# - facettes = nombre de produits trouvés par taille / par couleur.
+
+MAX_QUERY_TERMS = 8
+MAX_SEARCH_OFFSET = 1000 # au-delà, il faut affiner la recherche
+MIN_PREFIX_LENGTH = 2
+
+# Poids du nom et de la description (poids A et B par défaut de ts_rank)
+NAME_WEIGHT = 1.0
+DESCRIPTION_WEIGHT = 0.4
+
+# Même découpage que le parseur 'simple' de PostgreSQL : lettres et chiffres
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+
+def fold_accents(value: str) -> str:
+    """Retire les accents (décomposition NFKD), comme catalog_unaccent() en PostgreSQL."""
+    return "".join(
+        char for char in unicodedata.normalize("NFKD", value) if not unicodedata.combining(char)
+    )
+
+
+def tokenize(value: Optional[str]) -> List[str]:
+    return _TOKEN_RE.findall(fold_accents(value.lower())) if value else []
+
+
+def query_terms(q: str) -> List[str]:
+    """Mots de la recherche, sans doublons (l'ordre est conservé)."""
+    return list(dict.fromkeys(tokenize(q)))[:MAX_QUERY_TERMS]
+
+
+def _empty_facets() -> Dict[str, Dict[str, int]]:
+    return {"size": {}, "color": {}}
+
+
+# --- PostgreSQL ---
+
+def _tsquery(terms: List[str]) -> str:
+    # Les mots ne contiennent que des lettres et des chiffres (tokenize) :
+    # aucun opérateur tsquery ne peut être injecté.
+    return " & ".join(
+        f"{term}:*" if len(term) >= MIN_PREFIX_LENGTH else term for term in terms
+    )
+
+
+async def _search_postgresql(
+    session: AsyncSession,
+    terms: List[str],
+    clauses: List,
+    limit: int,
+    offset: int,
+) -> Tuple[List[int], int, Dict[str, Dict[str, int]]]:
+    document = product_search_document() # même expression que l'index GIN
+    query = func.to_tsquery(text(f"'{SEARCH_CONFIG}'"), _tsquery(terms))
+    matched = select(Product.id).where(document.bool_op("@@")(query))
+    if clauses:
+        matched = matched.where(
+            exists().where(Variant.product_id == Product.id, *clauses)
+        )
+
+    rank = func.ts_rank(document, query).label("rank")
+    ranked = (
+        matched.add_columns(rank)
+        .order_by(rank.desc(), Product.id)
+        .limit(limit)
+        .offset(offset)
+    )
+    # execute() et non exec() : exec() ne garderait que la première colonne
+    ids = [row[0] for row in (await session.execute(ranked)).all()]
+
+    total = (await session.exec(
+        select(func.count()).select_from(matched.subquery())
+    )).one()
+
+    facets = _empty_facets()
+    for name, column in (("size", Variant.size), ("color", Variant.color)):
+        rows = (await session.exec(
+            select(column, func.count(distinct(Variant.product_id)))
+            .where(Variant.product_id.in_(matched), *clauses)
+            .group_by(column)
+        )).all()
+        facets[name] = {value: count for value, count in rows}
+    return ids, total, facets
+
+
+# --- Index inversé en mémoire (repli pour SQLite) ---
+
+class SearchIndex:
+    """
+    Index inversé : mot -> {product_id: score}. Le vocabulaire est gardé trié
+    pour trouver tous les mots commençant par un préfixe par dichotomie.
+
+    Reconstruit entièrement (et paresseusement) quand le catalogue change :
+    'generation' est incrémenté par le bus, et une recherche qui trouve
+    l'index périmé le reconstruit avant de répondre.
+    """
+
+    def __init__(self):
+        self.generation = 0
+        self.builds = 0
+        self.build_seconds = 0.0
+        self._built_generation = -1
+        # (mot -> {product_id: score}, vocabulaire trié,
+        #  product_id -> [(taille, couleur, prix)], nombre de produits)
+        self._snapshot: Tuple[Dict, List[str], Dict, int] = ({}, [], {}, 0)
+        self._build_lock = threading.Lock()
+
+    def invalidate(self) -> None:
+        self.generation += 1
+
+    def ensure_fresh(self) -> None:
+        """Reconstruit l'index s'il est périmé (bloquant : à lancer dans un thread)."""
+        with self._build_lock:
+            generation = self.generation
+            if self._built_generation == generation:
+                return
+            started = time.perf_counter()
+            self._build()
+            # Si le catalogue a encore changé pendant la construction,
+            # la prochaine recherche reconstruira l'index.
+            self._built_generation = generation
+            self.builds += 1
+            self.build_seconds = round(time.perf_counter() - started, 3)
+
+    def _build(self) -> None:
+        with Session(engine) as session:
+            products = session.exec(
+                select(Product.id, Product.name, Product.description)
+            ).all()
+            variants = session.exec(
+                select(Variant.product_id, Variant.size, Variant.color, Variant.price)
+            ).all()
+
+        postings: Dict[str, Dict[int, float]] = {}
+        for product_id, name, description in products:
+            for weight, value in ((NAME_WEIGHT, name), (DESCRIPTION_WEIGHT, description)):
+                for token in tokenize(value):
+                    entry = postings.setdefault(token, {})
+                    entry[product_id] = entry.get(product_id, 0.0) + weight
+
+        by_product: Dict[int, List[Tuple[str, str, float]]] = {}
+        for product_id, size, color, price in variants:
+            by_product.setdefault(product_id, []).append((size, color, price))
+
+        # Remplacement d'un bloc : les recherches en cours gardent l'ancien index
+        self._snapshot = (postings, sorted(postings), by_product, len(products))
+
+    @staticmethod
+    def _expand(postings: Dict, vocabulary: List[str], term: str) -> List[str]:
+        if len(term) < MIN_PREFIX_LENGTH:
+            return [term] if term in postings else []
+        words = []
+        position = bisect_left(vocabulary, term)
+        while position < len(vocabulary) and vocabulary[position].startswith(term):
+            words.append(vocabulary[position])
+            position += 1
+        return words
+
+    def search(
+        self,
+        terms: List[str],
+        filters: VariantFilters,
+        limit: int,
+        offset: int,
+    ) -> Tuple[List[int], int, Dict[str, Dict[str, int]]]:
+        self.ensure_fresh()
+        postings, vocabulary, variants, documents = self._snapshot
+
+        # Score = somme, pour chaque mot recherché, de (poids des occurrences
+        # x rareté du mot : un mot présent partout compte peu)
+        scores: Optional[Dict[int, float]] = None
+        for term in terms:
+            term_scores: Dict[int, float] = {}
+            for word in self._expand(postings, vocabulary, term):
+                for product_id, weight in postings[word].items():
+                    term_scores[product_id] = term_scores.get(product_id, 0.0) + weight
+            if term_scores:
+                rarity = math.log(1 + documents / len(term_scores))
+                term_scores = {pid: weight * rarity for pid, weight in term_scores.items()}
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {
+                    product_id: score + term_scores[product_id]
+                    for product_id, score in scores.items()
+                    if product_id in term_scores
+                }
+            if not scores:
+                return [], 0, _empty_facets()
+
+        filtered = bool(filters.clauses())
+        facets = _empty_facets()
+        matched: Dict[int, float] = {}
+        for product_id, score in scores.items():
+            sizes, colors = set(), set()
+            for size, color, price in variants.get(product_id, ()):
+                if filters.matches(size, color, price):
+                    sizes.add(size)
+                    colors.add(color)
+            if filtered and not sizes:
+                continue # aucune variante ne correspond aux filtres
+            matched[product_id] = score
+            for size in sizes:
+                facets["size"][size] = facets["size"].get(size, 0) + 1
+            for color in colors:
+                facets["color"][color] = facets["color"].get(color, 0) + 1
+
+        ranked = sorted(matched.items(), key=lambda item: (-item[1], item[0]))
+        ids = [product_id for product_id, _ in ranked[offset:offset + limit]]
+        return ids, len(ranked), facets
+
+    def stats(self) -> Dict[str, Any]:
+        _, vocabulary, _, documents = self._snapshot
+        return {
+            "terms": len(vocabulary),
+            "products": documents,
+            "builds": self.builds,
+            "last_build_seconds": self.build_seconds,
+            "fresh": self._built_generation == self.generation,
+        }
+
+
+search_index = SearchIndex()
+
+
+def _on_catalog_message(data: Optional[Dict[str, Any]]) -> None:
+    # Tout changement du catalogue (ou message perdu) périme l'index
+    search_index.invalidate()
+
+
+bus.subscribe(CATALOG_TOPIC, _on_catalog_message)
+
+
+# --- Point d'entrée ---
+
+async def search_catalog(
+    session: AsyncSession,
+    terms: List[str],
+    filters: VariantFilters,
+    limit: int,
+    offset: int,
+) -> Tuple[List[Product], int, Dict[str, Dict[str, int]]]:
+    """
+    Renvoie (page de produits triés par pertinence, nombre total de
+    résultats, facettes). Les produits sont chargés avec leurs variantes
+    (seulement celles qui correspondent aux filtres, s'il y en a).
+    """
+    if not terms:
+        return [], 0, _empty_facets()
+
+    clauses = filters.clauses()
+    if session.bind.dialect.name == "postgresql":
+        ids, total, facets = await _search_postgresql(session, terms, clauses, limit, offset)
+    else:
+        ids, total, facets = await run_in_threadpool(
+            search_index.search, terms, filters, limit, offset
+        )
+    if not ids:
+        return [], total, facets
+
+    variants_loader = Product.variants.and_(*clauses) if clauses else Product.variants
+    products = (await session.exec(
+        select(Product)
+        .where(Product.id.in_(ids))
+        .options(selectinload(variants_loader))
+    )).all()
+    # On remet les produits dans l'ordre du classement
+    by_id = {product.id: product for product in products}
+    return [by_id[i] for i in ids if i in by_id], total, facets
@@ -0,0 +1,65 @@
+from functools import lru_cache
+from typing import Any
+
+import orjson
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+# --- Sérialisation rapide des réponses ---
+# Avec response_model, FastAPI revalide ce que renvoie l'endpoint, le
+# convertit en dict "JSON" (dump_python), puis l'encode avec le module json
+# de la bibliothèque standard : sur une page de catalogue ou de commandes,
+# c'est l'essentiel du temps CPU de la requête.
+#
+# Ici, les objets ORM sont validés et encodés en JSON en UNE passe, par
+# pydantic-core (TypeAdapter précompilé par type, mis en cache), directement
+# en bytes. L'endpoint renvoie ces bytes dans une Response : FastAPI ne les
+# revalide pas. Le response_model du décorateur reste la documentation
+# (OpenAPI) de la réponse.
+
+
+@lru_cache(maxsize=None)
+def adapter(type_: Any) -> TypeAdapter:
+    """TypeAdapter de ce type (List[...] compris), construit une seule fois."""
+    return TypeAdapter(type_)
+
+
+def dump_json(type_: Any, value: Any) -> bytes:
+    """
+    Valide 'value' (objets ORM, modèles ou dicts) selon 'type_' et
+    renvoie le JSON encodé, en une passe.
+    """
+    type_adapter = adapter(type_)
+    return type_adapter.dump_json(
+        type_adapter.validate_python(value, from_attributes=True)
+    )
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    Réponse JSON : les bytes déjà encodés (dump_json, cache) sont envoyés
+    tels quels, le reste est encodé avec orjson au lieu du module json.
+    Classe de réponse par défaut de l'application (voir main.py) ; elle
+    hérite de JSONResponse pour que /docs décrive toujours le response_model.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def json_response(body: bytes, response: Response, status_code: int = 200) -> FastJSONResponse:
+    """
+    Réponse construite à partir du JSON déjà encodé.
+
+    Quand l'endpoint renvoie lui-même une Response, FastAPI ignore les
+    en-têtes posés sur le paramètre 'response' (ETag, X-Next-Cursor...) :
+    on les recopie ici.
+    """
+    result = FastJSONResponse(body, status_code=status_code)
+    for name, value in response.headers.items():
+        if name != "content-length":
+            result.headers[name] = value
+    return result
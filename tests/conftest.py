@@ -0,0 +1,49 @@
+import os
+import tempfile
+
+import pytest
+
+# La configuration est lue à l'import des modules de l'application :
+# elle doit être en place AVANT le premier import (voir bench/run.py).
+_DB_DIR = tempfile.mkdtemp(prefix="api-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_DB_DIR, 'test.db')}"
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+os.environ.setdefault("CACHE_BUS", "local")
+os.environ["CATALOG_CACHE_TTL"] = "0" # mesure la base, pas le cache
+os.environ.setdefault("BCRYPT_ROUNDS", "4") # coût minimal : tests rapides
+
+
+@pytest.fixture(scope="session")
+def dataset():
+    """Petit jeu de données du banc de performance (déterministe)."""
+    from migrate import run_migrations
+    from bench import seed
+
+    run_migrations()
+    sizes = seed.seed(products=60, users=5, orders=60)
+    return {"sizes": sizes, "users": seed.bench_users(limit=5)}
+
+
+@pytest.fixture(scope="session")
+def client(dataset):
+    from fastapi.testclient import TestClient
+    from main import app
+
+    with TestClient(app) as client:
+        yield client
+
+
+def _headers(user) -> dict:
+    from auth import create_token_pair
+
+    return {"Authorization": f"Bearer {create_token_pair(user)['access_token']}"}
+
+
+@pytest.fixture(scope="session")
+def admin_headers(dataset):
+    return _headers(dataset["users"][0])
+
+
+@pytest.fixture(scope="session")
+def customer_headers(dataset):
+    return _headers(dataset["users"][1])
@@ -0,0 +1,51 @@
+from sqlmodel import Session
+
+from database import engine
+from models import Variant
+
+
+def variants(*ids):
+    with Session(engine) as session:
+        return [session.get(Variant, variant_id) for variant_id in ids]
+
+
+def stock_and_prices(*ids):
+    return [(variant.stock_quantity, variant.price) for variant in variants(*ids)]
+
+
+def bulk_update(client, headers, items, dry_run):
+    response = client.post(
+        "/variants/bulk-update",
+        json={"items": items, "dry_run": dry_run},
+        headers=headers,
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_dry_run_reports_changes_without_writing(client, admin_headers):
+    by_id, by_url = variants(5, 6)
+    items = [
+        {"variant_id": by_id.id, "stock_quantity": by_id.stock_quantity + 10},
+        {"alibaba_source_url": by_url.alibaba_source_url, "price": by_url.price + 1},
+        {"variant_id": by_url.id, "price": by_url.price + 1}, # même variante
+        {"alibaba_source_url": "https://example.com/inconnue", "stock_quantity": 1},
+    ]
+
+    report = bulk_update(client, admin_headers, items, dry_run=True)
+    assert report["dry_run"] is True
+    assert (report["received"], report["matched"], report["changed"]) == (4, 2, 2)
+    assert report["not_found"] == ["https://example.com/inconnue"]
+    changes = {change["variant_id"]: change for change in report["changes"]}
+    assert changes[by_id.id]["new_stock_quantity"] == by_id.stock_quantity + 10
+    assert changes[by_url.id]["new_price"] == by_url.price + 1
+    # Rien n'a été écrit
+    assert stock_and_prices(5, 6) == [
+        (by_id.stock_quantity, by_id.price), (by_url.stock_quantity, by_url.price)
+    ]
+
+    report = bulk_update(client, admin_headers, items, dry_run=False)
+    assert report["changed"] == 2
+    assert stock_and_prices(5, 6) == [
+        (by_id.stock_quantity + 10, by_id.price), (by_url.stock_quantity, by_url.price + 1)
+    ]
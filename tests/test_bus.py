@@ -0,0 +1,41 @@
+import threading
+
+from bus import FileBus
+from cache import CATALOG_TOPIC, MISSING, _on_catalog_message, catalog_cache
+
+
+def test_file_bus_delivers_to_another_worker(tmp_path, monkeypatch):
+    monkeypatch.setattr(catalog_cache, "ttl", 60) # désactivé dans les tests
+    path = str(tmp_path / "bus.log")
+    # Deux "workers" : deux bus sur le même journal
+    publisher, listener = FileBus(path, poll_interval=0.01), FileBus(path, poll_interval=0.01)
+    received = []
+    delivered = threading.Event()
+    listener.subscribe(CATALOG_TOPIC, _on_catalog_message)
+    listener.subscribe(CATALOG_TOPIC, lambda data: (received.append(data), delivered.set()))
+
+    catalog_cache.set("products:list:50:None", b"[]")
+    catalog_cache.set("products:detail:1", b"{}")
+    listener.start()
+    try:
+        publisher.publish(CATALOG_TOPIC, {"keys": ["products:detail:1"], "prefixes": []})
+        assert delivered.wait(timeout=5)
+    finally:
+        listener.stop()
+
+    assert received == [{"keys": ["products:detail:1"], "prefixes": []}]
+    assert catalog_cache.get("products:detail:1") is MISSING
+    assert catalog_cache.get("products:list:50:None") == b"[]" # pas concernée
+
+    publisher.publish(CATALOG_TOPIC, {"clear": True, "keys": [], "prefixes": []})
+    listener.poll()
+    assert catalog_cache.stats()["size"] == 0
+
+
+def test_file_bus_ignores_its_own_messages(tmp_path):
+    bus = FileBus(str(tmp_path / "bus.log"))
+    received = []
+    bus.subscribe(CATALOG_TOPIC, received.append)
+    bus.publish(CATALOG_TOPIC, {"clear": True})
+    bus.poll() # relit le journal : message déjà livré par publish()
+    assert received == [{"clear": True}]
@@ -0,0 +1,86 @@
+from sqlalchemy import text
+from sqlmodel import Session, select
+
+import catalog_import
+from database import engine
+from models import Product, Variant
+
+CSV_HEADER = "product_name,description,size,color,price,alibaba_source_url,stock_quantity\n"
+
+
+def import_csv(client, headers, body: str):
+    response = client.post(
+        "/products/import",
+        content=body.encode(),
+        headers={**headers, "Content-Type": "text/csv"},
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def variant(url: str) -> Variant:
+    with Session(engine) as session:
+        return session.exec(select(Variant).where(Variant.alibaba_source_url == url)).one()
+
+
+def product(product_id: int) -> Product:
+    with Session(engine) as session:
+        return session.get(Product, product_id)
+
+
+def test_csv_import_multiline_fields_and_line_errors(client, admin_headers):
+    report = import_csv(client, admin_headers, CSV_HEADER + (
+        'Robe,"Longue\nen lin",S,bleu,30,https://example.com/robe/s,4\n'
+        "Robe,,L,bleu,32,https://example.com/robe/l,\n"
+        "Jupe,,M,noir,pas-un-prix,https://example.com/jupe/m,4\n"
+    ))
+
+    # La description sur deux lignes est UN enregistrement (lignes 2-3)
+    assert report["rows_read"] == 3
+    assert report["products_created"] == 1
+    assert report["variants_upserted"] == 2
+    assert product(variant("https://example.com/robe/s").product_id).description == "Longue\nen lin"
+    # Le prix invalide rejette son produit, signalé à sa ligne du fichier
+    assert [error["line"] for error in report["errors"]] == [5]
+    assert "price" in report["errors"][0]["error"]
+
+
+def test_csv_upsert_keeps_unspecified_fields(client, admin_headers):
+    import_csv(client, admin_headers, CSV_HEADER + (
+        'Chemise,"Coton\nbio",M,blanc,25,https://example.com/chemise/m,7\n'
+    ))
+    created = variant("https://example.com/chemise/m")
+
+    # Le flux ne donne que le prix : stock et description restent inchangés
+    report = import_csv(client, admin_headers, CSV_HEADER + (
+        "Chemise,,M,blanc,27,https://example.com/chemise/m,\n"
+    ))
+    assert report["products_updated"] == 1
+    updated = variant("https://example.com/chemise/m")
+    assert updated.id == created.id
+    assert updated.price == 27
+    assert updated.stock_quantity == 7
+    assert product(updated.product_id).description == "Coton\nbio"
+
+
+def test_failed_chunk_is_reported_and_import_continues(client, admin_headers, monkeypatch):
+    save_chunk = catalog_import._save_chunk
+    calls = []
+
+    async def first_chunk_fails(session, products, report):
+        calls.append(len(products))
+        if len(calls) == 1:
+            await session.execute(text("SELECT * FROM table_absente"))
+        await save_chunk(session, products, report)
+
+    monkeypatch.setattr(catalog_import, "IMPORT_CHUNK_SIZE", 2)
+    monkeypatch.setattr(catalog_import, "_save_chunk", first_chunk_fails)
+    report = import_csv(client, admin_headers, CSV_HEADER + "".join(
+        f"Lot {n},,M,noir,10,https://example.com/lot/{n},3\n" for n in range(1, 5)
+    ))
+
+    assert calls == [2, 2]
+    assert report["rows_read"] == 4
+    assert report["products_created"] == 2
+    assert [error["line"] for error in report["errors"]] == [2, 3]
+    assert all(error["error"].startswith("Lot non enregistré") for error in report["errors"])
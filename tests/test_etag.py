@@ -0,0 +1,28 @@
+from database import QueryCounter
+
+
+def test_unchanged_catalog_returns_304_without_queries(client):
+    first = client.get("/products/")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "no-cache"
+
+    with QueryCounter() as counter:
+        response = client.get("/products/", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+    assert response.headers["Cache-Control"] == "no-cache"
+    assert counter.count == 0
+
+
+def test_catalog_write_changes_the_etag(client, admin_headers):
+    etag = client.get("/products/").headers["ETag"]
+    response = client.patch(
+        "/products/2", json={"description": "nouvelle description"}, headers=admin_headers
+    )
+    assert response.status_code == 200
+
+    response = client.get("/products/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
@@ -0,0 +1,47 @@
+from sqlmodel import Session, select
+
+from database import engine
+from fulfillment import LocalSupplier, fulfillment_worker
+from models import LOT_EN_COURS, PurchaseBatch
+
+
+class FirstBatchFails(LocalSupplier):
+    """Le premier lot reçu échoue toujours (lien fournisseur mort...)."""
+
+    def __init__(self):
+        super().__init__(latency=0)
+        self.bad_reference = None
+        self.calls = []
+
+    async def place_purchase(self, lines, batch_reference):
+        self.calls.append(batch_reference)
+        if self.bad_reference in (None, batch_reference):
+            self.bad_reference = batch_reference
+            raise ConnectionError("fournisseur injoignable")
+        return await super().place_purchase(lines, batch_reference)
+
+
+def test_failing_batch_does_not_block_the_queue(client, admin_headers, monkeypatch):
+    supplier = FirstBatchFails()
+    monkeypatch.setattr(fulfillment_worker, "supplier", supplier)
+    monkeypatch.setattr(fulfillment_worker, "batch_size", 5)
+
+    reports = client.post("/admin/fulfillment/run", headers=admin_headers).json()
+    assert reports # les lots suivants sont passés malgré l'échec du premier
+    stats = client.get("/admin/fulfillment", headers=admin_headers).json()
+    assert stats["queue_depth"] == 5 # seules les commandes du lot en échec
+    assert stats["unfinished_batches"] == 1
+    assert "fournisseur injoignable" in stats["last_error"]
+
+    # Cycle suivant : le lot en échec attend son délai, il n'est pas rejoué
+    client.post("/admin/fulfillment/run", headers=admin_headers)
+    assert supplier.calls.count(supplier.bad_reference) == 1
+
+    with Session(engine) as session:
+        batch = session.execute(
+            select(PurchaseBatch).where(PurchaseBatch.reference == supplier.bad_reference)
+        ).scalar_one()
+    assert batch.status == LOT_EN_COURS
+    assert batch.attempts == 1
+    assert batch.next_attempt_at > batch.created_at
+    assert "fournisseur injoignable" in batch.last_error
@@ -0,0 +1,21 @@
+import asyncio
+import os
+import signal
+
+import hashing
+
+
+def test_hash_pool_recovers_after_a_child_dies():
+    async def scenario():
+        await hashing.get_password_hash_async("secret") # crée le pool
+        broken = hashing._executor
+        for process in list(broken._processes.values()):
+            os.kill(process.pid, signal.SIGKILL) # OOM killer, segfault...
+        return broken, await hashing.get_password_hash_async("secret")
+
+    try:
+        broken, hashed = asyncio.run(scenario())
+        assert hashing._executor is not broken
+        assert hashing.verify_password("secret", hashed)
+    finally:
+        hashing.shutdown_hash_pool()
@@ -0,0 +1,47 @@
+from sqlmodel import Session
+
+from database import engine
+from idempotency import REPLAYED_HEADER, idempotency_store
+from models import Variant
+
+VARIANT_ID = 4
+
+
+def stock() -> int:
+    with Session(engine) as session:
+        return session.get(Variant, VARIANT_ID).stock_quantity
+
+
+def order(client, headers, key, quantity=1):
+    return client.post(
+        "/orders/",
+        json={"items": [{"variant_id": VARIANT_ID, "quantity": quantity}]},
+        headers={**headers, "Idempotency-Key": key},
+    )
+
+
+def test_replayed_request_returns_the_first_order(client, customer_headers):
+    before = stock()
+    first = order(client, customer_headers, "test-rejeu")
+    assert first.status_code == 201
+    assert REPLAYED_HEADER not in first.headers
+
+    replayed = order(client, customer_headers, "test-rejeu")
+    assert replayed.status_code == 201
+    assert replayed.headers[REPLAYED_HEADER] == "true"
+    assert replayed.json() == first.json()
+
+    # Sans le cache en mémoire (autre worker, redémarrage) : rejouée depuis la base
+    idempotency_store._responses.clear()
+    replayed = order(client, customer_headers, "test-rejeu")
+    assert replayed.headers[REPLAYED_HEADER] == "true"
+    assert replayed.json()["id"] == first.json()["id"]
+    assert stock() == before - 1
+
+
+def test_key_reused_with_another_body_is_rejected(client, customer_headers):
+    assert order(client, customer_headers, "test-autre-corps").status_code == 201
+    before = stock()
+    response = order(client, customer_headers, "test-autre-corps", quantity=2)
+    assert response.status_code == 422
+    assert stock() == before
@@ -0,0 +1,64 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlmodel import Session
+
+from database import engine
+from models import Variant
+
+VARIANT_ID = 3
+
+
+def set_stock(quantity: int) -> None:
+    with Session(engine) as session:
+        session.get(Variant, VARIANT_ID).stock_quantity = quantity
+        session.commit()
+
+
+def stock() -> int:
+    with Session(engine) as session:
+        return session.get(Variant, VARIANT_ID).stock_quantity
+
+
+def order(client, headers, *quantities):
+    return client.post(
+        "/orders/",
+        json={"items": [{"variant_id": VARIANT_ID, "quantity": q} for q in quantities]},
+        headers=headers,
+    )
+
+
+# SQLite ignore FOR UPDATE : seul PostgreSQL sérialise les commandes
+# concurrentes sur une même variante.
+@pytest.mark.skipif(
+    engine.dialect.name != "postgresql", reason="verrou de ligne PostgreSQL"
+)
+def test_concurrent_orders_never_oversell(client, customer_headers):
+    set_stock(3)
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        statuses = sorted(pool.map(
+            lambda _: order(client, customer_headers, 1).status_code, range(6)
+        ))
+    assert statuses == [201] * 3 + [400] * 3
+    assert stock() == 0
+
+
+def test_lines_of_one_variant_are_checked_together(client, customer_headers):
+    set_stock(3)
+    # 2 + 2 > 3 : refusée en entier, rien n'est réservé
+    response = order(client, customer_headers, 2, 2)
+    assert response.status_code == 400
+    assert stock() == 3
+
+    response = order(client, customer_headers, 2, 1)
+    assert response.status_code == 201
+    assert stock() == 0
+
+
+def test_unknown_status_filter_is_rejected(client, admin_headers):
+    for url in ("/orders/", "/orders/export"):
+        response = client.get(url, params={"status": "en_atente"}, headers=admin_headers)
+        assert response.status_code == 422
+    response = client.get("/orders/", params={"status": "en_attente"}, headers=admin_headers)
+    assert response.status_code == 200
+    assert {order["status"] for order in response.json()} <= {"en_attente"}
@@ -0,0 +1,34 @@
+import pytest
+
+from database import QueryCounter
+
+# Un endpoint de liste fait un nombre FIXE de requêtes SQL, quelle que soit
+# la taille de la page : une requête par ligne renvoyée (N+1) ferait
+# grandir ce nombre avec "limit".
+
+PAGE_SIZES = [1, 10, 50]
+
+
+def count_queries(client, url, **kwargs):
+    with QueryCounter() as counter:
+        response = client.get(url, **kwargs)
+    assert response.status_code == 200, response.text
+    return counter.count, response.json()
+
+
+@pytest.mark.parametrize("limit", PAGE_SIZES)
+def test_products_list_query_count(client, limit):
+    # 1. les produits de la page, 2. leurs variantes (WHERE product_id IN ...)
+    count, products = count_queries(client, "/products/", params={"limit": limit})
+    assert len(products) == limit
+    assert count == 2
+
+
+@pytest.mark.parametrize("limit", PAGE_SIZES)
+def test_admin_orders_list_query_count(client, admin_headers, limit):
+    # 1. les commandes et leur client, 2. leurs lignes et variantes
+    count, orders = count_queries(
+        client, "/orders/", params={"limit": limit}, headers=admin_headers
+    )
+    assert len(orders) == limit
+    assert count == 2
@@ -0,0 +1,64 @@
+import sqlite3
+
+import pytest
+
+import replicas
+from bus import bus
+from cache import CATALOG_TOPIC
+from database import DATABASE_URL
+from replicas import PIN_COOKIE, ReplicaRouter
+
+PRODUCT_ID = 1
+
+
+@pytest.fixture
+def replica_router(client, tmp_path, monkeypatch):
+    """Un "réplica" : copie SQLite de la base de test, où le produit 1 a un autre nom."""
+    primary_path = DATABASE_URL.split("sqlite:///", 1)[1]
+    replica_path = str(tmp_path / "replica.db")
+    with sqlite3.connect(primary_path) as source, sqlite3.connect(replica_path) as target:
+        source.backup(target)
+        target.execute("UPDATE product SET name = 'sur le réplica' WHERE id = ?", (PRODUCT_ID,))
+    router = ReplicaRouter([f"sqlite:///{replica_path}"])
+    router.replicas[0].mark(True)
+    monkeypatch.setattr(replicas, "replica_router", router)
+    client.cookies.clear()
+    yield router
+    client.cookies.clear()
+
+
+def product_name(client):
+    response = client.get(f"/products/{PRODUCT_ID}")
+    assert response.status_code == 200
+    return response.json()["name"]
+
+
+def test_reads_go_to_a_healthy_replica(client, replica_router):
+    assert product_name(client) == "sur le réplica"
+
+
+def test_unhealthy_replica_falls_back_to_primary(client, replica_router):
+    replica_router.replicas[0].mark(False, "retard de réplication : 9.0s")
+    assert product_name(client) != "sur le réplica"
+
+
+def test_write_pins_reads_to_primary(client, admin_headers, replica_router):
+    response = client.patch(
+        f"/products/{PRODUCT_ID}", json={"name": "renommé"}, headers=admin_headers
+    )
+    assert response.status_code == 200
+    assert PIN_COOKIE in client.cookies
+    # Tout le processus lit le catalogue sur le primaire (message du bus)...
+    assert replica_router.stats()["pinned_to_primary_seconds"] > 0
+    assert product_name(client) == "renommé"
+    # ... et ce client aussi, par son cookie, même une fois ce délai écoulé
+    replica_router._pinned_until = 0.0
+    assert product_name(client) == "renommé"
+    client.cookies.clear()
+    assert product_name(client) == "sur le réplica"
+
+
+def test_pin_runs_before_cache_invalidation():
+    # Sinon une lecture sur un réplica en retard, entre les deux, remettrait
+    # en cache des lignes périmées sous la nouvelle génération du cache
+    assert bus._subscribers[CATALOG_TOPIC][0] is replicas._on_catalog_message
@@ -0,0 +1,31 @@
+import pytest
+
+
+def search(client, q):
+    response = client.get("/products/search", params={"q": q})
+    assert response.status_code == 200, response.text
+    return [item["name"] for item in response.json()["items"]]
+
+
+@pytest.fixture(scope="module")
+def summer_dress(client, customer_headers):
+    response = client.post(
+        "/products/",
+        json={"name": "Robe d'été Zéphyrine", "description": "Lin écru, coupe évasée"},
+        headers=customer_headers,
+    )
+    assert response.status_code == 201, response.text
+    return response.json()["name"]
+
+
+def test_search_ignores_accents_and_case(client, summer_dress):
+    assert search(client, "ZEPHYRINE") == [summer_dress]
+    assert search(client, "zéphyrine écru") == [summer_dress]
+
+
+def test_search_matches_word_prefixes(client, summer_dress):
+    assert search(client, "zeph ete") == [summer_dress]
+    assert search(client, "evas") == [summer_dress] # dans la description
+    # Tous les mots doivent être présents, et seulement en début de mot
+    assert search(client, "zeph hiver") == []
+    assert search(client, "phyrine") == []
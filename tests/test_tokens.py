@@ -0,0 +1,31 @@
+from auth import create_token_pair
+
+
+def bearer(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+
+def refresh(client, refresh_token: str):
+    return client.post("/token/refresh", json={"refresh_token": refresh_token})
+
+
+def test_refresh_rotation_and_logout(client, dataset):
+    tokens = create_token_pair(dataset["users"][2])
+
+    response = refresh(client, tokens["refresh_token"])
+    assert response.status_code == 200
+    rotated = response.json()
+    assert rotated["refresh_token"] != tokens["refresh_token"]
+    assert client.get("/orders/me/", headers=bearer(rotated["access_token"])).status_code == 200
+
+    # Un refresh token ne sert qu'une fois
+    assert refresh(client, tokens["refresh_token"]).status_code == 401
+
+    response = client.post(
+        "/logout",
+        json={"refresh_token": rotated["refresh_token"]},
+        headers=bearer(rotated["access_token"]),
+    )
+    assert response.status_code == 204
+    assert client.get("/orders/me/", headers=bearer(rotated["access_token"])).status_code == 401
+    assert refresh(client, rotated["refresh_token"]).status_code == 401